@@ -1,114 +1,308 @@
 import argparse
-import importlib
 import logging
-import multiprocessing
 import pathlib
+import shutil
 
-from solve_parameters import solve_parameters
-from solve_diameters import solve_diameters
-from solve_temperatures import solve_temperatures
-from print_parameters import print_report
+# The solver, plotting, and multiprocessing modules are imported by the
+# commands that use them so `--help` and `--clean` start without loading
+# NumPy, SciPy, Chemics, or Matplotlib
 
-from plot_parameters import PlotParameters
-from plot_diameters import PlotDiameters
-from plot_temperatures import PlotTemperatures
 
+def main():
 
-def solve_params(params, path):
-    """
-    Perform calculations for parameters file.
-    """
+    # Command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('project', nargs='?', help='project folder or case set file')
+    parser.add_argument('-r', '--run', action='store_true', help='run parameters in serial')
+    parser.add_argument('-mp', '--mprun', action='store_true', help='run parameters in parallel')
+    parser.add_argument('-ar', '--arun', action='store_true', help='run case stages with the asyncio runner')
+    parser.add_argument('--cpu', type=int, help='number of solver stages run at a time by the asyncio runner')
+    parser.add_argument('--io', type=int, help='number of figures rendered at a time by the asyncio runner')
+    parser.add_argument('-c', '--clean', action='store_true', help='remove generated files')
+    parser.add_argument('-d', '--daemon', action='store_true', help='start a warm worker pool that serves run requests')
+    parser.add_argument('-s', '--submit', action='store_true', help='run parameters on the worker pool daemon')
+    parser.add_argument('--enqueue', metavar='QUEUE', help='add the cases as tasks to a shared work queue folder')
+    parser.add_argument('--stages', action='store_true', help='add a task for each solver stage instead of each case')
+    parser.add_argument('--work', metavar='QUEUE', help='run tasks from a shared work queue folder')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes for --work')
+    parser.add_argument('--shutdown', action='store_true', help='stop the worker pool daemon')
+    parser.add_argument('--serve', nargs='?', type=int, const=47_102, metavar='PORT', help='answer point queries for the cases on a local HTTP port')
+    parser.add_argument('--resume', action='store_true', help='save checkpoints and skip cases, stages, and chunks finished by a previous run')
+    parser.add_argument('--snapshot', type=int, default=0, metavar='N', help='with --resume, save the heat conduction state every N time steps')
+    parser.add_argument('--records', choices=['jsonl', 'csv'], default='jsonl', help='format of the project file of case records')
+    parser.add_argument('--summary', action='store_true', help='compare results of the cases in a project summary table')
+    parser.add_argument('--no-plots', action='store_true', help='solve cases without rendering figures')
+    parser.add_argument('--montecarlo', nargs='?', type=int, const=0, metavar='N', help='propagate parameter uncertainty with N Monte Carlo samples')
+    parser.add_argument('--float32', action='store_true', help='evaluate the Monte Carlo samples in single precision and report its error')
+    parser.add_argument('--sensitivity', choices=['morris', 'sobol'], help='global sensitivity analysis of the uncertain parameters')
+    parser.add_argument('--inverse', nargs=3, metavar=('INPUT', 'OUTPUT', 'TARGET'), help='find the input parameter value where a result equals a target value or another result')
+    parser.add_argument('--bracket', nargs=2, type=float, metavar=('LOW', 'HIGH'), help='range of the input parameter for --inverse')
+    parser.add_argument('--at', action='append', default=[], metavar='NAME=VALUE', help='fixed parameter value for --inverse such as gas.tk=773.15')
+    parser.add_argument('--replay', metavar='FILE', help='evaluate each row of a plant historian .csv or .npy file for each case')
+    parser.add_argument('--column', action='append', default=[], metavar='COLUMN=NAME', help='parameter of a historian column for --replay such as TI-101=gas.tk')
+    parser.add_argument('--chunk', type=int, default=100_000, metavar='N', help='number of historian rows evaluated at a time by --replay')
+    parser.add_argument('--monitor', metavar='SOURCE', help='raise alarms from operating point updates of a case read from - for stdin, a followed file, or tcp:PORT')
+    parser.add_argument('--simulate', type=int, metavar='N', help='write N simulated operating point updates of a case to stdout for --monitor')
+    parser.add_argument('--rate', type=float, default=0.0, metavar='HZ', help='updates per second of --simulate, default is no delay')
+    parser.add_argument('--fit-surrogates', metavar='FILE', help='fit surrogates of the terminal velocities and biomass heating time and save them to a file')
+    parser.add_argument('--surrogates', metavar='FILE', help='use the surrogates of a file where their certified error is within --surrogate-tol')
+    parser.add_argument('--surrogate-tol', type=float, default=1e-3, metavar='TOL', help='maximum relative error of the surrogates that are used')
+    parser.add_argument('--auto-grid', metavar='FILE', help='choose the heat conduction grid of each case from convergence studies cached in a file')
+    parser.add_argument('--grid-tol', type=float, default=1e-3, metavar='TOL', help='relative error of the heating time and center temperature for --auto-grid')
+    parser.add_argument('--threads', type=int, metavar='N', help='number of threads for the heat conduction solves of convergence studies and query batches, default is one in worker processes and the number of processors otherwise')
+    parser.add_argument('--profile', nargs='?', const='timers', choices=['timers', 'cprofile'], help='write timing report for each case and the project')
+    parser.add_argument('--check-startup', action='store_true', help='check import time of the command line interface')
+    args = parser.parse_args()
 
-    logging.info('Solve for case parameters')
-    results = solve_parameters(params)
-    print_report(params, results, path)
+    if args.project is None and not (args.daemon or args.shutdown or args.check_startup or args.work or args.fit_surrogates):
+        parser.error('the project folder is required')
 
-    plotter = PlotParameters(params, results, path)
-    plotter.plot_geldart()
-    plotter.plot_intra_particle_heat_cond()
-    plotter.plot_umb_umf_ut()
+    # Setup logging
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+    logging.info('Start BFB calculations')
 
+    # Import time budget for the command line interface
+    if args.check_startup:
+        from startup import check_startup
+        ok = check_startup(args.project)
+        logging.info('Done')
+        raise SystemExit(0 if ok else 1)
 
-def solve_diams(params, path):
-    """
-    Perform calculations for a range of particle sizes.
-    """
-    logging.info('Solve for diameters')
-    results = solve_diameters(params)
+    # Checkpoints of finished work for restarting an interrupted run
+    if args.resume:
+        import checkpoint
+        checkpoint.enable(args.snapshot)
 
-    plotter = PlotDiameters(params, results, path)
-    plotter.plot_umf()
-    plotter.plot_ut_bed()
-    plotter.plot_ut_bio()
+    # Surrogates of the expensive correlations
+    if args.fit_surrogates:
+        from surrogate import fit_all
+        fit_all(args.fit_surrogates)
 
+    if args.surrogates:
+        from surrogate import enable
+        enable(args.surrogates, args.surrogate_tol)
 
-def solve_temps(params, path):
-    """
-    Perform calculations for a range of temperatures.
-    """
-    logging.info('Solve for temperatures')
-    results = solve_temperatures(params)
+    # Heat conduction grids from convergence studies of each parameter regime
+    if args.auto_grid:
+        from convergence import enable
+        enable(pathlib.Path(args.auto_grid).resolve(), args.grid_tol)
 
-    plotter = PlotTemperatures(params, results, path)
-    plotter.plot_tv_temps()
-    plotter.plot_umf_ratios_temps()
-    plotter.plot_umb_umf_temps()
-    plotter.plot_ut_temps()
+    # Threads of the independent heat conduction solves of a case
+    if args.threads:
+        from trans_heat_cond import set_threads
+        set_threads(args.threads)
 
+    # Keep a warm worker pool alive for repeated runs
+    if args.daemon:
+        from workers import serve
+        serve(plots=not args.no_plots)
 
-def run_solvers(path):
-    """
-    Run all solvers.
-    """
-    spec = importlib.util.spec_from_file_location('params', path / 'params.py')
-    params = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(params)
+    if args.shutdown:
+        from workers import shutdown
+        shutdown()
 
-    solve_params(params, path)
-    solve_diams(params, path)
-    solve_temps(params, path)
+    # Run tasks from a work queue shared by workers on several computers
+    if args.work:
+        from workqueue import start_workers
+        status = start_workers(args.work, args.workers, plots=not args.no_plots)
+        logging.info(f"Queue {args.work}: {status['done']} done, {status['failed']} failed, "
+                     f"{status['claimed']} claimed, {status['waiting']} waiting")
 
+    if args.project is None:
+        logging.info('Done')
+        return
 
-def main():
+    # Path to project folder which contains parameters for each case or to a
+    # case set file whose cases are generated as they are run
+    from casesets import case_path, iter_cases, output_folder
+    project_path = pathlib.Path(args.project)
+    results_path = output_folder(project_path)
+    records_file = results_path / f'results.{args.records}'
 
-    # Command line arguments
-    parser = argparse.ArgumentParser()
-    parser.add_argument('project', help='project folder')
-    parser.add_argument('-r', '--run', action='store_true', help='run parameters in serial')
-    parser.add_argument('-mp', '--mprun', action='store_true', help='run parameters in parallel')
-    parser.add_argument('-c', '--clean', action='store_true', help='remove generated files')
-    args = parser.parse_args()
+    # Cases still to run where a resumed run skips the finished cases
+    def cases():
+        if args.resume:
+            from checkpoint import pending
+            return pending(iter_cases(project_path), records_file, plots=not args.no_plots)
+        return iter_cases(project_path)
 
-    # Setup logging
-    logging.basicConfig(format='%(message)s', level=logging.INFO)
-    logging.info('Start BFB calculations')
+    # Time each solver stage and plot method
+    if args.profile:
+        import profiling
+        profiling.enable(cprofile=(args.profile == 'cprofile'))
 
-    # Path to project folder which contains parameters for each case
-    project_path = pathlib.Path(args.project)
-    case_paths = [p for p in project_path.iterdir() if p.is_dir()]
+    # Answer point queries from warm models of the cases
+    if args.serve:
+        from query import serve_queries
+        serve_queries(project_path, ('localhost', args.serve))
+
+    # Add the cases to a work queue
+    if args.enqueue:
+        from workqueue import WorkQueue
+        n = WorkQueue(args.enqueue).enqueue(cases(), args.stages, records_file)
+        logging.info(f'Added {n} tasks to {args.enqueue}')
 
     # Solve using parameters for each case (serial)
-    if args.run:
-        for path in case_paths:
-            run_solvers(path)
+    if args.run and args.no_plots:
+        from cases import run_solvers
+        from records import RecordWriter
+        with RecordWriter(records_file, resume=args.resume) as records:
+            for case in cases():
+                _, record = run_solvers(case)
+                records.write(record)
+
+    if args.run and not args.no_plots:
+        from cases import run_solvers
+        from records import RecordWriter
+        from render import FigureRenderer
+        with FigureRenderer() as renderer, RecordWriter(records_file, resume=args.resume) as records:
+            for case in cases():
+                jobs, record = run_solvers(case)
+                renderer.submit(jobs)
+                records.write(record)
 
-    # Solve using parameters for each case (parallel)
+    # Solve using parameters for each case (parallel) where result arrays are
+    # sent to the figures through shared memory when plots are on
+    store = None
     if args.mprun:
-        with multiprocessing.Pool() as pool:
-            pool.map(run_solvers, case_paths)
+        from records import RecordWriter
+        from workers import WorkerPool
+        if not args.no_plots:
+            from sharedmem import SharedResults
+            store = SharedResults()
+        with WorkerPool(plots=not args.no_plots) as pool, RecordWriter(records_file, resume=args.resume) as records:
+            pool.run(cases(), records, store)
+
+    # Solve using parameters for each case (asyncio runner) where a run
+    # cancelled with Ctrl-C stops without the summary
+    cancelled = False
+    if args.arun:
+        from records import RecordWriter
+        from runner import run_async
+        with RecordWriter(records_file, resume=args.resume) as records:
+            cancelled = run_async(cases(), args.cpu, args.io, not args.no_plots, records)['cancelled']
+
+    # Solve using parameters for each case (worker pool daemon)
+    if args.submit:
+        from workers import submit
+        for st in submit(cases(), records_file):
+            logging.info(f"Case {st['case']} done in {st['total']:.2f} s")
+
+    # Compare scalar results of the cases
+    if (args.summary or args.run or args.mprun or args.arun or args.submit) and not cancelled:
+        from aggregate import summarize
+        summarize(results_path, (case_path(c) for c in iter_cases(project_path)), plots=not args.no_plots, store=store)
+
+    if store is not None:
+        store.close()
+
+    if cancelled:
+        logging.info('Run cancelled, summary skipped')
+        return
+
+    # Propagate parameter uncertainty for each case
+    if args.montecarlo is not None:
+        import numpy as np
+
+        import checkpoint
+        from casesets import resolve
+        from montecarlo import run_monte_carlo, write_summary
+        for case in iter_cases(project_path):
+            path, params = resolve(case)
+            logging.info(f'Monte Carlo analysis for {path.name}')
+            folder = path / checkpoint.FOLDER / 'montecarlo' if args.resume else None
+            dtype = np.float32 if args.float32 else None
+            summary = run_monte_carlo(params, args.montecarlo or None, folder=folder, dtype=dtype)
+            write_summary(summary, path)
+
+    # Global sensitivity analysis for each case
+    if args.sensitivity:
+        from casesets import resolve
+        from sensitivity import run_sensitivity
+        for case in iter_cases(project_path):
+            path, params = resolve(case)
+            logging.info(f'Sensitivity analysis for {path.name}')
+            run_sensitivity(params, args.sensitivity, path)
+
+    # Inverse design for each case
+    if args.inverse:
+        from casesets import resolve
+        from inverse import solve_input, write_result
+        name, output, target = args.inverse
+        try:
+            target = float(target)
+        except ValueError:
+            pass
+        fixed = {k: float(v) for k, v in (a.split('=') for a in args.at)}
+        for case in iter_cases(project_path):
+            path, params = resolve(case)
+            logging.info(f'Inverse design for {path.name}')
+            try:
+                result = solve_input(params, name, output, target, args.bracket, fixed)
+            except ValueError as e:
+                logging.info(str(e))
+            else:
+                write_result(result, path)
+
+    # Replay plant historian data through the model of each case
+    if args.replay:
+        from casesets import resolve
+        from historian import replay
+        columns = dict(c.split('=') for c in args.column)
+        file = pathlib.Path(args.replay)
+        for case in iter_cases(project_path):
+            path, params = resolve(case)
+            logging.info(f'Replay {file.name} for {path.name}')
+            replay(params, file, path / f'replay_{file.name}', columns, args.chunk)
+
+    # Monitor a case from a feed of operating point updates where the project
+    # is a case folder or the first case of the project is used
+    if args.monitor or args.simulate:
+        from casesets import resolve
+        case = project_path if (project_path / 'params.py').exists() else next(iter_cases(project_path))
+        path, params = resolve(case)
+
+        if args.simulate:
+            import sys
+            from monitor import simulate
+            logging.info(f'Simulated feed of {args.simulate:,} updates for {path.name}')
+            sys.stdout.writelines(simulate(params, args.simulate, rate=args.rate))
+            sys.stdout.flush()
+
+        if args.monitor:
+            from monitor import read_lines, run_monitor
+            logging.info(f'Monitor {path.name} from {args.monitor}')
+            run_monitor(params, read_lines(args.monitor))
+
+    # Combine timing reports of the cases
+    if args.profile and (args.run or args.mprun or args.arun):
+        case_paths = [case_path(c) for c in iter_cases(project_path)]
+        report = profiling.write_aggregate(results_path, case_paths)
+        for name, cat in sorted(report['categories'].items(), key=lambda c: -c[1]['seconds']):
+            logging.info(f"{name:<14} {cat['calls']:>6} calls {cat['seconds']:>9.3f} s")
 
     # Clean up generated files from previous runs
     if args.clean:
         logging.info('Clean up generated files from previous runs')
 
-        for path in case_paths:
-            for file in path.iterdir():
-                if not file.is_dir() and not file.suffix == '.py':
-                    file.unlink()
+        # Case folders of a case set only contain generated files
+        if results_path != project_path:
+            from casesets import removable_output
+            shutil.rmtree(removable_output(project_path), ignore_errors=True)
+
+        if results_path == project_path:
+            from checkpoint import FOLDER
+            shutil.rmtree(project_path / FOLDER, ignore_errors=True)
 
-        for file in project_path.iterdir():
-            if file.suffix == '.pdf':
-                file.unlink()
+            for path in iter_cases(project_path):
+                shutil.rmtree(path / FOLDER, ignore_errors=True)
+                for file in path.iterdir():
+                    if not file.is_dir() and not file.suffix == '.py':
+                        file.unlink()
+
+            for file in project_path.iterdir():
+                if file.suffix == '.pdf' or file.name in ('profile.json', 'summary.csv', 'results.jsonl', 'results.csv'):
+                    file.unlink()
 
     logging.info('Done')
 
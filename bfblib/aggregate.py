@@ -0,0 +1,121 @@
+import json
+import logging
+import multiprocessing
+import time
+
+from profiling import profiled
+from render import FigureJob, FigureRenderer
+
+# Methods of `PlotCases` for the project comparison figures
+CASE_PLOTS = ('plot_umf_cases', 'plot_ut_cases', 'plot_us_umf_cases', 'plot_times_cases')
+
+
+def read_case(path):
+    """
+    Scalar parameters and results of a case as one row of the summary table.
+    Returns None when the case has no `results.json` file.
+    """
+    file = path / 'results.json'
+    if not file.exists():
+        return None
+
+    with open(file) as f:
+        row = json.load(f)
+
+    return row
+
+
+def collect(case_paths, processes=None, chunksize=64):
+    """
+    Collect the scalar results of every case into a columnar table in one
+    pass. Result files are read in parallel and each row is added to the
+    columns as it arrives so only the scalar values are kept in memory.
+
+    Parameters
+    ----------
+    case_paths : iterable
+        Case folders which can be a generator.
+    processes : int, optional
+        Number of processes that read the result files, default is the
+        number of processors.
+    chunksize : int
+        Number of cases sent to a process at a time.
+
+    Returns
+    -------
+    columns : dict
+        List of values for each column where missing values are None.
+    """
+    columns = {}
+    n = 0
+
+    with multiprocessing.Pool(processes) as pool:
+        for row in pool.imap(read_case, case_paths, chunksize):
+            if row is None:
+                continue
+
+            # columns that first appear in this row are padded for the
+            # previous rows and columns missing from this row get None
+            n += 1
+            for name, value in row.items():
+                if name not in columns:
+                    columns[name] = [None] * (n - 1)
+                columns[name].append(value)
+            for col in columns.values():
+                if len(col) < n:
+                    col.append(None)
+
+    return columns
+
+
+@profiled('io')
+def write_table(columns, path):
+    """
+    Write the summary table to the `summary.csv` file in the path.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(columns)
+    df.to_csv(path / 'summary.csv', index=False)
+    return df
+
+
+def summarize(path, case_paths, plots=True, processes=None, store=None):
+    """
+    Collect the results of the cases into the project summary table and
+    render the comparison figures.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Project folder for the summary table and figures.
+    case_paths : iterable
+        Case folders which can be a generator.
+    plots : bool
+        Render the comparison figures of the cases.
+    store : SharedResults, optional
+        Center temperatures of the biomass particle of the cases for the
+        figure of the center temperatures.
+
+    Returns
+    -------
+    df : DataFrame
+        Summary table with one row per case.
+    """
+    t0 = time.perf_counter()
+    columns = collect(case_paths, processes)
+
+    if not columns:
+        logging.info('No case results available for the summary')
+        return None
+
+    df = write_table(columns, path)
+    logging.info(f'Summary of {len(df):,} cases in {time.perf_counter() - t0:.2f} s')
+
+    if plots:
+        with FigureRenderer() as renderer:
+            renderer.submit(FigureJob('PlotCases', m, None, df, path) for m in CASE_PLOTS)
+            if store is not None and store.histories:
+                renderer.submit([FigureJob('PlotCaseHistories', 'plot_center_temps_cases', None, store.histories, path)])
+
+    return df
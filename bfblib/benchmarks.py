@@ -0,0 +1,365 @@
+"""
+Benchmarks for the heat conduction solver, gas properties, particle
+correlations, sweep solvers, full case runs, and historian replay.
+
+Each benchmark is timed several times with fixed inputs and the results are
+appended to a JSON history file then compared against a stored baseline.
+
+Examples
+--------
+Run the benchmarks and compare against the baseline
+
+>>> python bfblib/benchmarks.py
+
+Run the benchmarks and save the results as the new baseline
+
+>>> python bfblib/benchmarks.py --save-baseline
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import pathlib
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+# Seed for random inputs so every run uses the same values
+SEED = 42
+
+# Folder for the benchmark history and baseline files
+BENCH_PATH = pathlib.Path(__file__).parents[1] / 'benchmarks'
+
+# Case used for the solver benchmarks
+CASE_PATH = pathlib.Path(__file__).parents[1] / 'twofbr' / 'case1'
+
+# Registered benchmarks as {name: (setup function, repeat)}
+_BENCHMARKS = {}
+
+
+def benchmark(name, repeat=5):
+    """
+    Register a benchmark. The decorated function performs any setup and
+    returns the function that is timed.
+    """
+    def decorator(setup):
+        _BENCHMARKS[name] = (setup, repeat)
+        return setup
+    return decorator
+
+
+def _case_params():
+    from workers import load_params
+    return load_params(CASE_PATH)
+
+
+# Heat conduction
+# ----------------------------------------------------------------------------
+
+def _register_hc2(m, nt):
+
+    @benchmark(f'hc2_m{m}_nt{nt}', repeat=3)
+    def setup():
+        from trans_heat_cond import hc2
+        t = np.linspace(0, 1, nt + 1)
+        return lambda: hc2(0.000134, 0.0, 0.12, 0.54, 350, 293.15, 773.15, 2, m, t)
+
+
+for _m, _nt in ((100, 100), (250, 250), (1000, 1000)):
+    _register_hc2(_m, _nt)
+
+
+def _register_hc2_threads(threads):
+
+    @benchmark(f'hc2_threads_{threads}', repeat=3)
+    def setup():
+        from trans_heat_cond import hc2_threaded
+
+        # eight solves of the size of a PSD class or temperature of a case
+        t = np.linspace(0, 1, 251)
+        tks = np.linspace(673.15, 873.15, 8)
+        problems = [(0.000134, 0.0, 0.12, 0.54, 350, 293.15, tk, 2, 1000, t) for tk in tks]
+        return lambda: hc2_threaded(problems, threads)
+
+
+# Scaling of the thread pool from one thread to eight threads
+for _threads in (1, 2, 4, 8):
+    _register_hc2_threads(_threads)
+
+
+# Gas properties
+# ----------------------------------------------------------------------------
+
+@benchmark('gas_single')
+def _gas_single():
+    from gas import Gas
+    return lambda: Gas(['N2'], [1.0], 101_325, 773.15)
+
+
+@benchmark('gas_mixture')
+def _gas_mixture():
+    from gas import Gas
+    return lambda: Gas(['H2', 'N2'], [0.85, 0.15], 101_325, 773.15)
+
+
+@benchmark('gas_mixture_four')
+def _gas_mixture_four():
+    from gas import Gas
+    return lambda: Gas(['H2', 'N2', 'CO', 'CH4'], [0.4, 0.3, 0.2, 0.1], 101_325, 773.15)
+
+
+# Particle correlations
+# ----------------------------------------------------------------------------
+
+def _register_correlation(method):
+
+    @benchmark(f'particle_{method}')
+    def setup():
+        from gas import Gas
+        from particle import Particle
+
+        rng = np.random.default_rng(SEED)
+        dps = rng.uniform(0.0001, 0.001, 100)
+        gas = Gas(['H2', 'N2'], [0.85, 0.15], 101_325, 773.15)
+        bed = Particle(0.0003, 0.0002, 0.0004, 0.9, 2600)
+
+        def run():
+            for dp in dps:
+                bed.dp = dp
+                if method == 'calc_umf_ergun':
+                    bed.calc_umf_ergun(0.45, gas)
+                else:
+                    getattr(bed, method)(gas)
+
+        return run
+
+
+for _method in ('calc_umb', 'calc_umf_ergun', 'calc_umf_wenyu', 'calc_ut_ganser', 'calc_ut_haider'):
+    _register_correlation(_method)
+
+
+# Solvers
+# ----------------------------------------------------------------------------
+
+@benchmark('solve_diameters', repeat=3)
+def _solve_diameters():
+    from solve_diameters import solve_diameters
+    params = _case_params()
+    return lambda: solve_diameters(params)
+
+
+@benchmark('solve_temperatures', repeat=3)
+def _solve_temperatures():
+    from solve_temperatures import solve_temperatures
+    params = _case_params()
+    return lambda: solve_temperatures(params)
+
+
+@benchmark('run_solvers_case1', repeat=3)
+def _run_solvers():
+    from cases import run_solvers
+    from render import render_figure
+
+    # Output files are written to a temporary copy of the case which is
+    # removed when the benchmark function is garbage collected
+    tmp = tempfile.TemporaryDirectory()
+    path = pathlib.Path(tmp.name)
+    shutil.copy(CASE_PATH / 'params.py', path)
+
+    def run():
+        jobs, _ = run_solvers(path)
+        for job in jobs:
+            render_figure(job)
+
+    run.tmp = tmp
+    return run
+
+
+# Historian replay
+# ----------------------------------------------------------------------------
+
+@benchmark('historian_replay_npy', repeat=3)
+def _historian_replay():
+    from historian import replay
+
+    params = _case_params()
+    rng = np.random.default_rng(SEED)
+    n = 100_000
+    rows = np.empty(n, dtype=[('time', np.int64), ('TI', float), ('PI', float), ('FI', float)])
+    rows['time'] = np.arange(n)
+    rows['TI'] = rng.normal(params.gas['tk'], 20, n)
+    rows['PI'] = rng.normal(params.gas['p'], 500, n)
+    rows['FI'] = rng.normal(params.reactor['q'], 1, n)
+
+    tmp = tempfile.TemporaryDirectory()
+    path = pathlib.Path(tmp.name)
+    np.save(path / 'historian.npy', rows)
+    columns = {'TI': 'gas.tk', 'PI': 'gas.p', 'FI': 'reactor.q'}
+
+    def run():
+        replay(params, path / 'historian.npy', path / 'replay.npy', columns, chunksize=10_000)
+
+    run.tmp = tmp
+    return run
+
+
+# Running and recording
+# ----------------------------------------------------------------------------
+
+def run_benchmarks(names=None, repeat=None):
+    """
+    Run the benchmarks and return the timing results.
+
+    Parameters
+    ----------
+    names : list, optional
+        Names of benchmarks to run, otherwise all benchmarks are run.
+    repeat : int, optional
+        Number of times to repeat each benchmark instead of its default.
+
+    Returns
+    -------
+    results : dict
+        Minimum, median, and all times [s] for each benchmark.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+    results = {}
+
+    for name, (setup, n) in _BENCHMARKS.items():
+        if names and name not in names:
+            continue
+
+        func = setup()
+        func()  # warm-up run which is not recorded
+
+        times = []
+        for _ in range(repeat or n):
+            t0 = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - t0)
+
+        results[name] = {'min': min(times), 'median': statistics.median(times), 'times': times}
+        logging.info(f'{name:<28} {min(times) * 1000:10.3f} ms')
+
+    return results
+
+
+def record(results, path=BENCH_PATH):
+    """
+    Append benchmark results to the `history.json` file.
+    """
+    path.mkdir(exist_ok=True)
+    file = path / 'history.json'
+
+    history = []
+    if file.exists():
+        with open(file) as f:
+            history = json.load(f)
+
+    history.append({
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'numpy': np.__version__,
+        'results': results
+    })
+
+    with open(file, 'w') as f:
+        json.dump(history, f, indent=4)
+
+
+def save_baseline(results, path=BENCH_PATH):
+    """
+    Save minimum time [s] of each benchmark to the `baseline.json` file.
+    Benchmarks that were not run keep their previous baseline.
+    """
+    path.mkdir(exist_ok=True)
+    file = path / 'baseline.json'
+
+    baseline = {}
+    if file.exists():
+        with open(file) as f:
+            baseline = json.load(f)
+
+    baseline.update({name: res['min'] for name, res in results.items()})
+
+    with open(file, 'w') as f:
+        json.dump(baseline, f, indent=4)
+
+
+def compare(results, path=BENCH_PATH, tolerance=0.2):
+    """
+    Compare benchmark results against the stored baseline.
+
+    Parameters
+    ----------
+    results : dict
+        Results from `run_benchmarks`.
+    tolerance : float
+        Allowed fractional increase in time before a benchmark is reported
+        as a regression.
+
+    Returns
+    -------
+    regressions : list
+        Names of benchmarks that are slower than the baseline.
+    """
+    file = path / 'baseline.json'
+    if not file.exists():
+        logging.info('No baseline available, run with --save-baseline to store one')
+        return []
+
+    with open(file) as f:
+        baseline = json.load(f)
+
+    regressions = []
+
+    for name, res in results.items():
+        if name not in baseline:
+            continue
+        ratio = res['min'] / baseline[name]
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = 'REGRESSION'
+        logging.info(f'{name:<28} {ratio:6.2f}x baseline {flag}')
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Run the bfblib benchmarks.')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, default is all')
+    parser.add_argument('-n', '--repeat', type=int, help='number of times to repeat each benchmark')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.2, help='allowed slowdown as a fraction of the baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as the new baseline')
+    parser.add_argument('--list', action='store_true', help='list available benchmarks')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    if args.list:
+        for name in _BENCHMARKS:
+            logging.info(name)
+        return
+
+    results = run_benchmarks(args.names, args.repeat)
+    record(results)
+
+    if args.save_baseline:
+        save_baseline(results)
+        logging.info('Saved baseline')
+    elif compare(results, tolerance=args.tolerance):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 import chemics as cm
 import numpy as np
 
+from profiling import profiled
+
 
 class BfbReactor:
     """
@@ -24,6 +26,7 @@ class BfbReactor:
         self.q = q
         self.zmf = zmf
 
+    @profiled('correlations')
     def calc_us(self, gas):
         """
         Calculate superficial gas velocity [m/s].
@@ -35,6 +38,7 @@ class BfbReactor:
         return us
 
     @staticmethod
+    @profiled('correlations')
     def calc_us_umf(us, umf):
         """
         Calculate ratio of Us/Umf [-].
@@ -43,6 +47,7 @@ class BfbReactor:
         return us_umf
 
     @staticmethod
+    @profiled('correlations')
     def calc_tdh_chan(us):
         """
         Calculate transport disengaging height [m] from Chan correlation.
@@ -50,6 +55,7 @@ class BfbReactor:
         tdh_chan = cm.tdh_chan(us)
         return tdh_chan
 
+    @profiled('correlations')
     def calc_tdh_horio(self, us):
         """
         Calculate transport disengaging height [m] from Horio correlation.
@@ -57,6 +63,7 @@ class BfbReactor:
         tdh_horio = cm.tdh_horio(self.di, us)
         return tdh_horio
 
+    @profiled('correlations')
     def calc_zexp_ergun(self, bed, gas, umf_ergun, us):
         """
         Calculate expanded bed height [m] based on Umf from Ergun equation.
@@ -65,6 +72,7 @@ class BfbReactor:
         zexp_ergun = self.zmf * fbexp_ergun
         return zexp_ergun
 
+    @profiled('correlations')
     def calc_zexp_wenyu(self, bed, gas, umf_wenyu, us):
         """
         Calculate expanded bed height [m] based on Umf from WenYu equation.
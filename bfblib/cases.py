@@ -0,0 +1,81 @@
+import logging
+
+from solve_parameters import solve_parameters
+from solve_diameters import solve_diameters
+from solve_temperatures import solve_temperatures
+from print_parameters import case_record, print_report, write_results
+
+import checkpoint
+from casesets import resolve
+from profiling import session
+from render import FigureJob
+
+
+@checkpoint.stage('params')
+def solve_params(params, path):
+    """
+    Perform calculations for parameters file. Returns the figure jobs and
+    the record of scalar parameters and results for the case.
+    """
+
+    logging.info('Solve for case parameters')
+    every = checkpoint.snapshot_every()
+    snapshot = path / checkpoint.FOLDER / 'hc2.npz' if every else None
+    results = solve_parameters(params, snapshot, every)
+    record = case_record(params, results, path)
+    print_report(params, results, path)
+    write_results(record, path)
+
+    methods = ('plot_geldart', 'plot_intra_particle_heat_cond', 'plot_umb_umf_ut')
+    jobs = [FigureJob('PlotParameters', m, params, results, path) for m in methods]
+    return jobs, record
+
+
+@checkpoint.stage('diams')
+def solve_diams(params, path):
+    """
+    Perform calculations for a range of particle sizes.
+    """
+    logging.info('Solve for diameters')
+    results = solve_diameters(params)
+
+    methods = ('plot_umf', 'plot_ut_bed', 'plot_ut_bio')
+    jobs = [FigureJob('PlotDiameters', m, params, results, path) for m in methods]
+    return jobs
+
+
+@checkpoint.stage('temps')
+def solve_temps(params, path):
+    """
+    Perform calculations for a range of temperatures.
+    """
+    logging.info('Solve for temperatures')
+    results = solve_temperatures(params)
+
+    methods = ('plot_tv_temps', 'plot_umf_ratios_temps', 'plot_umb_umf_temps', 'plot_ut_temps')
+    jobs = [FigureJob('PlotTemperatures', m, params, results, path) for m in methods]
+    return jobs
+
+
+def run_solvers(case):
+    """
+    Run all solvers for a case folder or a case of a case set.
+
+    Returns
+    -------
+    jobs : list
+        Figure jobs for the case which are rendered by a `FigureRenderer`.
+    record : dict
+        Scalar parameters and results of the case for the records file.
+    """
+    with session() as prof:
+        path, params = resolve(case)
+
+        jobs, record = solve_params(params, path)
+        jobs += solve_diams(params, path)
+        jobs += solve_temps(params, path)
+
+    if prof is not None:
+        prof.write(path)
+
+    return jobs, record
@@ -0,0 +1,198 @@
+import collections
+import itertools
+import json
+import math
+import pathlib
+import types
+
+# Case of a case set which only holds its overrides of the base parameters.
+# Parameters are built by the process that runs the case.
+Case = collections.namedtuple('Case', ['file', 'index', 'overrides', 'label', 'path'])
+
+# Parsed case set files as {file path: (mtime, case set)}
+_caseset_cache = {}
+
+
+def load_caseset(file):
+    """
+    Load a case set file which defines a base parameter set, override layers
+    applied to every case, and a product of override axes that expands to
+    one case per combination.
+
+    The file is only parsed when it is new or has been modified since it was
+    last loaded, otherwise the cached case set is returned.
+
+    Parameters
+    ----------
+    file : pathlib.Path
+        Path to the JSON case set file such as
+
+        {
+            "base": "case1",
+            "layers": [{"reactor.q": 18}],
+            "product": {
+                "bed": {"small": {"bed.dp": 0.000306}, "large": {"bed.dp": 0.000453}},
+                "gas.tk": [723.15, 773.15, 823.15]
+            }
+        }
+
+        The base is a case folder relative to the file or a dictionary of
+        parameter groups. An axis of the product is a list of values for the
+        parameter named by the axis or a dictionary of labeled overrides.
+
+    Returns
+    -------
+    caseset : SimpleNamespace
+        Base parameters, layer overrides, product axes as lists of (label,
+        overrides) pairs, number of cases, and the output folder.
+    """
+    file = pathlib.Path(file).resolve()
+    mtime = file.stat().st_mtime_ns
+
+    cached = _caseset_cache.get(file)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(file) as f:
+        spec = json.load(f)
+
+    base = spec['base']
+    if isinstance(base, str):
+        from workers import load_params
+        base = load_params(file.parent / base)
+    else:
+        base = types.SimpleNamespace(**base)
+
+    layers = {}
+    for layer in spec.get('layers', []):
+        layers.update(layer)
+
+    axes = []
+    for name, values in spec.get('product', {}).items():
+        if isinstance(values, dict):
+            axes.append([(f'{name}={label}', ovr) for label, ovr in values.items()])
+        else:
+            axes.append([(f'{name}={v}', {name: v}) for v in values])
+
+    caseset = types.SimpleNamespace(
+        base=base,
+        layers=layers,
+        axes=axes,
+        size=math.prod(len(axis) for axis in axes),
+        output=file.parent / spec.get('output', file.stem)
+    )
+
+    _caseset_cache[file] = (mtime, caseset)
+    return caseset
+
+
+def expand(file):
+    """
+    Generate the cases of a case set file one at a time. Each case only
+    holds its overrides so thousands of cases can be streamed to the workers
+    without writing a parameters file for each one.
+    """
+    file = pathlib.Path(file).resolve()
+    cs = load_caseset(file)
+    width = len(str(cs.size - 1))
+
+    for index, combo in enumerate(itertools.product(*cs.axes)):
+        overrides = dict(cs.layers)
+        for _, ovr in combo:
+            overrides.update(ovr)
+
+        label = ', '.join(lbl for lbl, _ in combo)
+        path = cs.output / f'{index:0{width}d}'
+        yield Case(str(file), index, tuple(overrides.items()), label, path)
+
+
+def iter_cases(project_path):
+    """
+    Generate the cases of a project which is either a folder of case folders
+    that each contain a `params.py` file or a JSON case set file.
+    """
+    project_path = pathlib.Path(project_path)
+
+    if project_path.suffix == '.json':
+        yield from expand(project_path)
+    else:
+        for path in sorted(project_path.iterdir()):
+            if (path / 'params.py').exists():
+                yield path
+
+
+def output_folder(project_path):
+    """
+    Folder for the project results which is the output folder of a case set
+    or the project folder itself.
+    """
+    project_path = pathlib.Path(project_path)
+    if project_path.suffix == '.json':
+        return load_caseset(project_path).output
+    return project_path
+
+
+def removable_output(file):
+    """
+    Output folder of a case set file which can be removed with its results.
+    The folder must be a subfolder of the folder of the case set file that
+    doesn't hold any case folder with a `params.py` file, so an output such
+    as `.` or `..` can't remove the parameters of a project.
+    """
+    file = pathlib.Path(file).resolve()
+    output = load_caseset(file).output.resolve()
+
+    if file.parent not in output.parents:
+        raise ValueError(f'Output folder {output} of case set {file.name} is not a subfolder of {file.parent}.')
+    if any(output.rglob('params.py')):
+        raise ValueError(f'Output folder {output} of case set {file.name} holds parameter files.')
+
+    return output
+
+
+def case_path(case):
+    """
+    Folder for the results of a case folder or case set case.
+    """
+    return case.path if isinstance(case, Case) else case
+
+
+def apply_overrides(params, overrides):
+    """
+    Copy of the parameters with override values for names such as `bed.dp`
+    which refers to `params.bed['dp']`. Only the overridden parameter groups
+    are copied.
+    """
+    attrs = dict(vars(params))
+
+    for name, value in overrides:
+        group, key = name.split('.')
+        if attrs[group] is getattr(params, group):
+            attrs[group] = dict(attrs[group])
+        attrs[group][key] = value
+
+    return types.SimpleNamespace(**attrs)
+
+
+def resolve(case):
+    """
+    Output folder and parameters for a case folder or a case set case. The
+    output folder of a case set case is created when it's resolved.
+
+    Returns
+    -------
+    path : pathlib.Path
+        Folder for the results of the case.
+    params : SimpleNamespace
+        Parameter dictionaries for the case.
+    """
+    if not isinstance(case, Case):
+        from workers import load_params
+        return case, load_params(case)
+
+    cs = load_caseset(case.file)
+    params = apply_overrides(cs.base, case.overrides)
+    params.case = dict(params.case, case_num=case.index, case_desc=case.label)
+
+    case.path.mkdir(parents=True, exist_ok=True)
+    return case.path, params
@@ -0,0 +1,217 @@
+import functools
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+
+# Checkpoint settings shared with worker and rendering processes through the
+# environment where the value is empty when checkpoints are off, otherwise
+# the number of time steps between heat conduction snapshots
+_ENV = 'BFBLIB_CHECKPOINT'
+
+# Folder in each case folder for the checkpoints of the case
+FOLDER = '.checkpoint'
+
+
+def enable(snapshot=0):
+    """
+    Turn on checkpoints for this process and any process started from it.
+    Heat conduction solves also save their state every `snapshot` time steps
+    when it's greater than zero.
+    """
+    os.environ[_ENV] = str(snapshot)
+
+
+def enabled():
+    """
+    True when checkpoints are on.
+    """
+    return bool(os.environ.get(_ENV))
+
+
+def snapshot_every():
+    """
+    Number of time steps between heat conduction snapshots or zero when
+    snapshots are off.
+    """
+    return int(os.environ.get(_ENV) or 0)
+
+
+def key(*values):
+    """
+    Short hash of the inputs of a unit of work so a checkpoint is only used
+    by the same work.
+    """
+    return hashlib.sha1(repr(values).encode()).hexdigest()[:16]
+
+
+def settings(precision='float64'):
+    """
+    Settings of this process which change the results of a unit of work
+    without changing its parameters, the grid selection and surrogates, and
+    the floating point precision of the work, for its key.
+    """
+    import convergence
+    import surrogate
+    return {'grids': convergence.settings(), 'surrogates': surrogate.settings(), 'precision': precision}
+
+
+def save(file, data):
+    """
+    Pickle the data to a file atomically by replacing it with a complete
+    temporary file so a run that stops while saving leaves no partial file.
+    """
+    file = pathlib.Path(file)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = file.with_name(f'.{file.name}.{os.getpid()}')
+    with open(tmp, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, file)
+
+
+def load(file):
+    """
+    Data of a checkpoint file or None when there is no checkpoint.
+    """
+    try:
+        with open(file, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _figure_marker(job):
+    return job.path / FOLDER / f'{job.plotter}.{job.method}.done'
+
+
+def mark_figure(job):
+    """
+    Record that the figure of a job was rendered when checkpoints are on.
+    """
+    if enabled():
+        marker = _figure_marker(job)
+        marker.parent.mkdir(exist_ok=True)
+        marker.touch()
+
+
+def stage(name):
+    """
+    Decorator for a solver stage `func(params, path)` which returns its
+    figure jobs, or its figure jobs and record. When checkpoints are on, the
+    result of the stage is saved to the checkpoint folder of the case and a
+    stage with a checkpoint of the same parameters and `settings` returns
+    the saved result without solving again.
+    Figure jobs of a saved stage are limited to figures not yet rendered.
+    """
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(params, path):
+            if not enabled():
+                return func(params, path)
+
+            file = path / FOLDER / f'{name}.pkl'
+            saved = load(file)
+            work = key(vars(params), settings())
+
+            if saved is not None and saved['key'] == work:
+                logging.info(f'Resume {name} stage for {path.name} from checkpoint')
+                result = saved['result']
+                if isinstance(result, tuple):
+                    jobs, record = result
+                    return [j for j in jobs if not _figure_marker(j).exists()], record
+                return [j for j in result if not _figure_marker(j).exists()]
+
+            result = func(params, path)
+            save(file, {'key': work, 'result': result})
+            return result
+
+        return wrapper
+    return decorator
+
+
+def case_done(path, stages, plots=True, work=None):
+    """
+    True when every stage of the case has a checkpoint, of the `work` key
+    when given, and, if `plots` is True, every figure of the stages was
+    rendered.
+    """
+    for name in stages:
+        saved = load(path / FOLDER / f'{name}.pkl')
+        if saved is None or (work is not None and saved['key'] != work):
+            return False
+        if plots:
+            result = saved['result']
+            jobs = result[0] if isinstance(result, tuple) else result
+            if not all(_figure_marker(j).exists() for j in jobs):
+                return False
+    return True
+
+
+def pending(cases, records_file=None, plots=True):
+    """
+    Cases that still have work to do. A case is finished when its stages and
+    figures are done and its record is in the records file.
+    """
+    from casesets import resolve
+    from records import recorded_cases
+    from runner import STAGES
+
+    recorded = recorded_cases(records_file) if records_file else set()
+    skipped = 0
+
+    for case in cases:
+        path, params = resolve(case)
+        if path.name in recorded and case_done(path, STAGES, plots, key(vars(params), settings())):
+            skipped += 1
+            continue
+        yield case
+
+    if skipped:
+        logging.info(f'Skipped {skipped} finished cases')
+
+
+class ChunkCheckpoint:
+    """
+    Checkpoint of a sweep that is evaluated in chunks. Each finished chunk
+    is saved to its own file so saving doesn't grow with the number of
+    chunks. Chunks saved for different inputs are removed.
+
+    Parameters
+    ----------
+    folder : pathlib.Path
+        Folder for the chunk files.
+    key : str
+        Hash of the inputs of the sweep from `key`.
+    """
+
+    def __init__(self, folder, key):
+        self.folder = pathlib.Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+        meta = self.folder / 'key'
+        if not meta.exists() or meta.read_text() != key:
+            for file in self.folder.glob('*.pkl'):
+                file.unlink()
+            meta.write_text(key)
+
+    def load(self):
+        """
+        Saved chunks as a dict of {chunk index: data}.
+        """
+        return {int(f.stem): load(f) for f in self.folder.glob('*.pkl')}
+
+    def save(self, index, data):
+        """
+        Save the data of a finished chunk.
+        """
+        save(self.folder / f'{index:06d}.pkl', data)
+
+    def clear(self):
+        """
+        Remove the chunks once the sweep is finished.
+        """
+        for file in self.folder.iterdir():
+            file.unlink()
+        self.folder.rmdir()
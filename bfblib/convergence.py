@@ -0,0 +1,299 @@
+import json
+import logging
+import math
+import os
+import pathlib
+import time
+
+import chemics as cm
+import numpy as np
+
+from particle import Particle
+from trans_heat_cond import hc2_threaded
+
+# Grid settings shared with worker processes through the environment as JSON
+# of the cache file and tolerance, empty when grids come from the parameters
+_ENV = 'BFBLIB_GRIDS'
+
+# Number of nodes of the refinement levels where the radius step halves from
+# one level to the next
+M_LEVELS = (13, 25, 49, 97, 193)
+
+# Number of time steps of the refinement levels
+NT_LEVELS = (125, 250, 500, 1000, 2000)
+
+# Formal order of accuracy of `hc2` in the radius step and time step which
+# is used when the observed order can't be estimated from the levels
+ORDER = {'m': 2, 'nt': 1}
+
+# Number of doublings beyond the finest level for grids chosen from the
+# error model of the levels
+EXTEND = 4
+
+# Width of the bins of the Biot and Fourier numbers of a regime in decades,
+# of the temperature rise in kelvin, and of the moisture content in percent
+BIN_DECADES = 0.25
+BIN_TK = 50
+BIN_MC = 5
+
+
+def enable(file, tol):
+    """
+    Choose the heat conduction grid of each case from convergence studies
+    cached in a JSON file in this process and any process started from it.
+    """
+    os.environ[_ENV] = json.dumps({'file': str(file), 'tol': tol})
+
+
+def settings():
+    """
+    Cache file and tolerance of the grid selection or None when grids come
+    from the parameters.
+    """
+    env = os.environ.get(_ENV)
+    return json.loads(env) if env else None
+
+
+def _fourier(d, x, k, Gb, Ti, t_max):
+    """
+    Fourier number α·t_max/r² of the particle with the heat capacity at the
+    initial temperature.
+    """
+    alpha = k / (Gb * 1000 * cm.cp_wood(x, Ti) * 1000)
+    return alpha * t_max / (d / 2)**2
+
+
+def regime(d, x, k, Gb, h, Ti, Tinf, b, t_max):
+    """
+    Parameter regime of a heat conduction solve as the bins of the Biot
+    number h·r/k, the Fourier number α·t_max/r² with the heat capacity at
+    the initial temperature, the temperature rise, and the moisture content.
+
+    Returns
+    -------
+    key : str
+        Name of the regime such as `b2-bi-3-fo5-dt10-mc0`.
+    upper : dict
+        Biot and Fourier numbers at the upper edge of the bins.
+    """
+    bi = h * d / 2 / k
+    fo = _fourier(d, x, k, Gb, Ti, t_max)
+
+    i_bi = math.floor(math.log10(bi) / BIN_DECADES)
+    i_fo = math.floor(math.log10(fo) / BIN_DECADES)
+    i_dt = math.floor((Tinf - Ti) / BIN_TK)
+    i_mc = math.floor(x / BIN_MC)
+
+    key = f'b{b:g}-bi{i_bi}-fo{i_fo}-dt{i_dt}-mc{i_mc}'
+    upper = {'bi': 10**((i_bi + 1) * BIN_DECADES), 'fo': 10**((i_fo + 1) * BIN_DECADES)}
+    return key, upper
+
+
+def _t_ref(t, tc, tk_ref):
+    """
+    Time when the center temperature reaches `tk_ref` interpolated between
+    time steps, NaN when it's not reached.
+    """
+    above = np.nonzero(tc > tk_ref)[0]
+    if above.size == 0 or above[0] == 0:
+        return np.nan
+    i = above[0]
+    return t[i - 1] + (tk_ref - tc[i - 1]) / (tc[i] - tc[i - 1]) * (t[i] - t[i - 1])
+
+
+def _center(t, tc, Tinf, nt):
+    """
+    Heating time and center temperatures at the times of the coarsest level
+    from the center temperatures of one `hc2` solve.
+    """
+    return _t_ref(t, tc, Tinf - 1), tc[::nt // NT_LEVELS[0]]
+
+
+def richardson(values, order):
+    """
+    Richardson extrapolation of a sequence of values, scalars or arrays,
+    from levels where the grid step halves. The order of accuracy is
+    estimated from the last three levels with the max norm of their
+    differences.
+
+    Returns
+    -------
+    value : float or array
+        Extrapolated value for a zero grid step.
+    p : float
+        Observed order of accuracy, or `order` when the differences don't
+        decrease.
+    """
+    f1, f2, f3 = (np.asarray(v, dtype=float) for v in values[-3:])
+    d12 = np.max(np.abs(f2 - f1))
+    d23 = np.max(np.abs(f3 - f2))
+
+    p = order
+    if d23 > 0 and d12 > d23:
+        p = math.log2(d12 / d23)
+
+    return f3 + (f3 - f2) / (2**p - 1), p
+
+
+def _error_model(levels, errors, p, nodes):
+    """
+    Error of each sampled level and of the levels beyond the finest one from
+    the error of the finest level which decreases as the grid step to the
+    power of p. The step is 1 / (m - 1) for `nodes` and 1 / nt otherwise.
+    """
+    model = dict(zip(levels, errors))
+    steps = levels[-1] - 1 if nodes else levels[-1]
+    for i in range(1, EXTEND + 1):
+        lev = steps * 2**i + 1 if nodes else steps * 2**i
+        model[lev] = errors[-1] / 2**(i * p)
+    return model
+
+
+def study(d, x, k, Gb, h, Ti, Tinf, b, t_max, tol=1e-3, threads=None):
+    """
+    Convergence study of `hc2` which solves at the refinement levels of the
+    number of nodes with the finest time step and of the number of time
+    steps with the finest radius step in parallel processes. The heating
+    time `t_ref` and the center temperatures of each level are compared to
+    their Richardson extrapolation, and the error of a grid is the sum of
+    its node and time step errors. The heating time of `calc_time_tkinf` is
+    the time step after the center reaches Tinf - 1 K so its error also
+    includes one time step. The cheapest grid by m·nt whose relative error
+    in `t_ref` and in the center temperature, relative to the temperature
+    rise, is within the tolerance is chosen.
+
+    Parameters
+    ----------
+    d, x, k, Gb, h, Ti, Tinf, b : float
+        Biomass particle parameters, see `hc2` for descriptions and units.
+    t_max : float
+        Time duration of the solve [s].
+    tol : float
+        Relative error tolerance.
+    threads : int, optional
+        Number of threads of the solves, default from `thread_count`, see
+        `hc2_threaded`.
+
+    Returns
+    -------
+    result : dict
+        Number of nodes `m` and time steps `nt`, the estimated `error` of
+        the grid, the observed `order` and extrapolated `t_ref`, and the run
+        time of the study [s].
+    """
+    t0 = time.perf_counter()
+    m_fine, nt_fine = M_LEVELS[-1], NT_LEVELS[-1]
+    jobs = [(m, nt_fine) for m in M_LEVELS] + [(m_fine, nt) for nt in NT_LEVELS[:-1]]
+
+    # the solves run in threads of this process, which also works in daemonic
+    # pool workers that can't start processes of their own
+    times = [Particle.build_time_vector(nt, t_max) for _, nt in jobs]
+    tks = hc2_threaded([(d, x, k, Gb, h, Ti, Tinf, b, m, t) for (m, _), t in zip(jobs, times)], threads)
+    runs = [_center(t, tk[:, 0], Tinf, nt) for (_, nt), t, tk in zip(jobs, times, tks)]
+
+    t_ref = dict(zip(jobs, (r[0] for r in runs)))
+    tc = dict(zip(jobs, (r[1] for r in runs)))
+    if np.isnan(t_ref[m_fine, nt_fine]):
+        raise ValueError(f'Particle center is not heated within t_max = {t_max} s for the convergence study.')
+
+    series = {'m': [(m, nt_fine) for m in M_LEVELS], 'nt': [(m_fine, nt) for nt in NT_LEVELS]}
+    rise = Tinf - Ti
+    models, orders, t_ref_inf = {}, {}, {}
+    for axis, grids in series.items():
+        levels = M_LEVELS if axis == 'm' else NT_LEVELS
+        t_inf, p_t = richardson([t_ref[g] for g in grids], ORDER[axis])
+        tc_inf, p_c = richardson([tc[g] for g in grids], ORDER[axis])
+        err_t = [abs(t_ref[g] - t_inf) / t_inf for g in grids]
+        err_c = [np.max(np.abs(tc[g] - tc_inf)) / rise for g in grids]
+        nodes = axis == 'm'
+        models[axis] = {'t_ref': _error_model(levels, err_t, p_t, nodes),
+                        'tk_center': _error_model(levels, err_c, p_c, nodes)}
+        orders[axis] = {'t_ref': p_t, 'tk_center': p_c}
+        t_ref_inf[axis] = float(t_inf)
+
+    ref = t_ref_inf['nt']
+    best = None
+    for m in models['m']['t_ref']:
+        for nt in models['nt']['t_ref']:
+            err_t = models['m']['t_ref'][m] + models['nt']['t_ref'][nt] + t_max / nt / ref
+            err_c = models['m']['tk_center'][m] + models['nt']['tk_center'][nt]
+            err = max(err_t, err_c)
+            if err <= tol and (best is None or (m * nt, m) < (best['m'] * best['nt'], best['m'])):
+                best = {'m': m, 'nt': nt, 'error': {'t_ref': err_t, 'tk_center': err_c}}
+
+    if best is None:
+        raise ValueError(f'No grid up to m = {max(models["m"]["t_ref"])} and nt = {max(models["nt"]["t_ref"])} '
+                         f'meets the tolerance {tol:g} for the convergence study.')
+
+    best['order'] = orders
+    best['t_ref'] = ref
+    best['tol'] = tol
+    best['seconds'] = time.perf_counter() - t0
+    return best
+
+
+def _load(file):
+    try:
+        with open(file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save(file, cache):
+    """
+    Write the cache atomically by replacing it with a complete temporary
+    file, entries added by other processes in the meantime are kept.
+    """
+    file = pathlib.Path(file)
+    merged = {**_load(file), **cache}
+    tmp = file.with_name(f'.{file.name}.{os.getpid()}')
+    with open(tmp, 'w') as f:
+        json.dump(merged, f, indent=4)
+    os.replace(tmp, file)
+
+
+def select_grid(d, x, k, Gb, h, Ti, Tinf, b, t_max, file, tol=1e-3):
+    """
+    Grid of a heat conduction solve from the convergence study of its
+    parameter regime which is cached in a JSON file. A regime that isn't in
+    the cache is studied at the upper edges of its Biot and Fourier number
+    bins, which need the finest grid of the regime, and added to the cache.
+
+    Returns
+    -------
+    m, nt : int
+        Number of nodes and time steps.
+    """
+    key, upper = regime(d, x, k, Gb, h, Ti, Tinf, b, t_max)
+    key = f'{key}-tol{tol:g}'
+    cache = _load(file)
+
+    if key not in cache:
+        # the study solves for a longer time with the same number of time
+        # steps so its time step is the largest of the regime
+        r = d / 2
+        h_up = upper['bi'] * k / r
+        t_up = t_max * upper['fo'] / _fourier(d, x, k, Gb, Ti, t_max)
+        cache[key] = study(d, x, k, Gb, h_up, Ti, Tinf, b, t_up, tol)
+        _save(file, {key: cache[key]})
+        logging.info(f"Grid for regime {key}: m = {cache[key]['m']}, nt = {cache[key]['nt']} "
+                     f"from convergence study in {cache[key]['seconds']:.2f} s")
+
+    return cache[key]['m'], cache[key]['nt']
+
+
+def grid(biomass, tk):
+    """
+    Number of nodes and time steps for the heat conduction solve of the
+    biomass parameters at gas temperature `tk` [K], from the convergence
+    studies when grid selection is on, otherwise the `m` and `nt`
+    parameters.
+    """
+    st = settings()
+    if st is None:
+        return biomass['m'], biomass['nt']
+
+    bm = biomass
+    return select_grid(bm['dp'], bm['mc'], bm['k'], bm['rho'] / 1000, bm['h'], bm['tk_init'], tk,
+                       bm['b'], bm['t_max'], st['file'], st['tol'])
@@ -1,5 +1,7 @@
 import chemics as cm
 
+from profiling import profiled
+
 
 class Gas:
     """
@@ -23,6 +25,7 @@ class Gas:
         Density [kg/m³]
     """
 
+    @profiled('gas')
     def __init__(self, sp, x, p, tk, eq='herning'):
         self.sp = sp
         self.x = x
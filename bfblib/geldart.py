@@ -0,0 +1,126 @@
+import numpy as np
+
+# Geldart groups in order of increasing particle diameter
+GROUPS = np.array(['C', 'A', 'B', 'D'])
+
+# Boundary between groups A and B where (ρs - ρg)·dp = 225 with dp in µm
+# and densities in g/cm³ from equation 6 of Geldart 1973
+AB = 225
+
+# Boundary between groups B and D where (ρs - ρg)·dp² = 10⁶ from equation 8
+# of Geldart 1973
+BD = 1e6
+
+# Boundary between groups C and A as the middle of the band of the
+# `cm.geldart_chart` figure which is digitized from Figure 2 in Khawaja 2015,
+# density difference [g/cm³] in increasing order and diameter [µm]
+CA_RHO = np.array([
+    0.24, 0.255, 0.275, 0.295, 0.319, 0.349, 0.384, 0.424, 0.464, 0.519, 0.574, 0.634, 0.719,
+    0.804, 0.913, 1.042, 1.202, 1.411, 1.65, 1.96, 2.338, 2.8, 3.388, 4.118, 5.001, 6.096
+])
+CA_DP = np.array([
+    82.0, 77.8, 70.3, 63.6, 57.5, 52.0, 47.4, 43.2, 39.4, 36.2, 33.2, 30.7, 28.4,
+    26.3, 24.7, 23.3, 22.2, 21.4, 20.6, 20.1, 19.7, 19.5, 19.3, 19.4, 19.3, 19.2
+])
+
+
+def boundaries(rhod):
+    """
+    Particle diameters [µm] of the C/A, A/B, and B/D boundaries of the
+    Geldart chart for density differences ρs - ρg [g/cm³]. The C/A boundary
+    is constant beyond the digitized range of density differences.
+    """
+    rhod = np.asarray(rhod, dtype=float)
+    dp_ca = np.interp(np.log(rhod), np.log(CA_RHO), CA_DP)
+    dp_ab = AB / rhod
+    dp_bd = np.sqrt(BD / rhod)
+    return dp_ca, dp_ab, dp_bd
+
+
+def classify(dp, rhos, rhog):
+    """
+    Geldart group of particles for arrays of diameter and densities from one
+    broadcast evaluation of the chart boundaries without drawing the chart.
+
+    Parameters
+    ----------
+    dp : array or dict
+        Particle diameters [m], or the diameter [m] of each size class of a
+        particle size distribution by label such as `{'dp_min': 0.0001,
+        'dp': 0.0003, 'dp_max': 0.0005}`.
+    rhos : array
+        Particle densities [kg/m³].
+    rhog : array
+        Gas densities [kg/m³].
+
+    Returns
+    -------
+    results : dict
+        Arrays of the group label and of the distance to the `ca`, `ab`, and
+        `bd` boundaries as log10 of the diameter over the boundary diameter
+        at the same density difference, positive for particles coarser than
+        the boundary. The `margin` is the distance to the nearest boundary.
+        Arrays have the broadcast shape of the inputs with a first axis for
+        the size classes when `dp` is a dict whose labels are `size_class`.
+    """
+    labels = None
+    if isinstance(dp, dict):
+        labels = list(dp)
+        # size classes are broadcast against the densities before stacking so
+        # the results have a first axis for the classes and then the sweep axes
+        *sizes, rhos, rhog = np.broadcast_arrays(
+            *(np.asarray(v, dtype=float) for v in dp.values()),
+            np.asarray(rhos, dtype=float), np.asarray(rhog, dtype=float))
+        dp = np.stack(sizes)
+
+    # chart units are µm and g/cm³
+    um = np.asarray(dp, dtype=float) * 1e6
+    rhod = (np.asarray(rhos, dtype=float) - np.asarray(rhog, dtype=float)) * 0.001
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dp_ca, dp_ab, dp_bd = boundaries(rhod)
+        ca = np.log10(um / dp_ca)
+        ab = np.log10(um / dp_ab)
+        bd = np.log10(um / dp_bd)
+
+    # a group lies between its two boundaries so the index of the group is
+    # the number of boundaries the particle is coarser than, where group A
+    # vanishes for dense particles with the A/B boundary below the C/A one
+    index = np.where(ca < 0, 0, np.where(bd >= 0, 3, np.where(ab >= 0, 2, 1)))
+
+    results = {
+        'group': GROUPS[index],
+        'ca': ca,
+        'ab': ab,
+        'bd': bd,
+        'margin': np.minimum(np.minimum(np.abs(ca), np.abs(ab)), np.abs(bd))
+    }
+    if labels is not None:
+        results['size_class'] = labels
+    return results
+
+
+def classify_case(params, inputs=None, sizes=('dp_min', 'dp', 'dp_max')):
+    """
+    Geldart group of the bed particle size classes of a case for arrays of
+    input parameters such as `bed.dp` or `gas.tk` which replace the case
+    parameters, see `vectorized.evaluate`. The gas density is evaluated
+    with the case gas mixture.
+
+    Returns
+    -------
+    results : dict
+        Results of `classify` with a first axis for the `sizes` of the bed
+        particles.
+    """
+    from vectorized import GasArray, param_value
+
+    inputs = inputs or {}
+    pm = params
+
+    def val(name):
+        return param_value(pm, inputs, name)
+
+    gas = GasArray(pm.gas['sp'], pm.gas['x'], val('gas.p'), val('gas.tk'))
+    dp = {size: val(f'bed.{size}') for size in sizes}
+    return classify(dp, val('bed.rho'), gas.rho)
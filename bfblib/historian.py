@@ -0,0 +1,188 @@
+import logging
+import pathlib
+import time
+
+import numpy as np
+
+from vectorized import evaluate
+
+# Results of `evaluate` that are written for each row of a replay
+REPLAY_OUTPUTS = (
+    'rhog', 'umb', 'umf_ergun', 'umf_wenyu', 'ut_bed_haider', 'ut_bio_haider',
+    'us', 'us_umf_ergun', 'us_umf_wenyu', 'tdh_chan', 'tdh_horio', 'zexp_ergun', 'zexp_wenyu'
+)
+
+# Margins of the superficial gas velocity written after the results where a
+# ratio above one means the gas velocity is below the terminal velocity of
+# the particles or above the minimum bubbling velocity
+MARGINS = {
+    'ut_bed_us': ('ut_bed_haider', 'us'),
+    'ut_bio_us': ('ut_bio_haider', 'us'),
+    'us_umb': ('us', 'umb')
+}
+
+# Number of rows read, evaluated, and written at a time
+CHUNK = 100_000
+
+# Format of the float values of a CSV output which are written with seven
+# significant digits, about the precision of logged measurements, since
+# formatting the full precision takes most of the time of a CSV replay
+FLOAT_FORMAT = '%.7g'
+
+# Seconds between progress messages of a replay
+PROGRESS = 10.0
+
+
+def read_chunks(file, chunksize=CHUNK):
+    """
+    Chunks of a historian file as dicts of column arrays. CSV files are read
+    with a header row of column names. NumPy `.npy` files of a structured
+    array are memory mapped so only the rows of a chunk are read.
+
+    Returns
+    -------
+    chunks : generator
+        Dict of column arrays for each chunk.
+    rows : int or None
+        Number of rows of a `.npy` file, None for a CSV file.
+    """
+    file = pathlib.Path(file)
+
+    if file.suffix == '.npy':
+        data = np.load(file, mmap_mode='r')
+        if data.dtype.names is None:
+            raise ValueError(f'Historian file {file} must be a structured array with named columns.')
+
+        def chunks():
+            for i in range(0, len(data), chunksize):
+                block = data[i:i + chunksize]
+                yield {name: np.array(block[name]) for name in data.dtype.names}
+
+        return chunks(), len(data)
+
+    if file.suffix == '.csv':
+        import pandas as pd
+
+        def chunks():
+            with pd.read_csv(file, chunksize=chunksize) as reader:
+                for df in reader:
+                    yield {name: df[name].to_numpy() for name in df.columns}
+
+        return chunks(), None
+
+    raise ValueError(f'Historian file {file} must be a .csv or .npy file.')
+
+
+def evaluate_chunk(params, columns, chunk, outputs=REPLAY_OUTPUTS):
+    """
+    Results and velocity margins of the vectorized model for one chunk of
+    historian rows.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case which are used for the inputs that are not
+        logged.
+    columns : dict
+        Parameter name of each logged column such as `{'TI-101': 'gas.tk'}`.
+    chunk : dict
+        Column arrays of the chunk.
+    outputs : tuple
+        Names of the results.
+
+    Returns
+    -------
+    derived : dict
+        Array of each result and margin for the rows of the chunk.
+    """
+    inputs = {name: np.asarray(chunk[col], dtype=float) for col, name in columns.items()}
+    n = len(next(iter(chunk.values())))
+
+    needed = set(outputs) | {v for pair in MARGINS.values() for v in pair}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        res = evaluate(params, inputs, tuple(sorted(needed)))
+        derived = {name: np.broadcast_to(res[name], n) for name in outputs}
+        for name, (num, den) in MARGINS.items():
+            derived[name] = np.broadcast_to(res[num] / res[den], n)
+
+    return derived
+
+
+def replay(params, file, out, columns, chunksize=CHUNK, outputs=REPLAY_OUTPUTS):
+    """
+    Replay a plant historian file through the vectorized gas, particle, and
+    reactor models in chunks. Each chunk is evaluated and its rows are
+    written before the next chunk is read so memory doesn't grow with the
+    length of the file. The output has the logged columns followed by the
+    results and velocity margins.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case.
+    file : pathlib.Path
+        Historian `.csv` or `.npy` file.
+    out : pathlib.Path
+        Output `.csv` file which is appended to chunk by chunk, or `.npy`
+        file of a structured array for a `.npy` historian file.
+    columns : dict
+        Parameter name of each logged column such as `{'TI-101': 'gas.tk',
+        'PI-101': 'gas.p', 'FI-101': 'reactor.q'}` where values are in the
+        units of the parameters.
+    chunksize : int
+        Number of rows of a chunk.
+    outputs : tuple
+        Names of the results of `evaluate` that are written.
+
+    Returns
+    -------
+    stats : dict
+        Number of rows and chunks, run time [s], and rows per second.
+    """
+    out = pathlib.Path(out)
+    chunks, rows = read_chunks(file, chunksize)
+    if out.suffix == '.npy' and rows is None:
+        raise ValueError('A .npy output needs a .npy historian file with a known number of rows.')
+
+    t0 = time.perf_counter()
+    last = t0
+    n = 0
+    k = 0
+    table = None
+
+    for chunk in chunks:
+        missing = set(columns) - set(chunk)
+        if missing:
+            raise ValueError(f'Columns not in historian file: {", ".join(sorted(missing))}')
+
+        derived = evaluate_chunk(params, columns, chunk, outputs)
+        size = len(next(iter(chunk.values())))
+
+        if out.suffix == '.npy':
+            if table is None:
+                fields = [(name, arr.dtype) for name, arr in chunk.items()] + [(name, np.float64) for name in derived]
+                table = np.lib.format.open_memmap(out, mode='w+', dtype=fields, shape=(rows,))
+            block = table[n:n + size]
+            for name, arr in {**chunk, **derived}.items():
+                block[name] = arr
+        else:
+            import pandas as pd
+            df = pd.DataFrame({**chunk, **derived})
+            df.to_csv(out, mode='w' if k == 0 else 'a', header=(k == 0), index=False, float_format=FLOAT_FORMAT)
+
+        n += size
+        k += 1
+
+        now = time.perf_counter()
+        if now - last >= PROGRESS:
+            logging.info(f'Replayed {n:,} rows at {n / (now - t0):,.0f} rows/s')
+            last = now
+
+    if table is not None:
+        table.flush()
+        del table
+
+    seconds = time.perf_counter() - t0
+    stats = {'rows': n, 'chunks': k, 'seconds': seconds, 'rows_per_s': n / seconds if seconds > 0 else 0.0}
+    logging.info(f'Replayed {n:,} rows in {k} chunks in {seconds:.2f} s at {stats["rows_per_s"]:,.0f} rows/s')
+    return stats
@@ -0,0 +1,228 @@
+import json
+import logging
+import time
+
+import numpy as np
+
+import surrogate
+from particle import Particle
+from trans_heat_cond import hc2_batch
+from vectorized import OUTPUTS, evaluate, param_value
+
+# Number of input values evaluated together to find the bracket of the root
+SCAN = 9
+
+# Time duration of the heat conduction solves relative to their `t_max`
+# where each solve stops once the particle center is heated
+HORIZON = 10
+
+
+class InverseModel:
+    """
+    Cached model evaluations for one input parameter of a case with the other
+    parameters fixed. Values that were already evaluated are taken from the
+    cache and new values are evaluated together with the vectorized model.
+    The biomass heating time is solved with heat conduction solves that stop
+    when the particle center reaches the gas temperature and the time is
+    interpolated between time steps so it's continuous in the input.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case.
+    name : str
+        Input parameter such as `reactor.q`.
+    outputs : tuple
+        Names of the results evaluated for each input value.
+    fixed : dict, optional
+        Values of other parameters that replace the case parameters.
+    m, nt, t_max : int, int, float
+        Number of nodes, number of time steps, and time duration [s] for the
+        heat conduction solves of `t_ref` where the solves continue up to
+        `HORIZON` times the time duration.
+
+    Attributes
+    ----------
+    evaluations : int
+        Number of input values evaluated by the model.
+    calls : int
+        Number of input values requested including cached values.
+    """
+
+    def __init__(self, params, name, outputs, fixed=None, m=50, nt=1000, t_max=5):
+        unknown = set(outputs) - set(OUTPUTS)
+        if unknown:
+            raise ValueError(f'Results not available: {", ".join(sorted(unknown))}')
+
+        self.params = params
+        self.name = name
+        self.outputs = tuple(outputs)
+        self.fixed = fixed or {}
+        self.evaluations = 0
+        self.calls = 0
+        self._cache = {}
+        self._m = m
+        self._t = Particle.build_time_vector(nt * HORIZON, t_max * HORIZON)
+
+    def __call__(self, x):
+        """
+        Results for an array of input values.
+
+        Returns
+        -------
+        results : dict
+            Array of each output for the input values.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        self.calls += x.size
+
+        new = np.array([v for v in np.unique(x) if v not in self._cache])
+        if new.size:
+            res = self._evaluate(new)
+            for i, v in enumerate(new):
+                self._cache[v] = {name: float(res[name][i]) for name in self.outputs}
+            self.evaluations += new.size
+
+        return {name: np.array([self._cache[v][name] for v in x]) for name in self.outputs}
+
+    def _evaluate(self, x):
+        """
+        Evaluate the outputs for new input values.
+        """
+        n = x.size
+        inputs = {k: np.full(n, v, dtype=float) for k, v in self.fixed.items()}
+        inputs[self.name] = x
+
+        # results that aren't requested can be invalid for some inputs such
+        # as the expanded bed height below minimum fluidization
+        with np.errstate(invalid='ignore'):
+            res = dict(evaluate(self.params, inputs, tuple(o for o in self.outputs if o != 't_ref')))
+
+        if 't_ref' in self.outputs:
+            pm = self.params
+            val = lambda name: param_value(pm, inputs, name)  # noqa: E731
+            args = np.broadcast_arrays(val('biomass.dp'), val('biomass.mc'), val('biomass.k'),
+                                       val('biomass.rho') / 1000, val('biomass.h'), val('biomass.tk_init'),
+                                       val('gas.tk'), np.empty(n))
+            # t_ref is NaN for particles that are not heated within the
+            # horizon so their inputs can't bracket a root
+            b = pm.biomass['b']
+            res['t_ref'] = surrogate.apply('t_ref', lambda *a: hc2_batch(*a[:7], b, self._m, self._t, interp=True)[0],
+                                           *(a.ravel() for a in args[:7]), b)
+
+        return {name: np.broadcast_to(res[name], n) for name in self.outputs}
+
+
+def default_bracket(params, name):
+    """
+    Range of an input parameter from its `_min` and `_max` parameters when
+    the case has them, otherwise a factor of ten around the case value.
+    """
+    group, key = name.split('.')
+    values = getattr(params, group)
+    if f'{key}_min' in values and f'{key}_max' in values:
+        return values[f'{key}_min'], values[f'{key}_max']
+    x0 = values[key]
+    return x0 / 10, x0 * 10
+
+
+def solve_input(params, name, output, target, bracket=None, fixed=None, xtol=1e-12, rtol=1e-10):
+    """
+    Find the value of an input parameter where a result of the case equals a
+    target. The bracket is first scanned with one batch of model evaluations
+    to find where the result crosses the target then the root is found by
+    Brent's method within that interval.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case.
+    name : str
+        Input parameter to solve for such as `reactor.q`, `biomass.dp`, or
+        `gas.tk`.
+    output : str
+        Result that should equal the target such as `us_umf_ergun`.
+    target : float or str
+        Target value, or the name of another result such as `tv` for the
+        diameter where the heating time equals the devolatilization time.
+    bracket : tuple, optional
+        Lower and upper values of the input, default from `default_bracket`.
+    fixed : dict, optional
+        Values of other parameters that replace the case parameters such as
+        `{'gas.tk': 773.15}`.
+    xtol, rtol : float
+        Absolute and relative tolerance of the input value.
+
+    Returns
+    -------
+    result : dict
+        Input value, result and target values at the input value, number of
+        model evaluations, iterations of Brent's method, and run time [s].
+    """
+    from scipy.optimize import brentq
+
+    t0 = time.perf_counter()
+    outputs = (output, target) if isinstance(target, str) else (output,)
+    model = InverseModel(params, name, outputs, fixed)
+    lo, hi = bracket or default_bracket(params, name)
+
+    def residual(x):
+        res = model(x)
+        goal = res[target] if isinstance(target, str) else target
+        return res[output] - goal
+
+    # positive inputs such as diameters and flows are scanned on a log scale
+    if lo > 0:
+        xs = np.geomspace(lo, hi, SCAN)
+    else:
+        xs = np.linspace(lo, hi, SCAN)
+    r = residual(xs)
+
+    # intervals with a NaN result at either end are skipped
+    cross = np.nonzero(np.sign(r[:-1]) * np.sign(r[1:]) <= 0)[0]
+    if cross.size == 0:
+        raise ValueError(f'{output} does not reach the target for {name} from {lo:.6g} to {hi:.6g}, '
+                         f'difference from target is {np.nanmin(r):.6g} to {np.nanmax(r):.6g}.')
+
+    i = cross[0]
+    x, info = brentq(lambda v: residual(v)[0], xs[i], xs[i + 1], xtol=xtol, rtol=rtol, full_output=True)
+    if np.isnan(x):
+        raise ValueError(f'{output} is not available between {xs[i]:.6g} and {xs[i + 1]:.6g} for {name}.')
+    res = model(x)
+
+    result = {
+        'input': name,
+        'value': float(x),
+        'output': output,
+        'output_value': float(res[output][0]),
+        'target': target,
+        'target_value': float(res[target][0]) if isinstance(target, str) else float(target),
+        'bracket': [float(xs[i]), float(xs[i + 1])],
+        'fixed': fixed or {},
+        'converged': bool(info.converged),
+        'iterations': info.iterations,
+        'evaluations': model.evaluations,
+        'cache_hits': model.calls - model.evaluations,
+        'seconds': time.perf_counter() - t0
+    }
+    return result
+
+
+def write_result(result, path):
+    """
+    Add an inverse design result to the `inverse.json` file in the path and
+    log it.
+    """
+    file = path / 'inverse.json'
+    results = []
+    if file.exists():
+        with open(file) as f:
+            results = json.load(f)
+
+    results.append(result)
+    with open(file, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    logging.info(f"{result['input']} = {result['value']:.6g} for {result['output']} = "
+                 f"{result['output_value']:.6g} (target {result['target_value']:.6g}) with "
+                 f"{result['evaluations']} evaluations in {result['seconds']:.2f} s")
@@ -0,0 +1,375 @@
+import collections
+import json
+import logging
+import math
+import socket
+import sys
+import time
+
+import chemics as cm
+import numpy as np
+
+from bfbreactor import BfbReactor
+from particle import Particle
+from vectorized import mu_coeffs
+
+# Inputs of an operating point update which are the parameters named by
+# group and key
+INPUTS = (
+    'gas.sp', 'gas.x', 'gas.p', 'gas.tk',
+    'bed.dp', 'bed.phi', 'bed.rho',
+    'reactor.di', 'reactor.ep', 'reactor.q'
+)
+
+# Quantities of the monitor in order of evaluation with the inputs and
+# quantities each one depends on
+DEPENDS = {
+    'gas': ('gas.sp', 'gas.x', 'gas.p', 'gas.tk'),
+    'umb': ('gas', 'bed.dp'),
+    'umf_ergun': ('gas', 'bed.dp', 'bed.phi', 'bed.rho', 'reactor.ep'),
+    'ut_bed_haider': ('gas', 'bed.dp', 'bed.phi', 'bed.rho'),
+    'us': ('gas', 'reactor.di', 'reactor.q'),
+    'us_umf': ('us', 'umf_ergun'),
+    'us_umb': ('us', 'umb'),
+    'us_ut_bed': ('us', 'ut_bed_haider')
+}
+
+# Alarm of each quantity as the direction and threshold of the alarm state,
+# Us above a fraction of the bed particle terminal velocity where particles
+# are entrained or Us below the minimum bubbling velocity
+ALARMS = {
+    'us_ut_bed': ('above', 0.8),
+    'us_umb': ('below', 1.0)
+}
+
+# Relative deadband of the thresholds so a value that hovers at a threshold
+# doesn't raise and clear its alarm on every update
+DEADBAND = 0.05
+
+# Latency budget of the 99th percentile of the updates [s], each update
+# evaluates at most every quantity once with closed-form correlations and no
+# iterations or solves so its time is bounded apart from the scheduling and
+# garbage collection pauses of the process
+LATENCY = 1e-3
+
+# Number of recent update latencies kept for the statistics
+WINDOW = 10_000
+
+# Seconds between checks for new lines of a followed file
+POLL = 0.1
+
+
+class GasState:
+    """
+    Gas properties of the monitor which keep the molecular weights and
+    viscosity coefficients of a composition. A new composition is looked up
+    once, a temperature update only evaluates the viscosity and density, and
+    a pressure update only the density. Attributes are the same as the `Gas`
+    class, see `vectorized.GasArray` for the mixture viscosity.
+    """
+
+    def __init__(self):
+        self.sp = self.x = self.p = self.tk = None
+        self.mw = self.mu = self.rho = None
+        self._comp = None
+
+    def update(self, sp, x, p, tk):
+        """
+        Update the properties for new conditions.
+
+        Returns
+        -------
+        changed : bool
+            True when any property changed.
+        """
+        comp = (tuple(sp), tuple(x))
+        new_comp = comp != self._comp
+        if new_comp:
+            mws = np.array([cm.mw(s) for s in sp])
+            self._coeffs = np.array([mu_coeffs(s) for s in sp])
+            self._w = np.asarray(x) * np.sqrt(mws)
+            self.mw = mws[0] if len(sp) == 1 else float(cm.mw_mix(mws, x))
+            self.sp, self.x, self._comp = list(sp), list(x), comp
+
+        if new_comp or tk != self.tk:
+            tmin, tmax, a, b, c, d = self._coeffs.T
+            if np.any((tk < tmin) | (tk > tmax)):
+                raise ValueError(f'Temperature {tk} K out of range of the gas viscosity data.')
+            mus = a + b * tk + c * tk**2 + d * tk**3
+            self.mu = mus[0] if len(sp) == 1 else float(np.sum(mus * self._w) / np.sum(self._w))
+            self.tk = tk
+            self.p = None
+
+        if p != self.p:
+            self.rho = cm.rhog(self.mw, p, tk)
+            self.p = p
+            return True
+
+        return new_comp
+
+
+class Monitor:
+    """
+    Incremental monitor of a reactor operating point. Each update sets some
+    of the `INPUTS` and only the quantities that depend on them are
+    evaluated again. An event is emitted when a quantity of `ALARMS` crosses
+    its threshold and when it clears with the `DEADBAND`.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case which are the initial operating point.
+    alarms : dict, optional
+        Direction and threshold of each alarm, default is `ALARMS`.
+
+    Attributes
+    ----------
+    values : dict
+        Latest value of each quantity.
+    active : set
+        Alarms in the alarm state.
+    latencies : deque
+        Seconds of the recent updates.
+    """
+
+    def __init__(self, params, alarms=None):
+        self.alarms = dict(ALARMS if alarms is None else alarms)
+        self.values = {}
+        self.active = set()
+        self.latencies = collections.deque(maxlen=WINDOW)
+        self.updates = 0
+        self.evaluated = collections.Counter()
+
+        self._inputs = {name: getattr(params, name.split('.')[0])[name.split('.')[1]] for name in INPUTS}
+        self._gas = GasState()
+        self._evaluate(set(DEPENDS))
+
+    def _evaluate(self, dirty):
+        """
+        Evaluate the dirty quantities in order where a quantity that changed
+        makes the quantities that depend on it dirty.
+        """
+        inp = self._inputs
+        bed = Particle(inp['bed.dp'], inp['bed.dp'], inp['bed.dp'], inp['bed.phi'], inp['bed.rho'])
+        gas = self._gas
+        v = self.values
+
+        for name, deps in DEPENDS.items():
+            if name not in dirty and dirty.isdisjoint(deps):
+                continue
+            dirty.add(name)
+            self.evaluated[name] += 1
+
+            if name == 'gas':
+                if not gas.update(inp['gas.sp'], inp['gas.x'], inp['gas.p'], inp['gas.tk']):
+                    dirty.discard(name)
+                v['rhog'] = float(gas.rho)
+                v['mug'] = float(gas.mu)
+            elif name == 'umb':
+                v[name] = float(bed.calc_umb(gas))
+            elif name == 'umf_ergun':
+                v[name] = float(bed.calc_umf_ergun(inp['reactor.ep'], gas))
+            elif name == 'ut_bed_haider':
+                v[name] = float(bed.calc_ut_haider(gas))
+            elif name == 'us':
+                v[name] = float(BfbReactor(inp['reactor.di'], inp['reactor.q'], 0).calc_us(gas))
+            elif name == 'us_umf':
+                v[name] = v['us'] / v['umf_ergun']
+            elif name == 'us_umb':
+                v[name] = v['us'] / v['umb']
+            elif name == 'us_ut_bed':
+                v[name] = v['us'] / v['ut_bed_haider']
+
+        return dirty
+
+    def _events(self, dirty, stamp):
+        """
+        Threshold crossing events of the alarms whose quantity changed.
+        """
+        events = []
+        for name, (direction, threshold) in self.alarms.items():
+            if name not in dirty:
+                continue
+            value = self.values[name]
+            sign = 1 if direction == 'above' else -1
+
+            if name not in self.active and sign * (value - threshold) >= 0:
+                self.active.add(name)
+                state = 'alarm'
+            elif name in self.active and sign * (value - threshold) < -DEADBAND * threshold:
+                self.active.discard(name)
+                state = 'clear'
+            else:
+                continue
+
+            events.append({'time': stamp, 'alarm': name, 'state': state, 'value': value,
+                           'threshold': threshold, 'direction': direction})
+        return events
+
+    def update(self, point):
+        """
+        Update the operating point with new input values.
+
+        Parameters
+        ----------
+        point : dict
+            Values of inputs such as `{'gas.tk': 780.0, 'reactor.q': 15.2}`
+            and an optional `time` stamp which is copied to the events.
+
+        Returns
+        -------
+        events : list
+            Threshold crossing events of the update with the latency of the
+            update [s].
+        """
+        t0 = time.perf_counter()
+        stamp = point.get('time')
+
+        unknown = set(point) - set(INPUTS) - {'time'}
+        if unknown:
+            raise ValueError(f'Inputs not available: {", ".join(sorted(unknown))}')
+
+        changed = {name for name, value in point.items() if name != 'time' and value != self._inputs[name]}
+        previous = {name: self._inputs[name] for name in changed}
+        self._inputs.update((name, point[name]) for name in changed)
+        try:
+            dirty = self._evaluate(changed)
+        except (ValueError, TypeError):
+            # an update that can't be evaluated leaves the operating point
+            # as it was
+            self._inputs.update(previous)
+            raise
+        events = self._events(dirty, stamp)
+
+        latency = time.perf_counter() - t0
+        self.latencies.append(latency)
+        self.updates += 1
+        for event in events:
+            event['latency'] = latency
+        return events
+
+    def stats(self):
+        """
+        Number of updates, median, 99th percentile, and maximum latency of
+        the recent updates [s], number of recent updates over the latency
+        budget, and the number of evaluations of each quantity.
+        """
+        lat = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            'updates': self.updates,
+            'p50': float(np.percentile(lat, 50)),
+            'p99': float(np.percentile(lat, 99)),
+            'max': float(lat.max()),
+            'budget': LATENCY,
+            'over': int(np.sum(lat > LATENCY)),
+            'evaluated': dict(self.evaluated)
+        }
+
+
+def read_lines(source, follow=True):
+    """
+    Lines of operating point updates from a source which is `-` for stdin,
+    `tcp:PORT` for the connections to a local socket which are served one
+    after another, or a file which is followed for new lines when `follow`
+    is True like `tail -f`.
+    """
+    if source == '-':
+        yield from sys.stdin
+        return
+
+    if source.startswith('tcp:'):
+        with socket.create_server(('localhost', int(source[4:]))) as server:
+            logging.info(f'Monitor listening on localhost:{source[4:]}')
+            while True:
+                conn, _ = server.accept()
+                with conn, conn.makefile('r') as f:
+                    yield from f
+
+    with open(source) as f:
+        while True:
+            line = f.readline()
+            if line:
+                yield line
+            elif follow:
+                time.sleep(POLL)
+            else:
+                return
+
+
+def run_monitor(params, lines, out=None):
+    """
+    Update the monitor with each JSON line of operating point values and
+    write each threshold crossing event as a JSON line. Lines that are not
+    valid updates are logged and skipped.
+
+    Returns
+    -------
+    monitor : Monitor
+        Monitor with the latency statistics of the updates.
+    """
+    out = out or sys.stdout
+    monitor = Monitor(params)
+    logging.info(f"Monitor {', '.join(f'{n} {d} {t:g}' for n, (d, t) in monitor.alarms.items())}")
+
+    try:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                events = monitor.update(json.loads(line))
+            except (ValueError, TypeError) as e:
+                logging.info(f'Skipped update {line.strip()!r}: {e}')
+                continue
+            for event in events:
+                print(json.dumps(event), file=out, flush=True)
+    except KeyboardInterrupt:
+        pass
+
+    st = monitor.stats()
+    logging.info(f"Monitor {st['updates']:,} updates, latency p50 {st['p50'] * 1e6:.0f} µs, "
+                 f"p99 {st['p99'] * 1e6:.0f} µs, max {st['max'] * 1e6:.0f} µs")
+    if st['p99'] > LATENCY:
+        logging.info(f'Latency p99 exceeded the budget of {LATENCY * 1e3:g} ms')
+    elif st['over']:
+        logging.info(f"{st['over']} of the recent updates exceeded the budget of {LATENCY * 1e3:g} ms")
+    return monitor
+
+
+def simulate(params, n, seed=0, rate=0.0):
+    """
+    Simulated feed of operating point updates as JSON lines for testing the
+    monitor. The gas temperature and pressure drift around the case values
+    and the gas flow sweeps on a log scale from below the minimum bubbling
+    velocity to near the terminal velocity of the bed particles, so both
+    alarms are raised and cleared. Every tenth update changes only the gas
+    flow and the gas composition changes every 1000 updates.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case.
+    n : int
+        Number of updates.
+    seed : int
+        Seed of the random drift.
+    rate : float
+        Updates per second, zero for no delay.
+    """
+    rng = np.random.default_rng(seed)
+    tk, p, q = params.gas['tk'], params.gas['p'], params.reactor['q']
+    x = list(params.gas['x'])
+
+    for i in range(n):
+        q_i = q * math.exp(2.3 * math.sin(2 * math.pi * i / 2000) + 0.01 * rng.standard_normal())
+        point = {'time': i, 'reactor.q': q_i}
+        if i % 10:
+            tk = float(np.clip(tk + rng.normal(0, 0.5), params.gas['tk'] - 50, params.gas['tk'] + 50))
+            p = float(p + rng.normal(0, 10))
+            point.update({'gas.tk': tk, 'gas.p': p})
+        if i % 1000 == 999 and len(x) > 1:
+            x = x[::-1]
+            point['gas.x'] = x
+
+        yield json.dumps(point) + '\n'
+        if rate:
+            time.sleep(1 / rate)
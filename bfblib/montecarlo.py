@@ -0,0 +1,210 @@
+import json
+import logging
+import time
+
+import numpy as np
+
+from checkpoint import ChunkCheckpoint, key, settings
+from vectorized import evaluate, precision_error
+
+# Results reported by the Monte Carlo analysis
+MC_OUTPUTS = (
+    'umf_ergun', 'umf_wenyu', 'ut_bed_ganser', 'ut_bed_haider', 'ut_bio_ganser', 'ut_bio_haider',
+    'us_umf_ergun', 'us_umf_wenyu', 'zexp_ergun', 'zexp_wenyu', 'tv', 'tv_min', 'tv_max', 't_ref'
+)
+
+# Particles whose minimum and maximum diameters follow a sampled mean
+# diameter unless they have their own distributions
+SIZE_CLASSES = ('bed', 'biomass')
+
+# Percentiles reported for each result
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+# Number of samples compared against float64 for a reduced precision run
+PRECISION_SAMPLES = 1000
+
+
+def sample(uncertainty, n, rng):
+    """
+    Sample the uncertain parameters from their declared distributions.
+
+    Parameters
+    ----------
+    uncertainty : dict
+        Distribution of each parameter such as `{'bed.phi': ('uniform', 0.86,
+        0.94)}`. Available distributions are `('normal', mean, sd)`,
+        `('truncnormal', mean, sd, low, high)`, `('uniform', low, high)`, and
+        `('triangular', low, mode, high)`.
+    n : int
+        Number of samples.
+    rng : numpy.random.Generator
+        Random number generator.
+
+    Returns
+    -------
+    samples : dict
+        Array of sampled values for each parameter.
+    """
+    samples = {}
+
+    for name, (dist, *args) in uncertainty.items():
+        if dist == 'normal':
+            samples[name] = rng.normal(args[0], args[1], n)
+        elif dist == 'truncnormal':
+            from scipy.stats import truncnorm
+            mean, sd, low, high = args
+            a, b = (low - mean) / sd, (high - mean) / sd
+            samples[name] = truncnorm.rvs(a, b, loc=mean, scale=sd, size=n, random_state=rng)
+        elif dist == 'uniform':
+            samples[name] = rng.uniform(args[0], args[1], n)
+        elif dist == 'triangular':
+            samples[name] = rng.triangular(args[0], args[1], args[2], n)
+        else:
+            raise ValueError(f'Distribution `{dist}` not available for {name}.')
+
+    return samples
+
+
+def scale_size_classes(params, samples):
+    """
+    Add the minimum and maximum diameters of each particle whose mean
+    diameter is sampled, scaled by the ratio of the sampled mean to the case
+    mean so the size distribution keeps its shape, unless they are sampled
+    themselves. The samples are updated in place and returned.
+    """
+    for group in SIZE_CLASSES:
+        sizes = getattr(params, group)
+        if f'{group}.dp' not in samples:
+            continue
+        ratio = samples[f'{group}.dp'] / sizes['dp']
+        for size in ('dp_min', 'dp_max'):
+            samples.setdefault(f'{group}.{size}', sizes[size] * ratio)
+
+    return samples
+
+
+def sample_case(params, n, rng):
+    """
+    Sample the uncertain parameters of a case, see `scale_size_classes` for
+    the particle size classes.
+    """
+    return scale_size_classes(params, sample(params.uncertainty, n, rng))
+
+
+def run_monte_carlo(params, n=None, outputs=MC_OUTPUTS, folder=None, dtype=None):
+    """
+    Propagate the uncertainty of the case parameters to the results by Monte
+    Carlo sampling, see `sample_case` for the particle size classes. Samples
+    are evaluated in chunks with the vectorized model so memory is bounded by
+    the chunk size plus one float per sample for each output.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case which define the `uncertainty` distributions
+        and the `montecarlo` settings.
+    n : int, optional
+        Number of samples instead of the `montecarlo['n']` setting.
+    outputs : tuple
+        Names of results to evaluate.
+    folder : pathlib.Path, optional
+        Folder for a checkpoint of each chunk. A run with the same inputs
+        continues after the saved chunks with the saved state of the random
+        number generator so its results are the same as an uninterrupted
+        run.
+    dtype : type, optional
+        Floating point type of the evaluation and stored samples such as
+        `np.float32`, default is float64. The error of a reduced precision
+        run is measured on `PRECISION_SAMPLES` extra samples evaluated in
+        both precisions.
+
+    Returns
+    -------
+    summary : dict
+        Number of samples, run time, and the mean, standard deviation,
+        percentiles, and fraction of invalid values for each output, and
+        the relative error of each output for a reduced precision run.
+    """
+    mc = params.montecarlo
+    n = n or mc['n']
+    chunk = mc['chunk']
+    rng = np.random.default_rng(mc['seed'])
+
+    values = {name: np.empty(n, dtype=dtype or float) for name in outputs}
+    t0 = time.perf_counter()
+    first = 0
+
+    if folder is not None:
+        ckpt = ChunkCheckpoint(folder, key(params.uncertainty, mc, n, outputs, settings(np.dtype(dtype or float).name)))
+        saved = ckpt.load()
+
+        # only chunks in order from the first are used since the random
+        # numbers of each chunk follow from the previous chunks
+        while first < n and first // chunk in saved:
+            data = saved[first // chunk]
+            stop = min(first + chunk, n)
+            for name in outputs:
+                values[name][first:stop] = data['values'][name]
+            rng.bit_generator.state = data['rng']
+            first = stop
+
+        if first:
+            logging.info(f'Resume Monte Carlo after {first:,} samples from checkpoint')
+
+    for start in range(first, n, chunk):
+        stop = min(start + chunk, n)
+        samples = sample_case(params, stop - start, rng)
+        res = evaluate(params, samples, outputs, m=mc['m'], nt=mc['nt'], t_max=mc['t_max'], dtype=dtype)
+
+        for name in outputs:
+            values[name][start:stop] = res[name]
+
+        if folder is not None:
+            data = {'values': {name: values[name][start:stop] for name in outputs}, 'rng': rng.bit_generator.state}
+            ckpt.save(start // chunk, data)
+
+        logging.info(f'Monte Carlo samples {stop:,} of {n:,}')
+
+    if folder is not None:
+        ckpt.clear()
+
+    summary = {'n': n, 'seed': mc['seed'], 'seconds': time.perf_counter() - t0, 'outputs': {}}
+
+    # error bounds from samples of another generator so the run itself is
+    # the same as a float64 run apart from precision
+    if dtype is not None and np.dtype(dtype) != np.float64:
+        check = sample_case(params, min(n, PRECISION_SAMPLES), np.random.default_rng(mc['seed'] + 1))
+        summary['dtype'] = np.dtype(dtype).name
+        summary['precision'] = precision_error(params, check, outputs, mc['m'], mc['nt'], mc['t_max'], dtype)
+
+    for name, v in values.items():
+        pct = np.nanpercentile(v, PERCENTILES)
+        summary['outputs'][name] = {
+            'mean': float(np.nanmean(v)),
+            'std': float(np.nanstd(v)),
+            'percentiles': {f'p{p}': float(x) for p, x in zip(PERCENTILES, pct)},
+            'nan_fraction': float(np.isnan(v).mean())
+        }
+
+    return summary
+
+
+def write_summary(summary, path):
+    """
+    Write Monte Carlo summary to the `montecarlo.json` file in the path and
+    log the median and 5th to 95th percentile range of each output.
+    """
+    with open(path / 'montecarlo.json', 'w') as f:
+        json.dump(summary, f, indent=4)
+
+    logging.info(f"{summary['n']:,} samples in {summary['seconds']:.2f} s")
+    logging.info(f"{'output':<14} {'p5':>10} {'p50':>10} {'p95':>10}")
+
+    for name, out in summary['outputs'].items():
+        pct = out['percentiles']
+        logging.info(f"{name:<14} {pct['p5']:>10.4g} {pct['p50']:>10.4g} {pct['p95']:>10.4g}")
+
+    if 'precision' in summary:
+        name, err = max(summary['precision'].items(), key=lambda e: e[1]['max'])
+        logging.info(f"{summary['dtype']} evaluation, largest relative error against float64 is "
+                     f"{err['max']:.2e} for {name}")
@@ -1,6 +1,8 @@
 import chemics as cm
 import numpy as np
-from trans_heat_cond import hc2
+import surrogate
+from profiling import profiled
+from trans_heat_cond import hc2, hc_series
 
 
 class Particle:
@@ -46,6 +48,7 @@ class Particle:
         rho = params['rho']
         return cls(dp, dp_min, dp_max, phi, rho)
 
+    @profiled('correlations')
     def calc_umb(self, gas):
         """
         Calculate minimum bubbling velocity [m/s] from Abrahamsen correlation.
@@ -55,6 +58,7 @@ class Particle:
         umb = 2.07 * np.exp(0.716 * frac) * (self.dp * gas.rho**0.06) / (mug**0.347)
         return umb
 
+    @profiled('correlations')
     def calc_umb_umf(self, gas):
         """
         Calculate Umb/Umf [-] according to the Abrahamsen paper. Note that Umf
@@ -70,6 +74,7 @@ class Particle:
         umb_umf = x / y
         return umb_umf
 
+    @profiled('correlations')
     def calc_umf_ergun(self, ep, gas):
         """
         Calculate minimum fluidization velocity [m/s] based on the Ergun
@@ -79,6 +84,7 @@ class Particle:
         umf_ergun = cm.umf_ergun(self.dp, ep, mug, self.phi, gas.rho, self.rho)
         return umf_ergun
 
+    @profiled('correlations')
     def calc_umf_wenyu(self, gas):
         """
         Calculate minimum fluidization velocity [m/s] based on the Ergun
@@ -88,20 +94,24 @@ class Particle:
         umf_wenyu = cm.umf_coeff(self.dp, mug, gas.rho, self.rho, coeff='wenyu')
         return umf_wenyu
 
+    @profiled('correlations')
     def calc_ut_ganser(self, gas):
         """
-        Calculate terminal velocity [m/s] of the particle.
+        Calculate terminal velocity [m/s] of the particle. The surrogate of
+        the correlation is used when surrogates are on.
         """
         mug = gas.mu * 1e-7     # convert to kg/ms = µP * 1e-7
-        ut_ganser = cm.ut_ganser(self.dp, mug, self.phi, gas.rho, self.rho)
+        ut_ganser = surrogate.apply('ut_ganser', cm.ut_ganser, self.dp, mug, self.phi, gas.rho, self.rho)
         return ut_ganser
 
+    @profiled('correlations')
     def calc_ut_haider(self, gas):
         """
-        Calculate terminal velocity [m/s] of the particle.
+        Calculate terminal velocity [m/s] of the particle. The surrogate of
+        the correlation is used when surrogates are on.
         """
         mug = gas.mu * 1e-7     # convert to kg/ms = µP * 1e-7
-        ut_haider = cm.ut_haider(self.dp, mug, self.phi, gas.rho, self.rho)
+        ut_haider = surrogate.apply('ut_haider', cm.ut_haider, self.dp, mug, self.phi, gas.rho, self.rho)
         return ut_haider
 
     @staticmethod
@@ -116,18 +126,29 @@ class Particle:
         t_hc = np.arange(0, t_max + dt, dt)
         return t_hc
 
-    def calc_trans_hc(self, b, h, k, m, mc, t, tki, tkinf):
+    def calc_trans_hc(self, b, h, k, m, mc, t, tki, tkinf, snapshot=None, every=100, method='hc2'):
         """
         Calculate intra-particle temperature profile [K] for biomass particle.
+        The `hc2` method solves with temperature dependent heat capacity and
+        saves the state of the solve to the `snapshot` file every `every`
+        time steps when given. The `series` method is the analytic solution
+        with the heat capacity at the mean temperature which is much faster
+        for screening.
         """
         # tk is temperature array [K]
         # rows = time step
         # columns = center to surface temperature
         sg = self.rho / 1000
-        tk_hc = hc2(self.dp, mc, k, sg, h, tki, tkinf, b, m, t)
+        if method == 'hc2':
+            tk_hc = hc2(self.dp, mc, k, sg, h, tki, tkinf, b, m, t, snapshot, every)
+        elif method == 'series':
+            tk_hc = hc_series(self.dp, mc, k, sg, h, tki, tkinf, b, m, t)
+        else:
+            raise ValueError(f'Heat conduction method `{method}` not available.')
         return tk_hc
 
     @staticmethod
+    @profiled('correlations')
     def calc_time_tkinf(t_hc, tk_hc, tk_inf):
         """
         Time [s] when biomass particle is near reactor temperature.
@@ -137,14 +158,12 @@ class Particle:
         t_ref = t_hc[idx]                               # time where T > Tinf
         return t_ref
 
+    @profiled('correlations')
     def calc_devol_time(self, tk):
         """
         Calculate devolatilization time [s] of the biomass particle.
         """
-        dp = self.dp * 1000
-        dp_min = self.dp_min * 1000
-        dp_max = self.dp_max * 1000
-        tv = cm.devol_time(dp, tk)
-        tv_min = cm.devol_time(dp_min, tk)
-        tv_max = cm.devol_time(dp_max, tk)
+        # one broadcast call for the mean, minimum, and maximum diameters
+        dp, dp_min, dp_max, tk = np.broadcast_arrays(self.dp, self.dp_min, self.dp_max, tk)
+        tv, tv_min, tv_max = cm.devol_time(np.stack((dp, dp_min, dp_max)) * 1000, tk)
         return tv, tv_min, tv_max
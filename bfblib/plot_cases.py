@@ -0,0 +1,126 @@
+import matplotlib.pyplot as plt
+import numpy as np
+
+from profiling import profiled
+
+# Largest number of cases labeled by name on the x-axis
+MAX_LABELS = 20
+
+
+def _config(ax, xlabel, ylabel):
+    ax.grid(color='0.9')
+    ax.set_axisbelow(True)
+    ax.set_frame_on(False)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.tick_params(color='0.9')
+
+
+class PlotCases:
+    """
+    Comparison figures of the cases in a project from the summary table.
+    Cases are labeled by name when there are only a few of them, otherwise
+    they are shown by their position in the table.
+    """
+
+    def __init__(self, params, results, path):
+        self._params = params
+        self._results = results
+        self._path = path
+
+    def _plot(self, ax, names, **kwargs):
+        """
+        Plot columns of the summary table for each case.
+        """
+        df = self._results
+        x = np.arange(len(df))
+        marker = 'o' if len(df) <= MAX_LABELS else '.'
+
+        for name in names:
+            ax.plot(x, df[name], marker=marker, ls='', label=name, **kwargs)
+
+        if len(df) <= MAX_LABELS:
+            ax.set_xticks(x)
+            ax.set_xticklabels(df['case'], rotation=90 if len(df) > 5 else 0)
+            _config(ax, 'Case', '')
+        else:
+            _config(ax, 'Case index', '')
+
+        ax.legend(loc='best')
+
+    @profiled('plotting')
+    def plot_umf_cases(self):
+        """
+        Plot minimum bubbling and fluidization velocities for each case.
+        """
+        fig, ax = plt.subplots(tight_layout=True)
+        self._plot(ax, ('umb', 'umf_ergun', 'umf_wenyu'))
+        ax.set_ylabel('Velocity [m/s]')
+        fig.savefig(f'{self._path}/fig_cases_umf.pdf')
+        plt.close(fig)
+
+    @profiled('plotting')
+    def plot_ut_cases(self):
+        """
+        Plot terminal velocities of the bed and biomass particles and the
+        superficial gas velocity for each case.
+        """
+        fig, ax = plt.subplots(tight_layout=True)
+        self._plot(ax, ('us', 'ut_bed_ganser', 'ut_bed_haider', 'ut_bio_ganser', 'ut_bio_haider'))
+        ax.set_ylabel('Velocity [m/s]')
+        fig.savefig(f'{self._path}/fig_cases_ut.pdf')
+        plt.close(fig)
+
+    @profiled('plotting')
+    def plot_us_umf_cases(self):
+        """
+        Plot ratio of superficial gas velocity to minimum fluidization
+        velocity for each case.
+        """
+        fig, ax = plt.subplots(tight_layout=True)
+        self._plot(ax, ('us_umf_ergun', 'us_umf_wenyu'))
+        ax.set_ylabel('Us/Umf [-]')
+        fig.savefig(f'{self._path}/fig_cases_us_umf.pdf')
+        plt.close(fig)
+
+    @profiled('plotting')
+    def plot_times_cases(self):
+        """
+        Plot devolatilization time and biomass heating time for each case.
+        """
+        fig, ax = plt.subplots(tight_layout=True)
+        self._plot(ax, ('tv', 't_ref'))
+        ax.set_ylabel('Time [s]')
+        fig.savefig(f'{self._path}/fig_cases_times.pdf')
+        plt.close(fig)
+
+
+class PlotCaseHistories:
+    """
+    Comparison figures of the cases in a project from their result arrays.
+    Results are the arrays of each case by name such as
+    `results['case1']['tk_hc']`.
+    """
+
+    def __init__(self, params, results, path):
+        self._params = params
+        self._results = results
+        self._path = path
+
+    @profiled('plotting')
+    def plot_center_temps_cases(self):
+        """
+        Plot center temperature of the biomass particle over time for each
+        case.
+        """
+        fig, ax = plt.subplots(tight_layout=True)
+
+        for case, res in sorted(self._results.items()):
+            label = case if len(self._results) <= MAX_LABELS else None
+            ax.plot(res['t_hc'], res['tk_hc'][:, 0], lw=1, label=label)
+
+        _config(ax, 'Time [s]', 'Center temperature [K]')
+        if len(self._results) <= MAX_LABELS:
+            ax.legend(loc='best')
+        fig.savefig(f'{self._path}/fig_cases_center_temps.pdf')
+        plt.close(fig)
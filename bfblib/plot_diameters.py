@@ -1,5 +1,7 @@
 import matplotlib.pyplot as plt
 
+from profiling import profiled
+
 
 class PlotDiameters:
 
@@ -8,6 +10,7 @@ class PlotDiameters:
         self._results = results
         self._path = path
 
+    @profiled('plotting')
     def plot_umf(self):
         """
         Plot minimum fluidization velocity for a range of bed particle diameters.
@@ -37,7 +40,9 @@ class PlotDiameters:
         ax.set_frame_on(False)
         ax.tick_params(color='0.9')
         fig.savefig(f'{self._path}/fig_umf.pdf')
+        plt.close(fig)
 
+    @profiled('plotting')
     def plot_ut_bed(self):
         """
         Plot terminal velocity for a range of bed particle diameters.
@@ -69,7 +74,9 @@ class PlotDiameters:
         ax.set_frame_on(False)
         ax.tick_params(color='0.9')
         fig.savefig(f'{self._path}/fig_ut_bed.pdf')
+        plt.close(fig)
 
+    @profiled('plotting')
     def plot_ut_bio(self):
         """
         Plot terminal velocity for a range of biomass particle diameters.
@@ -101,3 +108,4 @@ class PlotDiameters:
         ax.set_frame_on(False)
         ax.tick_params(color='0.9')
         fig.savefig(f'{self._path}/fig_ut_bio.pdf')
+        plt.close(fig)
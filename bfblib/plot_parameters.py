@@ -1,6 +1,8 @@
 import chemics as cm
 import matplotlib.pyplot as plt
 
+from profiling import profiled
+
 
 def _autolabel(ax, bars):
     """
@@ -39,6 +41,7 @@ class PlotParameters:
         self._results = results
         self._path = path
 
+    @profiled('plotting')
     def plot_geldart(self):
         """
         Plot the Geldart chart for particle size classification.
@@ -52,7 +55,9 @@ class PlotParameters:
         rhos = self._params.bed['rho'] * 0.001
         fig = cm.geldart_chart(dp, rhog, rhos, dpmin, dpmax)
         fig.savefig(f'{self._path}/fig_geldart.pdf')
+        plt.close(fig)
 
+    @profiled('plotting')
     def plot_intra_particle_heat_cond(self):
         """
         Plot intra-particle heat conduction at center and surface of biomass particle.
@@ -72,7 +77,9 @@ class PlotParameters:
         ax.legend(loc='lower right')
         _config(ax, 'Time [s]', 'Temperature [K]')
         fig.savefig(f'{self._path}/fig_intra_hc.pdf')
+        plt.close(fig)
 
+    @profiled('plotting')
     def plot_umb_umf_ut(self):
         """
         """
@@ -111,3 +118,4 @@ class PlotParameters:
         labels = ['Us', 'Bed', 'Biomass']
         ax2.legend(bars, labels, loc='upper right')
         fig.savefig(f'{self._path}/fig_umb_umf_ut.pdf')
+        plt.close(fig)
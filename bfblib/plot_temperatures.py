@@ -1,6 +1,8 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
+from profiling import profiled
+
 
 def _autolabel(ax, bars):
     """
@@ -39,6 +41,7 @@ class PlotTemperatures:
         self._results = results
         self._path = path
 
+    @profiled('plotting')
     def plot_tv_temps(self):
         """
         Plot devolatilization time of a biomass particle.
@@ -68,7 +71,9 @@ class PlotTemperatures:
         _autolabel(ax, bars)
         _autolabel(ax, bars_max)
         fig.savefig(f'{self._path}/fig_tv_temps.pdf')
+        plt.close(fig)
 
+    @profiled('plotting')
     def plot_umb_umf_temps(self):
         """
         Plot Umf of bed particle for all cases.
@@ -100,7 +105,9 @@ class PlotTemperatures:
         _autolabel(ax, bars_umf_wenyu)
 
         fig.savefig(f'{self._path}/fig_umb_umf_temps.pdf')
+        plt.close(fig)
 
+    @profiled('plotting')
     def plot_ut_temps(self):
         """
         Plot terminal velocity for a range of temperatures.
@@ -133,7 +140,9 @@ class PlotTemperatures:
         _config_axis(ax2)
 
         fig.savefig(f'{self._path}/fig_ut_temps.pdf')
+        plt.close(fig)
 
+    @profiled('plotting')
     def plot_umf_ratios_temps(self):
         """
         """
@@ -163,3 +172,4 @@ class PlotTemperatures:
         _autolabel(ax, bars_usumf_wenyu)
 
         fig.savefig(f'{self._path}/fig_umf_ratios_temps.pdf')
+        plt.close(fig)
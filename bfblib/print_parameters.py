@@ -1,5 +1,10 @@
+import json
 import textwrap
 
+import numpy as np
+
+from profiling import profiled
+
 
 def _params_string(pm):
     """
@@ -80,10 +85,12 @@ def _results_string(res):
     {'umf_wenyu':<{w}} {res['umf_wenyu']:<{w}.4f} Minimum fluidization velocity [m/s]
     {'ut_ganser':<{w}} {res['ut_bed_ganser']:<{w}.2f} Terminal velocity [m/s]
     {'ut_haider':<{w}} {res['ut_bed_haider']:<{w}.2f} Terminal velocity [m/s]
+    {'geldart':<{w}} {res['geldart_min'] + '/' + res['geldart'] + '/' + res['geldart_max']:<{w}} Geldart group of dp_min/dp/dp_max [-]
 
     {' Biomass Particle ':-^40}\n
     {'t_devol':<{w}} {res['tv']:<{w}.2f} Devolatilization time for 95% conversion [s]
     {'t_ref':<{w}} {res['t_ref']:<{w}.2f} Time for particle center to reach T∞ [s]
+    {'grid':<{w}} {f"{res['hc_m']}x{res['hc_nt']}":<{w}} Nodes and time steps of heat conduction solve [-]
     {'ut_ganser':<{w}} {res['ut_bio_ganser']:<{w}.2f} Terminal velocity [m/s]
     {'ut_haider':<{w}} {res['ut_bio_haider']:<{w}.2f} Terminal velocity [m/s]
 
@@ -100,6 +107,7 @@ def _results_string(res):
     return textwrap.dedent(res_string)
 
 
+@profiled('io')
 def print_report(params, results, path):
     """
     Write parameters and results to text file for reporting purposes.
@@ -110,3 +118,34 @@ def print_report(params, results, path):
     with open(path / 'report.txt', 'w') as f:
         print(params_string, file=f)
         print(results_string, file=f)
+
+
+def case_record(params, results, path):
+    """
+    Scalar parameters and results of a case as one flat record. Parameters
+    are named by group and key such as `bed.dp`.
+    """
+    record = {'case': path.name, 'label': params.case['case_desc']}
+
+    for group in ('bed', 'biomass', 'gas', 'reactor'):
+        for key, value in getattr(params, group).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                record[f'{group}.{key}'] = value
+
+    for name, value in results.items():
+        if isinstance(value, str):
+            record[name] = value
+        elif np.ndim(value) == 0:
+            record[name] = float(value)
+
+    return record
+
+
+@profiled('io')
+def write_results(record, path):
+    """
+    Write the record of scalar parameters and results to JSON file for
+    comparing cases.
+    """
+    with open(path / 'results.json', 'w') as f:
+        json.dump(record, f, indent=4)
@@ -0,0 +1,213 @@
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+
+# Profiling mode shared with worker and rendering processes through the
+# environment where the value is empty, `timers`, or `cprofile`
+_ENV = 'BFBLIB_PROFILE'
+
+# Profiler which records stages in this process
+_state = {'profiler': None}
+
+
+class Profiler:
+    """
+    Record the call count and time of each profiled stage.
+
+    Attributes
+    ----------
+    stages : dict
+        Category, number of calls, total time [s], and self time [s] for
+        each stage. Total times include any nested stages of the same thread
+        and self times exclude them, so the self times of a thread add up to
+        at most the time of the profiler.
+    """
+
+    def __init__(self, cprofile=False):
+        self.stages = {}
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._t0 = None
+        self._elapsed = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __enter__(self):
+        self._prev = _state['profiler']
+        _state['profiler'] = self
+        self._t0 = time.perf_counter()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self._elapsed += time.perf_counter() - self._t0
+        _state['profiler'] = self._prev
+
+    def record(self, name, category, seconds, self_seconds=None):
+        """
+        Add a call of a stage, which may come from any thread. The self time
+        is the total time when not given.
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, {'category': category, 'calls': 0, 'seconds': 0.0, 'self': 0.0})
+            stage['calls'] += 1
+            stage['seconds'] += seconds
+            stage['self'] += seconds if self_seconds is None else self_seconds
+
+    def _enter(self):
+        """
+        Start the time of nested stages of a stage on this thread.
+        """
+        if not hasattr(self._local, 'nested'):
+            self._local.nested = []
+        self._local.nested.append(0.0)
+
+    def _exit(self, seconds):
+        """
+        Self time [s] of a stage that took `seconds` which is also added to
+        the nested time of its parent stage.
+        """
+        nested = self._local.nested
+        child = nested.pop()
+        if nested:
+            nested[-1] += seconds
+        return seconds - child
+
+    def report(self):
+        """
+        Timing report of the stages and their categories.
+        """
+        return {'total': self._elapsed, 'stages': self.stages, 'categories': _categories(self.stages)}
+
+    def write(self, path):
+        """
+        Write timing report to `profile.json` and the cProfile statistics, if
+        captured, to `profile.prof` in the path.
+        """
+        with open(path / 'profile.json', 'w') as f:
+            json.dump(self.report(), f, indent=4)
+
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(path / 'profile.prof')
+
+
+def _categories(stages):
+    """
+    Calls and self time [s] of the stages in each category so time of a
+    nested stage is only counted in its own category.
+    """
+    cats = {}
+    for stage in stages.values():
+        cat = cats.setdefault(stage['category'], {'calls': 0, 'seconds': 0.0})
+        cat['calls'] += stage['calls']
+        cat['seconds'] += stage.get('self', stage['seconds'])
+    return cats
+
+
+def enable(cprofile=False):
+    """
+    Turn on profiling for this process and any process started from it.
+    """
+    os.environ[_ENV] = 'cprofile' if cprofile else 'timers'
+
+
+def enabled():
+    """
+    Profiling mode for this process or an empty string when profiling is off.
+    """
+    return os.environ.get(_ENV, '')
+
+
+def session():
+    """
+    Profiler for a unit of work when profiling is on, otherwise a context
+    that does nothing.
+    """
+    mode = enabled()
+    if not mode:
+        return contextlib.nullcontext()
+    return Profiler(cprofile=(mode == 'cprofile'))
+
+
+def profiled(category):
+    """
+    Decorator which records the time of each call to a function as a stage
+    of the active profiler.
+    """
+    def decorator(func):
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _state['profiler']
+            if profiler is None:
+                return func(*args, **kwargs)
+            profiler._enter()
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - t0
+                profiler.record(name, category, seconds, profiler._exit(seconds))
+
+        return wrapper
+    return decorator
+
+
+def merge(reports):
+    """
+    Combine timing reports into a single report.
+    """
+    stages = {}
+    total = 0.0
+
+    for rpt in reports:
+        total += rpt['total']
+        for name, st in rpt['stages'].items():
+            stage = stages.setdefault(name, {'category': st['category'], 'calls': 0, 'seconds': 0.0, 'self': 0.0})
+            stage['calls'] += st['calls']
+            stage['seconds'] += st['seconds']
+            stage['self'] += st.get('self', st['seconds'])
+
+    return {'total': total, 'stages': stages, 'categories': _categories(stages)}
+
+
+def add_to_report(path, report):
+    """
+    Merge a timing report into the `profile.json` report in the path.
+    """
+    file = path / 'profile.json'
+    if file.exists():
+        with open(file) as f:
+            report = merge([json.load(f), report])
+
+    with open(file, 'w') as f:
+        json.dump(report, f, indent=4)
+
+
+def write_aggregate(project_path, case_paths):
+    """
+    Write the timing reports of all cases and their combined report to the
+    `profile.json` file in the project folder.
+    """
+    reports = {}
+
+    for path in case_paths:
+        file = path / 'profile.json'
+        if file.exists():
+            with open(file) as f:
+                reports[path.name] = json.load(f)
+
+    aggregate = merge(reports.values())
+    aggregate['cases'] = reports
+
+    with open(project_path / 'profile.json', 'w') as f:
+        json.dump(aggregate, f, indent=4)
+
+    return aggregate
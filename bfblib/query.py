@@ -0,0 +1,318 @@
+import collections
+import json
+import logging
+import math
+import numbers
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+
+import convergence
+from casesets import case_path, iter_cases, resolve
+from particle import Particle
+from trans_heat_cond import hc2_batch, hc2_threaded
+from vectorized import INPUTS, OUTPUTS, evaluate, param_value
+
+# Address of the query server
+ADDRESS = ('localhost', 47_102)
+
+# Keys of the body of a query request
+REQUEST_KEYS = ('case', 'points', 'outputs')
+
+# Number of points below which heating times are solved one point at a time
+# with `hc2`, whose banded solves are faster than the batched solve for a
+# few particles on a fine grid
+BATCH_MIN = 32
+
+# Parameters that the biomass heating time depends on
+TREF_INPUTS = ('biomass.dp', 'biomass.mc', 'biomass.k', 'biomass.rho', 'biomass.h', 'biomass.tk_init', 'gas.tk')
+
+
+class QueryModel:
+    """
+    Warm model of a case for answering point queries. Each point is a set of
+    numeric values of the `INPUTS` of the vectorized model that replace the
+    case parameters such as `{'gas.tk': 773.15, 'reactor.q': 18}`. A batch of points is evaluated at once with
+    the vectorized model, results of recent points are cached, and the
+    biomass heating time is interpolated from a table over the biomass
+    diameter and gas temperature.
+
+    Parameters
+    ----------
+    params : SimpleNamespace
+        Parameters for the case.
+    n_dp, n_tk : int
+        Number of biomass diameters and gas temperatures in the `t_ref` table.
+    m, nt, t_max : int, int, float, optional
+        Number of nodes, number of time steps, and time duration [s] for the
+        heat conduction solves of `t_ref`, default is the grid of the case
+        run at the case gas temperature.
+    cache_size : int
+        Number of points kept in the results cache.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Number of points answered from the cache or by evaluating the model.
+    """
+
+    def __init__(self, params, n_dp=25, n_tk=41, m=None, nt=None, t_max=None, cache_size=10_000):
+        from scipy.interpolate import RegularGridInterpolator
+
+        m_case, nt_case = convergence.grid(params.biomass, params.gas['tk'])
+        self.params = params
+        self._m = m or m_case
+        nt = nt or nt_case
+        self._t = Particle.build_time_vector(nt, t_max or params.biomass['t_max'])
+        self._cache = collections.OrderedDict()
+        self._cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+        # log of the heating time is close to linear in the log of the
+        # diameter so the table is interpolated in log space
+        bio = params.biomass
+        log_dp = np.linspace(np.log(bio['dp_min']), np.log(bio['dp_max']), n_dp)
+        tks = np.linspace(params.gas['tk_min'], params.gas['tk_max'], n_tk)
+        dp, tk = np.meshgrid(np.exp(log_dp), tks, indexing='ij')
+        t0 = time.perf_counter()
+        t_ref = self._solve_t_ref({}, dp.ravel(), tk.ravel())
+        logging.info(f't_ref table of {n_dp} x {n_tk} points solved with m = {self._m}, nt = {nt} '
+                     f'in {time.perf_counter() - t0:.2f} s, {np.isnan(t_ref).sum()} points not heated within '
+                     f't_max = {self._t[-1]:g} s')
+
+        self._tref_table = RegularGridInterpolator((log_dp, tks), np.log(t_ref.reshape(dp.shape)))
+
+    def _solve_t_ref(self, inputs, dp, tk):
+        """
+        Heating time [s] of the biomass particle from the heat conduction
+        solve for each point, one point at a time for fewer than `BATCH_MIN`
+        points, otherwise in a batch.
+        """
+        pm = self.params
+        val = lambda name: param_value(pm, inputs, name)  # noqa: E731
+        args = np.broadcast_arrays(dp, val('biomass.mc'), val('biomass.k'), val('biomass.rho') / 1000,
+                                   val('biomass.h'), val('biomass.tk_init'), tk)
+        args = [a.ravel() for a in args]
+
+        if len(args[0]) < BATCH_MIN:
+            Ts = hc2_threaded((*a, pm.biomass['b'], self._m, self._t) for a in zip(*args))
+            above = [np.nonzero(T[:, 0] > tk_inf - 1)[0] for T, tk_inf in zip(Ts, args[-1])]
+            return np.array([self._t[i[0]] if i.size else np.nan for i in above])
+
+        t_ref, _ = hc2_batch(*args, pm.biomass['b'], self._m, self._t)
+        return t_ref
+
+    def _t_ref(self, inputs, n):
+        """
+        Heating time [s] for each point from the table where only the biomass
+        diameter and gas temperature differ from the case and are within the
+        table, otherwise from the heat conduction solve. Points in a cell of
+        the table with a corner that isn't heated within the time of the
+        solve are also solved.
+        """
+        dp = np.broadcast_to(param_value(self.params, inputs, 'biomass.dp'), n)
+        tk = np.broadcast_to(param_value(self.params, inputs, 'gas.tk'), n)
+
+        (log_dp, tks) = self._tref_table.grid
+        exact = ~((np.log(dp) >= log_dp[0]) & (np.log(dp) <= log_dp[-1]) & (tk >= tks[0]) & (tk <= tks[-1]))
+        for name in TREF_INPUTS[1:-1]:
+            if name in inputs:
+                exact |= np.asarray(inputs[name]) != param_value(self.params, {}, name)
+
+        t_ref = np.empty(n)
+        table = ~exact
+        if table.any():
+            t_ref[table] = np.exp(self._tref_table(np.column_stack((np.log(dp[table]), tk[table]))))
+            # linear interpolation is NaN when any corner of the cell is NaN
+            exact |= table & np.isnan(t_ref)
+        if exact.any():
+            sub = {k: np.broadcast_to(v, n)[exact] for k, v in inputs.items()}
+            t_ref[exact] = self._solve_t_ref(sub, dp[exact], tk[exact])
+
+        return t_ref
+
+    def query(self, points, outputs=OUTPUTS):
+        """
+        Results for a batch of points.
+
+        Parameters
+        ----------
+        points : list
+            Parameter values of each point as a dict.
+        outputs : tuple
+            Names of results to return.
+
+        Returns
+        -------
+        results : list
+            Dict of the requested results for each point.
+        """
+        outputs = tuple(outputs)
+        unknown = set(outputs) - set(OUTPUTS)
+        if unknown:
+            raise ValueError(f'Results not available: {", ".join(sorted(unknown))}')
+
+        for p in points:
+            if not isinstance(p, dict):
+                raise ValueError(f'Point {p!r} is not a dict of parameter values.')
+            for name, value in p.items():
+                if name not in INPUTS:
+                    raise ValueError(f'Parameter `{name}` not available.')
+                if not isinstance(value, numbers.Real) or isinstance(value, bool):
+                    raise ValueError(f'Value {value!r} of parameter `{name}` is not a number.')
+
+        keys = [(tuple(sorted(p.items())), outputs) for p in points]
+        results = [self._cache.get(key) for key in keys]
+        missing = [i for i, res in enumerate(results) if res is None]
+
+        self.hits += len(points) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            names = sorted({name for i in missing for name in points[i]})
+
+            # parameters not given for a point keep the case value
+            inputs = {
+                name: np.array([points[i].get(name, param_value(self.params, {}, name)) for i in missing], dtype=float)
+                for name in names
+            }
+            res = evaluate(self.params, inputs, tuple(o for o in outputs if o != 't_ref'))
+            if 't_ref' in outputs:
+                res['t_ref'] = self._t_ref(inputs, len(missing))
+
+            columns = {name: np.broadcast_to(res[name], len(missing)).tolist() for name in outputs}
+            for j, i in enumerate(missing):
+                results[i] = {name: columns[name][j] for name in outputs}
+                self._cache[keys[i]] = results[i]
+
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+        return results
+
+
+class QueryServer(HTTPServer):
+    """
+    HTTP server that answers point queries for the cases of a project from
+    warm models. Models of case folders are built when the server starts and
+    models of case set cases are built by their first query.
+
+    Requests are `POST /query` with a JSON body such as `{"case": "case1",
+    "points": [{"gas.tk": 773.15}], "outputs": ["us_umf_ergun", "t_ref"]}`
+    and `GET /cases` for the available cases. Results that are NaN, such as
+    a heating time beyond the time of the solve, are sent as null.
+    """
+
+    def __init__(self, project_path, address=ADDRESS):
+        super().__init__(address, QueryHandler)
+        self.cases = {case_path(c).name: c for c in iter_cases(project_path)}
+        self.models = {}
+
+        for name, case in self.cases.items():
+            if not hasattr(case, 'overrides'):
+                self.model(name)
+
+    def model(self, name):
+        """
+        Warm model of a case which is built when first needed.
+        """
+        if name not in self.models:
+            if name not in self.cases:
+                raise ValueError(f'Case `{name}` not available.')
+            t0 = time.perf_counter()
+            _, params = resolve(self.cases[name])
+            self.models[name] = QueryModel(params)
+            logging.info(f'Model for {name} ready in {time.perf_counter() - t0:.2f} s')
+        return self.models[name]
+
+
+def _finite(value):
+    """
+    Data with None in place of the NaN and infinite floats which are not
+    valid JSON.
+    """
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_finite(v) for v in value]
+    return value
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of the query server.
+    """
+
+    def do_GET(self):
+        if self.path == '/cases':
+            self._reply(200, {'cases': list(self.server.cases)})
+        else:
+            self._reply(404, {'error': f'Path `{self.path}` not available.'})
+
+    def do_POST(self):
+        if self.path != '/query':
+            self._reply(404, {'error': f'Path `{self.path}` not available.'})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            if not isinstance(body, dict):
+                raise ValueError('Request body must be a JSON object.')
+            unknown = set(body) - set(REQUEST_KEYS)
+            if unknown:
+                raise ValueError(f'Request keys not available: {", ".join(sorted(unknown))}')
+            model = self.server.model(body['case'])
+            t0 = time.perf_counter()
+            results = model.query(body['points'], body.get('outputs', OUTPUTS))
+            seconds = time.perf_counter() - t0
+        except (KeyError, TypeError, ValueError) as e:
+            self._reply(400, {'error': str(e)})
+        else:
+            self._reply(200, {'results': results, 'seconds': seconds})
+
+    def _reply(self, status, data):
+        body = json.dumps(_finite(data), allow_nan=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+def serve_queries(project_path, address=ADDRESS):
+    """
+    Run the query server for the cases of a project until interrupted.
+    """
+    with QueryServer(project_path, address) as server:
+        logging.info(f'Query server listening on http://{address[0]}:{address[1]}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    logging.info('Query server stopped')
+
+
+def query(case, points, outputs=OUTPUTS, address=ADDRESS):
+    """
+    Send a batch of points to the query server and return the results for
+    each point.
+    """
+    data = json.dumps({'case': case, 'points': points, 'outputs': list(outputs)}).encode()
+    request = urllib.request.Request(f'http://{address[0]}:{address[1]}/query', data,
+                                     {'Content-Type': 'application/json'})
+
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())['results']
+    except urllib.error.HTTPError as e:
+        raise ValueError(json.loads(e.read())['error']) from None
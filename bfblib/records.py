@@ -0,0 +1,142 @@
+import csv
+import fcntl
+import io
+import json
+import os
+import pathlib
+import time
+
+# Formats of the project records file by file suffix
+FORMATS = {'.jsonl': 'jsonl', '.csv': 'csv'}
+
+
+class RecordWriter:
+    """
+    Buffered writer of case records to a JSON Lines or CSV file in the
+    project folder. Records are appended in batches while an exclusive lock
+    is held on the file so records from concurrent runs and workers are
+    never interleaved. The first writer of a CSV file writes the header and
+    later writers use its columns.
+
+    Parameters
+    ----------
+    file : pathlib.Path
+        Path to the `.jsonl` or `.csv` records file.
+    buffer_size : int
+        Number of records kept in memory before they are written.
+    interval : float
+        Time [s] after which buffered records are written even when the
+        buffer isn't full.
+    resume : bool
+        Skip records of cases that are already in the file so a resumed run
+        doesn't write a case twice.
+
+    Attributes
+    ----------
+    count : int
+        Number of records written to the file.
+    """
+
+    def __init__(self, file, buffer_size=100, interval=5.0, resume=False):
+        self.file = pathlib.Path(file)
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+        self._format = FORMATS[self.file.suffix]
+        self._buffer_size = buffer_size
+        self._interval = interval
+        self._buffer = []
+        self._columns = None
+        self._last = time.monotonic()
+        self._recorded = recorded_cases(self.file) if resume else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, record):
+        """
+        Add a record to the buffer and write the buffer when it's full or
+        the write interval has passed.
+        """
+        if self._recorded is not None:
+            if record['case'] in self._recorded:
+                return
+            self._recorded.add(record['case'])
+        self._buffer.append(record)
+        if len(self._buffer) >= self._buffer_size or time.monotonic() - self._last >= self._interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the buffered records to the file.
+        """
+        if not self._buffer:
+            return
+
+        with open(self.file, 'a+', newline='') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(self._format_records(f))
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        self.count += len(self._buffer)
+        self._buffer = []
+        self._last = time.monotonic()
+
+    def close(self):
+        """
+        Write any buffered records.
+        """
+        self.flush()
+
+    def _format_records(self, f):
+        """
+        Text of the buffered records. The file must be locked so the CSV
+        header is read or written by one writer at a time.
+        """
+        if self._format == 'jsonl':
+            return ''.join(json.dumps(rec) + '\n' for rec in self._buffer)
+
+        text = io.StringIO()
+
+        if self._columns is None:
+            f.seek(0)
+            header = f.readline()
+            if header:
+                self._columns = next(csv.reader([header]))
+            else:
+                self._columns = list(self._buffer[0])
+                csv.writer(text).writerow(self._columns)
+
+        writer = csv.DictWriter(text, self._columns, restval='', extrasaction='ignore')
+        writer.writerows(self._buffer)
+        return text.getvalue()
+
+
+def recorded_cases(file):
+    """
+    Names of the cases with a record in a JSON Lines or CSV records file.
+    A line cut short by a run that stopped while writing is ignored.
+    """
+    file = pathlib.Path(file)
+    if not file.exists():
+        return set()
+
+    names = set()
+    with open(file, newline='') as f:
+        if file.suffix == '.csv':
+            for row in csv.DictReader(f):
+                if row.get('case'):
+                    names.add(row['case'])
+        else:
+            for line in f:
+                try:
+                    names.add(json.loads(line)['case'])
+                except (ValueError, KeyError):
+                    continue
+    return names
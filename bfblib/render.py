@@ -0,0 +1,137 @@
+import collections
+import importlib
+import logging
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from checkpoint import mark_figure
+from profiling import add_to_report, session
+
+# Job for rendering one figure with a method of a plotter class such as
+# `PlotParameters.plot_geldart`
+FigureJob = collections.namedtuple('FigureJob', ['plotter', 'method', 'params', 'results', 'path'])
+
+# Module which defines each plotter class
+_PLOTTERS = {
+    'PlotParameters': 'plot_parameters',
+    'PlotDiameters': 'plot_diameters',
+    'PlotTemperatures': 'plot_temperatures',
+    'PlotCases': 'plot_cases',
+    'PlotCaseHistories': 'plot_cases'
+}
+
+
+def init_renderer():
+    """
+    Use the non-interactive backend and import the plotting modules once per
+    rendering process.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+    for module in _PLOTTERS.values():
+        importlib.import_module(module)
+
+
+def render_figure(job):
+    """
+    Render and save the figure for a job then close all of its figures.
+
+    Returns
+    -------
+    timing : dict
+        Case path, plotter method, and time [s] to render the figure. Also
+        the timing report of the figure when profiling is on.
+    """
+    import matplotlib.pyplot as plt
+    from sharedmem import attached
+
+    t0 = time.perf_counter()
+    module = importlib.import_module(_PLOTTERS[job.plotter])
+
+    # results can hold references to arrays in shared memory blocks
+    with attached(job.results) as results:
+        plotter = getattr(module, job.plotter)(job.params, results, job.path)
+        try:
+            with session() as prof:
+                getattr(plotter, job.method)()
+        finally:
+            plt.close('all')
+            del plotter, results
+
+    mark_figure(job)
+
+    timing = {
+        'case': str(job.path),
+        'figure': f'{job.plotter}.{job.method}',
+        'seconds': time.perf_counter() - t0
+    }
+
+    if prof is not None:
+        timing['profile'] = prof.report()
+
+    return timing
+
+
+class FigureRenderer:
+    """
+    Render figure jobs in parallel worker processes while the solvers move on
+    to the next case.
+
+    Attributes
+    ----------
+    timings : list
+        Rendering time of each figure.
+    """
+
+    def __init__(self, max_workers=None):
+        self._executor = ProcessPoolExecutor(max_workers, initializer=init_renderer)
+        self._futures = []
+        self.timings = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, jobs):
+        """
+        Queue figure jobs for rendering.
+
+        Returns
+        -------
+        futures : list
+            Future of each job which is done when its figure is rendered.
+        """
+        futures = [self._executor.submit(render_figure, job) for job in jobs]
+        self._futures.extend(futures)
+        return futures
+
+    def wait(self):
+        """
+        Wait for the queued figures to finish rendering and report the time
+        for each figure.
+        """
+        timings = []
+
+        for future in as_completed(self._futures):
+            tm = future.result()
+            logging.info(f"Rendered {tm['figure']} for {tm['case']} in {tm['seconds']:.2f} s")
+            if 'profile' in tm:
+                add_to_report(pathlib.Path(tm['case']), tm['profile'])
+            timings.append(tm)
+
+        self._futures = []
+        self.timings.extend(timings)
+        return timings
+
+    def close(self):
+        """
+        Wait for queued figures then stop the rendering processes.
+        """
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown()
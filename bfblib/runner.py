@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import os
+import pathlib
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from casesets import resolve
+from profiling import add_to_report, session
+from render import init_renderer, render_figure
+from workers import init_worker
+
+# Solver stages of a case in the order they are submitted
+STAGES = ('params', 'diams', 'temps')
+
+
+def _init_cpu_worker():
+    """
+    Warm a solver process. Interrupts are handled by the runner so a Ctrl-C
+    doesn't kill the stage that is running.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_worker()
+
+
+def _init_io_worker():
+    """
+    Prepare a rendering process that ignores interrupts like the solvers.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_renderer()
+
+
+def run_stage(case, stage):
+    """
+    Run one solver stage of a case.
+
+    Returns
+    -------
+    path : pathlib.Path
+        Folder for the results of the case.
+    jobs : list
+        Figure jobs of the stage.
+    record : dict or None
+        Scalar parameters and results of the case from the `params` stage.
+    seconds : float
+        Time to run the stage [s].
+    profile : dict or None
+        Timing report of the stage when profiling is on.
+    """
+    from cases import solve_diams, solve_params, solve_temps
+
+    t0 = time.perf_counter()
+    record = None
+
+    with session() as prof:
+        path, params = resolve(case)
+
+        if stage == 'params':
+            jobs, record = solve_params(params, path)
+        elif stage == 'diams':
+            jobs = solve_diams(params, path)
+        elif stage == 'temps':
+            jobs = solve_temps(params, path)
+        else:
+            raise ValueError(f'Stage `{stage}` not available.')
+
+    profile = prof.report() if prof is not None else None
+    return path, jobs, record, time.perf_counter() - t0, profile
+
+
+def log_progress(event):
+    """
+    Log a progress event of the runner.
+    """
+    if event['event'] == 'stage':
+        logging.info(f"[{event['stages_done']}/{event['stages_submitted']}] {event['stage']} for "
+                     f"{event['case']} in {event['seconds']:.2f} s")
+    elif event['event'] == 'figure':
+        logging.info(f"Rendered {event['figure']} for {event['case']} in {event['seconds']:.2f} s")
+    elif event['event'] == 'failed':
+        logging.info(f"Stage {event['stage']} for {event['case']} failed: {event['error']}")
+    elif event['event'] == 'cancelled':
+        logging.info(f"Run cancelled after {event['stages_done']} stages, "
+                     f"{event['stages_submitted'] - event['stages_done']} stages not finished")
+
+
+class Runner:
+    """
+    Run the solver stages of each case and render their figures with
+    asyncio. Solver stages run in a pool of CPU processes and figures are
+    rendered in a pool of I/O processes where each pool has its own limit on
+    the number of tasks in progress. Cases are taken from the iterable only
+    when a CPU slot is free.
+
+    A progress event is sent to the `progress` function as each stage or
+    figure finishes. Cancelling the run, such as with Ctrl-C, stops new
+    stages from starting and waits for the stages and figures in progress.
+    Results of finished stages are kept. When profiling is on, the timing
+    reports of the stages and figures of a case are merged into the
+    `profile.json` report of the case.
+
+    Parameters
+    ----------
+    cpu : int, optional
+        Number of solver stages run at a time, default is the number of
+        processors.
+    io : int, optional
+        Number of figures rendered at a time, default is the number of
+        processors.
+    plots : bool
+        Render the figures of each stage.
+    records : RecordWriter, optional
+        Writer for the record of each case.
+    progress : callable
+        Function called with each progress event as a dict.
+
+    Attributes
+    ----------
+    events : list
+        Progress events of the run.
+    """
+
+    def __init__(self, cpu=None, io=None, plots=True, records=None, progress=log_progress):
+        self._cpu = cpu or os.cpu_count()
+        self._io = io or self._cpu
+        self._plots = plots
+        self._records = records
+        self._progress = progress
+        self.events = []
+
+    def _emit(self, event, **data):
+        data['event'] = event
+        data['stages_done'] = self._done
+        data['stages_submitted'] = self._submitted
+        self.events.append(data)
+        self._progress(data)
+
+    async def _stage(self, cpu_pool, io_pool, case, stage):
+        """
+        Run a solver stage then queue the rendering of its figures.
+        """
+        loop = asyncio.get_running_loop()
+
+        try:
+            path, jobs, record, seconds, profile = await loop.run_in_executor(cpu_pool, run_stage, case, stage)
+        except Exception as e:
+            self._done += 1
+            self._emit('failed', case=str(getattr(case, 'path', case)), stage=stage, error=repr(e))
+            return
+        finally:
+            self._cpu_slots.release()
+
+        self._done += 1
+        self._emit('stage', case=str(path), stage=stage, seconds=seconds)
+
+        if profile is not None:
+            self._add_profile(path, profile)
+
+        if record is not None and self._records is not None:
+            self._records.write(record)
+
+        if self._plots and not self._stopping:
+            for job in jobs:
+                self._tasks.add(asyncio.create_task(self._figure(io_pool, job)))
+
+    async def _figure(self, io_pool, job):
+        """
+        Render a figure when an I/O slot is free.
+        """
+        loop = asyncio.get_running_loop()
+
+        async with self._io_slots:
+            if self._stopping:
+                return
+            tm = await loop.run_in_executor(io_pool, render_figure, job)
+
+        self._emit('figure', case=tm['case'], figure=tm['figure'], seconds=tm['seconds'])
+
+        if 'profile' in tm:
+            self._add_profile(pathlib.Path(tm['case']), tm['profile'])
+
+    def _add_profile(self, path, report):
+        """
+        Merge a timing report into the report of a case where the report of
+        a previous run is replaced by the first report of this run.
+        """
+        if path not in self._profiled:
+            (path / 'profile.json').unlink(missing_ok=True)
+            self._profiled.add(path)
+        add_to_report(path, report)
+
+    async def _wait(self):
+        """
+        Wait for the stage and figure tasks where figure tasks are added as
+        stages finish. The first error is raised once the other tasks are
+        cancelled and have finished.
+        """
+        while self._tasks:
+            done, _ = await asyncio.wait(self._tasks, return_when=asyncio.FIRST_EXCEPTION)
+            self._tasks -= done
+            errors = [task.exception() for task in done if not task.cancelled() and task.exception()]
+            if errors:
+                for task in self._tasks:
+                    task.cancel()
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+                self._tasks.clear()
+                raise errors[0]
+
+    async def run(self, cases):
+        """
+        Run every stage of the cases.
+
+        Returns
+        -------
+        summary : dict
+            Number of stages submitted and finished, number of figures, run
+            time [s], and whether the run was cancelled.
+        """
+        self._cpu_slots = asyncio.Semaphore(self._cpu)
+        self._io_slots = asyncio.Semaphore(self._io)
+        self._tasks = set()
+        self._done = 0
+        self._submitted = 0
+        self._stopping = False
+        self._profiled = set()
+        cancelled = False
+        t0 = time.perf_counter()
+
+        cpu_pool = ProcessPoolExecutor(self._cpu, initializer=_init_cpu_worker)
+        io_pool = ProcessPoolExecutor(self._io, initializer=_init_io_worker) if self._plots else None
+
+        try:
+            for case in cases:
+                for stage in STAGES:
+                    await self._cpu_slots.acquire()
+                    self._submitted += 1
+                    self._tasks.add(asyncio.create_task(self._stage(cpu_pool, io_pool, case, stage)))
+
+            await self._wait()
+
+        except asyncio.CancelledError:
+            cancelled = True
+            self._stopping = True
+            self._emit('cancelled')
+
+            # no new stages are started and figures waiting for a slot are
+            # skipped but stages and figures in progress are finished
+            await self._wait()
+
+        finally:
+            cpu_pool.shutdown(wait=True)
+            if io_pool is not None:
+                io_pool.shutdown(wait=True)
+            if self._records is not None:
+                self._records.flush()
+
+        figures = sum(1 for e in self.events if e['event'] == 'figure')
+        summary = {
+            'stages_submitted': self._submitted,
+            'stages_done': self._done,
+            'figures': figures,
+            'seconds': time.perf_counter() - t0,
+            'cancelled': cancelled
+        }
+        return summary
+
+
+def run_async(cases, cpu=None, io=None, plots=True, records=None):
+    """
+    Run the cases with a `Runner` where Ctrl-C cancels the run. Another
+    Ctrl-C while the stages and figures in progress finish is ignored.
+    """
+    async def main():
+        runner = Runner(cpu, io, plots, records)
+        task = asyncio.current_task()
+
+        def interrupt():
+            if runner._stopping:
+                logging.info('Run is stopping, waiting for the stages and figures in progress')
+            else:
+                task.cancel()
+
+        asyncio.get_running_loop().add_signal_handler(signal.SIGINT, interrupt)
+        return await runner.run(cases)
+
+    summary = asyncio.run(main())
+    logging.info(f"{summary['stages_done']} of {summary['stages_submitted']} stages and "
+                 f"{summary['figures']} figures done in {summary['seconds']:.2f} s")
+    return summary
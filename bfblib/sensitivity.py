@@ -0,0 +1,291 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import checkpoint
+from checkpoint import ChunkCheckpoint, key
+from vectorized import OUTPUTS, evaluate
+
+
+def inverse_cdf(spec, u):
+    """
+    Transform uniform values in [0, 1] to a declared parameter distribution.
+    See `montecarlo.sample` for the available distributions.
+    """
+    from scipy import stats
+
+    dist, *args = spec
+
+    if dist == 'normal':
+        # unbounded so the ends of the unit interval are limited to the 0.1
+        # and 99.9 percentiles
+        u = np.clip(u, 0.001, 0.999)
+        return stats.norm.ppf(u, loc=args[0], scale=args[1])
+    elif dist == 'truncnormal':
+        mean, sd, low, high = args
+        a, b = (low - mean) / sd, (high - mean) / sd
+        return stats.truncnorm.ppf(u, a, b, loc=mean, scale=sd)
+    elif dist == 'uniform':
+        return args[0] + u * (args[1] - args[0])
+    elif dist == 'triangular':
+        low, mode, high = args
+        c = (mode - low) / (high - low)
+        return stats.triang.ppf(u, c, loc=low, scale=high - low)
+    else:
+        raise ValueError(f'Distribution `{dist}` not available.')
+
+
+def _evaluate_chunk(args):
+    """
+    Evaluate the model outputs for a chunk of the sample design.
+    """
+    params, inputs, outputs = args
+    mc = params.montecarlo
+    res = evaluate(params, inputs, outputs, m=mc['m'], nt=mc['nt'], t_max=mc['t_max'])
+    return {name: np.asarray(res[name]) for name in outputs}
+
+
+def evaluate_design(params, design, outputs=OUTPUTS, workers=None, folder=None):
+    """
+    Evaluate the model for each row of a sample design in parallel batches.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case.
+    design : ndarray
+        Samples in the unit hypercube where rows are the model evaluations
+        and columns are the uncertain parameters.
+    outputs : tuple
+        Names of results to evaluate.
+    workers : int, optional
+        Number of worker processes, default is the number of processors.
+    folder : pathlib.Path, optional
+        Folder for a checkpoint of each batch. Only the batches without a
+        checkpoint are evaluated when the design is run again.
+
+    Returns
+    -------
+    results : dict
+        Array of each output for the rows of the design.
+    """
+    from montecarlo import scale_size_classes
+
+    names = list(params.uncertainty)
+    values = {name: inverse_cdf(params.uncertainty[name], design[:, i]) for i, name in enumerate(names)}
+
+    # the size classes follow the sampled mean diameters as in the Monte Carlo
+    # analysis so both report the same tv_min and tv_max
+    values = scale_size_classes(params, values)
+
+    # batches are no larger than the Monte Carlo chunk size and split
+    # evenly over the workers
+    n = len(design)
+    workers = workers or os.cpu_count()
+    chunk = min(params.montecarlo['chunk'], math.ceil(n / workers))
+    batches = [({k: v[s:s + chunk] for k, v in values.items()}) for s in range(0, n, chunk)]
+
+    parts = {}
+    if folder is not None:
+        digest = hashlib.sha1(design.tobytes()).hexdigest()
+        ckpt = ChunkCheckpoint(folder, key(digest, params.uncertainty, params.montecarlo, outputs, chunk))
+        parts = ckpt.load()
+        if parts:
+            logging.info(f'Resume {len(parts)} of {len(batches)} batches from checkpoint')
+
+    todo = [i for i in range(len(batches)) if i not in parts]
+    args = [(params, batches[i], outputs) for i in todo]
+
+    # small designs are not worth starting the worker processes
+    if len(todo) > 1:
+        executor = ProcessPoolExecutor(workers)
+        done = executor.map(_evaluate_chunk, args)
+    else:
+        executor = None
+        done = map(_evaluate_chunk, args)
+
+    try:
+        for i, part in zip(todo, done):
+            parts[i] = part
+            if folder is not None:
+                ckpt.save(i, part)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if folder is not None:
+        ckpt.clear()
+
+    results = {name: np.concatenate([parts[i][name] for i in range(len(batches))]) for name in outputs}
+    return results
+
+
+def morris(params, trajectories=20, levels=4, outputs=OUTPUTS, seed=None, workers=None, folder=None):
+    """
+    Morris elementary effects screening of the uncertain parameters.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case which define the `uncertainty` distributions.
+    trajectories : int
+        Number of one-at-a-time trajectories through the input space.
+    levels : int
+        Number of grid levels for each input.
+
+    Returns
+    -------
+    indices : dict
+        For each output and input, the mean of the absolute elementary
+        effects `mu_star`, the mean `mu`, and standard deviation `sigma`.
+    """
+    rng = np.random.default_rng(seed)
+    k = len(params.uncertainty)
+    delta = levels / (2 * (levels - 1))
+
+    # each trajectory starts at a random grid point and moves one input at
+    # a time by +delta or -delta in random order
+    grid = np.arange(levels // 2) / (levels - 1)
+    design = np.empty((trajectories, k + 1, k))
+    order = np.empty((trajectories, k), dtype=int)
+    step = np.empty((trajectories, k))
+
+    for r in range(trajectories):
+        x = rng.choice(grid, k)
+        sign = rng.choice([-1, 1], k)
+        # start from the top of the step for decreasing moves
+        x = np.where(sign < 0, x + delta, x)
+        order[r] = rng.permutation(k)
+        step[r] = sign * delta
+        design[r, 0] = x
+        for j, i in enumerate(order[r]):
+            x = x.copy()
+            x[i] += step[r, i]
+            design[r, j + 1] = x
+
+    res = evaluate_design(params, design.reshape(-1, k), outputs, workers, folder)
+    names = list(params.uncertainty)
+    indices = {}
+
+    for out in outputs:
+        y = res[out].reshape(trajectories, k + 1)
+        ee = np.empty((trajectories, k))
+        for r in range(trajectories):
+            for j, i in enumerate(order[r]):
+                ee[r, i] = (y[r, j + 1] - y[r, j]) / step[r, i]
+
+        indices[out] = {
+            name: {
+                'mu_star': _num(np.nanmean(np.abs(ee[:, i]))),
+                'mu': _num(np.nanmean(ee[:, i])),
+                'sigma': _num(np.nanstd(ee[:, i]))
+            } for i, name in enumerate(names)
+        }
+
+    return indices
+
+
+def sobol(params, n=1024, outputs=OUTPUTS, seed=None, workers=None, folder=None):
+    """
+    Sobol first-order and total-effect indices of the uncertain parameters
+    from the Saltelli sampling scheme.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case which define the `uncertainty` distributions.
+    n : int
+        Number of base samples which should be a power of two. The model is
+        evaluated n * (k + 2) times for k uncertain parameters.
+
+    Returns
+    -------
+    indices : dict
+        For each output and input, the first-order index `s1` and the
+        total-effect index `st`. Indices are None for outputs that don't
+        depend on the uncertain parameters.
+    """
+    from scipy.stats import qmc
+
+    k = len(params.uncertainty)
+    base = qmc.Sobol(2 * k, scramble=True, seed=seed).random(n)
+    a = base[:, :k]
+    b = base[:, k:]
+
+    # matrices A, B, then each AB_i where column i of A is taken from B
+    blocks = [a, b]
+    for i in range(k):
+        ab = a.copy()
+        ab[:, i] = b[:, i]
+        blocks.append(ab)
+
+    res = evaluate_design(params, np.vstack(blocks), outputs, workers, folder)
+    names = list(params.uncertainty)
+    indices = {}
+
+    for out in outputs:
+        y = res[out].reshape(k + 2, n)
+        fa, fb = y[0], y[1]
+        var = np.nanvar(np.concatenate([fa, fb]))
+
+        indices[out] = {}
+        for i, name in enumerate(names):
+            fab = y[i + 2]
+            if var > 0:
+                s1 = np.nanmean(fb * (fab - fa)) / var     # Saltelli 2010
+                st = 0.5 * np.nanmean((fa - fab)**2) / var  # Jansen 1999
+            else:
+                s1 = st = np.nan
+            indices[out][name] = {'s1': _num(s1), 'st': _num(st)}
+
+    return indices
+
+
+def _num(x):
+    """
+    Float for the JSON report where NaN is written as null.
+    """
+    x = float(x)
+    return None if math.isnan(x) else x
+
+
+def run_sensitivity(params, method, path, workers=None):
+    """
+    Run a global sensitivity analysis for the case and write the indices to
+    `sensitivity_<method>.json` in the case folder. Batches of the sample
+    design are saved to the checkpoint folder of the case when checkpoints
+    are on.
+    """
+    sa = params.sensitivity
+    t0 = time.perf_counter()
+    folder = path / checkpoint.FOLDER / f'sensitivity_{method}' if checkpoint.enabled() else None
+
+    if method == 'morris':
+        indices = morris(params, sa['trajectories'], sa['levels'], seed=sa['seed'], workers=workers, folder=folder)
+        key = 'mu_star'
+    elif method == 'sobol':
+        indices = sobol(params, sa['n'], seed=sa['seed'], workers=workers, folder=folder)
+        key = 'st'
+    else:
+        raise ValueError(f'Sensitivity method `{method}` not available.')
+
+    report = {'method': method, 'settings': sa, 'seconds': time.perf_counter() - t0, 'indices': indices}
+
+    with open(path / f'sensitivity_{method}.json', 'w') as f:
+        json.dump(report, f, indent=4)
+
+    logging.info(f"{method.capitalize()} analysis in {report['seconds']:.2f} s, {key} for each input")
+    names = list(params.uncertainty)
+    logging.info(f"{'output':<14}" + ''.join(f'{n:>12}' for n in names))
+
+    for out in ('us_umf_ergun', 'us_umf_wenyu', 't_ref', 'tv'):
+        vals = [indices[out][n][key] for n in names]
+        logging.info(f'{out:<14}' + ''.join(f'{"-" if v is None else format(v, ".3g"):>12}' for v in vals))
+
+    return report
@@ -0,0 +1,236 @@
+import collections
+import contextlib
+import os
+import pathlib
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Reference to an array in a shared memory block which is sent between
+# processes instead of the array
+ArrayRef = collections.namedtuple('ArrayRef', ['name', 'shape', 'dtype'])
+
+# Arrays smaller than this number of bytes are sent by pickling
+MIN_BYTES = 4096
+
+# Prefix of the names of the shared memory blocks of this package
+PREFIX = 'bfblib'
+
+# Solver stage of the results of each plotter class
+_STAGES = {'PlotParameters': 'params', 'PlotDiameters': 'diams', 'PlotTemperatures': 'temps'}
+
+# Blocks attached by this process that couldn't be closed yet because an
+# array still used their memory
+_pending_close = []
+
+
+def publish(value, prefix, _memo=None):
+    """
+    Copy the arrays of a result structure of dicts, lists, tuples, and figure
+    jobs into new shared memory blocks and replace them with an `ArrayRef`.
+    Arrays smaller than `MIN_BYTES` are kept. A dict shared by several jobs
+    is published once.
+
+    Blocks are left open for the process that attaches them and are only
+    removed by `SharedResults.release` or `SharedResults.close`, or by the
+    resource tracker when the parent process exits.
+    """
+    memo = {} if _memo is None else _memo
+
+    if id(value) in memo:
+        return memo[id(value)]
+
+    if isinstance(value, np.ndarray) and value.dtype != object and value.nbytes >= MIN_BYTES:
+        name = f'{prefix}_{uuid.uuid4().hex[:16]}'
+        shm = shared_memory.SharedMemory(name, create=True, size=value.nbytes)
+        np.ndarray(value.shape, value.dtype, shm.buf)[...] = value
+        shm.close()
+        out = ArrayRef(name, value.shape, value.dtype.str)
+    elif isinstance(value, dict):
+        out = {k: publish(v, prefix, memo) for k, v in value.items()}
+    elif hasattr(value, '_replace') and hasattr(value, 'results'):
+        out = value._replace(results=publish(value.results, prefix, memo))
+    elif isinstance(value, (list, tuple)) and not hasattr(value, '_fields'):
+        out = type(value)(publish(v, prefix, memo) for v in value)
+    else:
+        out = value
+
+    memo[id(value)] = out
+    return out
+
+
+def attach(value, blocks):
+    """
+    Replace each `ArrayRef` of a result structure with an array that uses
+    the memory of its shared block without copying. Attached blocks are
+    added to the `blocks` dict by name.
+    """
+    if isinstance(value, ArrayRef):
+        shm = blocks.get(value.name)
+        if shm is None:
+            shm = blocks[value.name] = shared_memory.SharedMemory(value.name)
+        arr = np.ndarray(value.shape, np.dtype(value.dtype), shm.buf)
+        arr.flags.writeable = False
+        return arr
+    if isinstance(value, dict):
+        return {k: attach(v, blocks) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) and not hasattr(value, '_fields'):
+        return type(value)(attach(v, blocks) for v in value)
+    return value
+
+
+def _close(blocks):
+    """
+    Close attached blocks. A block whose memory is still used by an array is
+    closed later by another call.
+    """
+    for shm in list(blocks) + _pending_close:
+        try:
+            shm.close()
+        except BufferError:
+            if shm not in _pending_close:
+                _pending_close.append(shm)
+        else:
+            if shm in _pending_close:
+                _pending_close.remove(shm)
+
+
+@contextlib.contextmanager
+def attached(value):
+    """
+    Context for using a result structure with shared arrays in a process
+    that doesn't own the blocks, such as a rendering process.
+    """
+    blocks = {}
+    try:
+        yield attach(value, blocks)
+    finally:
+        _close(blocks.values())
+
+
+def remove_stale(prefix=PREFIX):
+    """
+    Remove shared memory blocks left by processes of this package that are
+    no longer running. Block names contain the process id of their owner.
+    """
+    shm_dir = pathlib.Path('/dev/shm')
+    if not shm_dir.is_dir():
+        return 0
+
+    n = 0
+    for file in shm_dir.glob(f'{prefix}_*'):
+        pid = file.name.split('_')[1]
+        if not pid.isdigit() or _running(int(pid)):
+            continue
+        file.unlink(missing_ok=True)
+        n += 1
+    return n
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _names(value):
+    """
+    Names of the shared memory blocks referenced by a result structure.
+    """
+    if isinstance(value, ArrayRef):
+        return {value.name}
+    if isinstance(value, dict):
+        value = value.values()
+    elif hasattr(value, '_replace') and hasattr(value, 'results'):
+        value = [value.results]
+    elif not isinstance(value, (list, tuple)) or hasattr(value, '_fields'):
+        return set()
+    return set().union(*(_names(v) for v in value))
+
+
+def _unlink(name):
+    """
+    Remove a shared memory block by name if it still exists.
+    """
+    try:
+        shm = shared_memory.SharedMemory(name)
+    except FileNotFoundError:
+        return
+    shm.unlink()
+    shm.close()
+
+
+class SharedResults:
+    """
+    Result arrays of the cases of a run which worker processes publish into
+    shared memory blocks. Workers send back the figure jobs of a case with a
+    small `ArrayRef` in place of each array and the rendering processes
+    attach the blocks from the references in the jobs.
+
+    The blocks of a case are removed by `release` once its figures are
+    rendered, so memory doesn't grow with the number of cases, and only the
+    center temperatures of the biomass particle are kept for the summary.
+    Blocks of cases that weren't released are removed by `close` which is
+    also called when the context ends. The resource tracker, which is
+    started before any worker, removes blocks left by a parent that stops
+    without closing and `remove_stale` removes blocks left by a run that was
+    killed with its tracker.
+
+    Attributes
+    ----------
+    prefix : str
+        Name prefix of the blocks of this run.
+    histories : dict
+        Times `t_hc` and center temperatures `tk_hc` of the biomass particle
+        of each case, as a column like the intra-particle temperatures, such
+        as `histories['case1']['tk_hc']`.
+    """
+
+    def __init__(self):
+        remove_stale()
+        resource_tracker.ensure_running()
+        self.prefix = f'{PREFIX}_{os.getpid()}'
+        self.histories = {}
+        self._names = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, case, jobs):
+        """
+        Keep the block names and a copy of the center temperatures of the
+        figure jobs of a case which were published by a worker.
+        """
+        names = self._names.setdefault(case, set())
+        for job in jobs:
+            names.update(_names(job.results))
+            if _STAGES.get(job.plotter) != 'params' or case in self.histories or 'tk_hc' not in job.results:
+                continue
+            blocks = {}
+            res = attach({k: job.results[k] for k in ('t_hc', 'tk_hc')}, blocks)
+            self.histories[case] = {'t_hc': np.array(res['t_hc']), 'tk_hc': np.array(res['tk_hc'][:, :1])}
+            del res
+            _close(blocks.values())
+
+    def release(self, case):
+        """
+        Remove the shared memory blocks of a case whose figures are rendered.
+        """
+        for name in self._names.pop(case, ()):
+            _unlink(name)
+
+    def close(self):
+        """
+        Remove the shared memory blocks of the cases that weren't released.
+        """
+        for case in list(self._names):
+            self.release(case)
+        self.histories = {}
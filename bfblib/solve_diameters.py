@@ -3,8 +3,10 @@ import numpy as np
 from gas import Gas
 from particle import Particle
 from bfbreactor import BfbReactor
+from profiling import profiled
 
 
+@profiled('solver')
 def solve_diameters(params):
     """
     Calculate results for gas, bed particle, biomass particle, and BFB reactor
@@ -1,9 +1,13 @@
+import convergence
+import geldart
 from gas import Gas
 from particle import Particle
 from bfbreactor import BfbReactor
+from profiling import profiled
 
 
-def solve_parameters(params):
+@profiled('solver')
+def solve_parameters(params, snapshot=None, every=100):
     """
     Calculate results for gas, bed particle, biomass particle, and BFB reactor.
 
@@ -11,6 +15,10 @@ def solve_parameters(params):
     ----------
     params : module
         Parameters from module file.
+    snapshot : pathlib.Path, optional
+        File for snapshots of the heat conduction solve.
+    every : int
+        Number of time steps between snapshots.
 
     Returns
     -------
@@ -45,16 +53,25 @@ def solve_parameters(params):
     results['ut_bed_ganser'] = ut_bed_ganser
     results['ut_bed_haider'] = ut_bed_haider
 
+    groups = geldart.classify({'dp': bed.dp, 'dp_min': bed.dp_min, 'dp_max': bed.dp_max}, bed.rho, gas.rho)
+    results['geldart'] = str(groups['group'][0])
+    results['geldart_min'] = str(groups['group'][1])
+    results['geldart_max'] = str(groups['group'][2])
+    results['geldart_margin'] = float(groups['margin'][0])
+
     # Biomass particle results
     bio = Particle.from_params(pm.biomass)
 
-    t_hc = bio.build_time_vector(pm.biomass['nt'], pm.biomass['t_max'])
-    tk_hc = bio.calc_trans_hc(pm.biomass['b'], pm.biomass['h'], pm.biomass['k'], pm.biomass['m'], pm.biomass['mc'], t_hc, pm.biomass['tk_init'], gas.tk)
+    m, nt = convergence.grid(pm.biomass, gas.tk)
+    t_hc = bio.build_time_vector(nt, pm.biomass['t_max'])
+    tk_hc = bio.calc_trans_hc(pm.biomass['b'], pm.biomass['h'], pm.biomass['k'], m, pm.biomass['mc'], t_hc, pm.biomass['tk_init'], gas.tk, snapshot, every, pm.biomass.get('hc', 'hc2'))
     t_ref = bio.calc_time_tkinf(t_hc, tk_hc, gas.tk)
     tv, tv_min, tv_max = bio.calc_devol_time(gas.tk)
     ut_bio_ganser = bio.calc_ut_ganser(gas)
     ut_bio_haider = bio.calc_ut_haider(gas)
 
+    results['hc_m'] = m
+    results['hc_nt'] = nt
     results['t_hc'] = t_hc
     results['tk_hc'] = tk_hc
     results['t_ref'] = t_ref
@@ -1,8 +1,11 @@
 from gas import Gas
 from particle import Particle
 from bfbreactor import BfbReactor
+from vectorized import devol_time_grid
+from profiling import profiled
 
 
+@profiled('solver')
 def solve_temperatures(params):
     """
     Calculate results for gas, bed particle, biomass particle, and BFB reactor
@@ -33,9 +36,10 @@ def solve_temperatures(params):
     bfb = BfbReactor(pm.reactor['di'], pm.reactor['q'], pm.reactor['zmf'])
 
     ep = pm.reactor['ep']
-    tv_list = []
-    tv_min_list = []
-    tv_max_list = []
+
+    # Devolatilization time of the biomass size classes at each temperature
+    tv = devol_time_grid({'dp': bio.dp, 'dp_min': bio.dp_min, 'dp_max': bio.dp_max}, tks)
+
     umb_list = []
     umb_umf_list = []
     umf_ergun_list = []
@@ -51,7 +55,6 @@ def solve_temperatures(params):
     for tk in tks:
         gas = Gas(pm.gas['sp'], pm.gas['x'], pm.gas['p'], tk)
 
-        tv, tv_min, tv_max = bio.calc_devol_time(tk)
         umb = bed.calc_umb(gas)
         umb_umf = bed.calc_umb_umf(gas)
         umf_ergun = bed.calc_umf_ergun(ep, gas)
@@ -64,9 +67,6 @@ def solve_temperatures(params):
         ut_bio_ganser = bio.calc_ut_ganser(gas)
         ut_bio_haider = bio.calc_ut_haider(gas)
 
-        tv_list.append(tv)
-        tv_min_list.append(tv_min)
-        tv_max_list.append(tv_max)
         umb_list.append(umb)
         umb_umf_list.append(umb_umf)
         umf_ergun_list.append(umf_ergun)
@@ -82,9 +82,9 @@ def solve_temperatures(params):
     # Store results
     results = {}
     results['tks'] = tks
-    results['tv'] = tv_list
-    results['tv_min'] = tv_min_list
-    results['tv_max'] = tv_max_list
+    results['tv'] = tv.loc['dp'].tolist()
+    results['tv_min'] = tv.loc['dp_min'].tolist()
+    results['tv_max'] = tv.loc['dp_max'].tolist()
     results['umb'] = umb_list
     results['umb_umf'] = umb_umf_list
     results['umf_ergun'] = umf_ergun_list
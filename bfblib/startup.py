@@ -0,0 +1,130 @@
+import logging
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Import time budget [s] for commands which don't solve any cases
+STARTUP_BUDGET = 0.1
+
+# Libraries which should only be imported by the commands that need them
+HEAVY_MODULES = ('chemics', 'matplotlib', 'numpy', 'pandas', 'scipy')
+
+# Folder of the bfblib modules
+_MAIN = pathlib.Path(__file__).parent
+
+
+def _import_tree(cmd):
+    """
+    Run a command with `-X importtime` and return the imported modules.
+
+    Returns
+    -------
+    imports : dict
+        Imported modules as {name: (importer, cumulative time [s])} where the
+        importer is None for top-level imports.
+    elapsed : float
+        Wall time [s] of the command.
+    """
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + cmd, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+
+    # Modules are listed after their own imports with two spaces of indent
+    # for each level so the importer is found by reading the lines backwards
+    imports = {}
+    stack = []
+
+    for line in reversed(proc.stderr.splitlines()):
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        del stack[level:]
+        importer = stack[-1] if stack else None
+        stack.append(name)
+        imports.setdefault(name, (importer, int(cumulative) / 1e6))
+
+    return imports, elapsed
+
+
+def _importer(imports, name):
+    """
+    Module outside of the named package which imported the package.
+    """
+    importer = imports[name][0]
+    while importer is not None and importer.split('.')[0] == name:
+        importer = imports[importer][0]
+    return importer
+
+
+def _root(imports, name):
+    """
+    Top-level module whose import chain imported the named module.
+    """
+    while imports[name][0] is not None:
+        name = imports[name][0]
+    return name
+
+
+def _check(label, cmd, baseline, budget=None):
+    """
+    Report import time and heavy modules imported by a command.
+    """
+    imports, elapsed = _import_tree(cmd)
+    ours = {p.stem for p in _MAIN.glob('*.py')}
+
+    t_import = sum(t for name, (importer, t) in imports.items() if importer is None and name not in baseline)
+    heavy = [name for name in HEAVY_MODULES if name in imports]
+
+    logging.info(f'{label:<24} import {t_import * 1000:7.1f} ms   wall {elapsed * 1000:7.1f} ms')
+
+    ok = True
+
+    if budget is not None and t_import > budget:
+        logging.info(f'  import time exceeds budget of {budget * 1000:.0f} ms')
+        ok = False
+
+    for name in heavy:
+        importer = _importer(imports, name)
+        logging.info(f'  {name} imported by {importer or "__main__"} (from {_root(imports, name)})')
+
+        # Commands without a budget only fail when our own modules import
+        # Matplotlib directly instead of through another library
+        if budget is not None or (name == 'matplotlib' and importer in ours):
+            ok = False
+
+    return ok
+
+
+def check_startup(project=None, budget=STARTUP_BUDGET):
+    """
+    Check that `--help` and `--clean` stay within the import time budget
+    without loading any heavy libraries. When a project folder is given, also
+    report how Matplotlib gets imported by a solve-only run of its first case.
+
+    Returns
+    -------
+    ok : bool
+        True when all checks pass.
+    """
+    baseline, _ = _import_tree(['-c', 'pass'])
+    ok = True
+
+    ok &= _check('--help', [str(_MAIN), '--help'], baseline, budget)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ok &= _check('--clean', [str(_MAIN), tmp, '--clean'], baseline, budget)
+
+        if project is not None:
+            case = next(p for p in sorted(pathlib.Path(project).iterdir()) if p.is_dir())
+            case_tmp = pathlib.Path(tmp, case.name)
+            case_tmp.mkdir()
+            shutil.copy(case / 'params.py', case_tmp)
+            ok &= _check('--run --no-plots', [str(_MAIN), tmp, '--run', '--no-plots'], baseline)
+
+    logging.info('Startup check ' + ('passed' if ok else 'failed'))
+    return ok
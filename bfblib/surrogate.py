@@ -0,0 +1,373 @@
+import collections
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+# Surrogate settings shared with worker and rendering processes through the
+# environment as JSON with the surrogate file and the error tolerance, empty
+# when surrogates are off
+_ENV = 'BFBLIB_SURROGATES'
+
+# Declared domain of each surrogate in its reduced inputs where `ar` is the
+# Archimedes number, `phi` the sphericity, `bi` the Biot number h·d/k of the
+# particle, `mc` the moisture content [%], and `tk_init` and `tk` the initial
+# and gas temperatures [K]
+DOMAINS = {
+    'ut_ganser': {'ar': (1e-8, 1e12), 'phi': (0.5, 1.0)},
+    'ut_haider': {'ar': (1e-8, 1e12), 'phi': (0.5, 1.0)},
+    't_ref': {'bi': (1e-4, 300), 'mc': (0, 40), 'tk_init': (273.15, 373.15), 'tk': (573.15, 1073.15)}
+}
+
+# Number of grid points along each reduced input
+POINTS = {'ut_ganser': (320, 48), 'ut_haider': (320, 48), 't_ref': (30, 13, 4, 12)}
+
+# Shape factor, number of nodes, and number of time steps of the heat
+# conduction solves that the heating time surrogate is fitted to where the
+# time steps cover three times an estimate of the heating time
+REFERENCE = {'b': 2, 'm': 100, 'nt': 3000}
+
+# Functions of a surrogate model where `coords` gives the reduced inputs of
+# the physical inputs, `inputs` gives physical inputs for reduced inputs,
+# `exact` is the model evaluated for inputs from `inputs`, the result is exp(value) * `scale` of the inputs, and
+# `limit` applies the limits of the model to the result
+Model = collections.namedtuple('Model', ['coords', 'inputs', 'exact', 'scale', 'limit'])
+
+# Gravity [m/s²] and the diameter [m], gas density [kg/m³], and density
+# difference [kg/m³] of the particles used to tabulate the terminal velocity
+# for a given Archimedes number
+_G = 9.81
+_UT_INPUTS = (1e-3, 1.0, 1e9)
+
+# Exponent of the sphericity term of the Ganser drag coefficient
+_GANSER_EXP = 0.5743
+
+# Surrogates of the file in the environment loaded by this process
+_loaded = {}
+
+
+def _archimedes(dp, mu, rhog, rhos):
+    return _G * dp**3 * rhog * (rhos - rhog) / mu**2
+
+
+def _ganser_coords(dp, mu, phi, rhog, rhos):
+    # the drag depends on (-ln phi)^0.5743 which is steep near phi = 1
+    return np.log(_archimedes(dp, mu, rhog, rhos)), (-np.log(phi))**_GANSER_EXP
+
+
+def _haider_coords(dp, mu, phi, rhog, rhos):
+    return np.log(_archimedes(dp, mu, rhog, rhos)), phi
+
+
+def _ut_inputs(log_ar, phi):
+    dp, rhog, drho = _UT_INPUTS
+    mu = np.sqrt(_G * dp**3 * rhog * drho / np.exp(log_ar))
+    return dp, mu, phi, rhog, rhog + drho
+
+
+def _ganser_inputs(log_ar, s):
+    return _ut_inputs(log_ar, np.exp(-s**(1 / _GANSER_EXP)))
+
+
+def _ut_scale(dp, mu, phi, rhog, rhos):
+    # velocity from the particle Reynolds number
+    return mu / (rhog * dp)
+
+
+def _ganser_limit(ut, dp, mu, phi, rhog, rhos):
+    # same velocity range as `vectorized.ut_ganser`
+    return np.clip(ut, 0.0001, 1.74 * np.sqrt(_G * dp * (rhos - rhog) / rhog))
+
+
+def _ut_ganser(*args):
+    from vectorized import ut_ganser
+    return ut_ganser(*args)
+
+
+def _ut_haider(*args):
+    from vectorized import ut_haider
+    return ut_haider(*args)
+
+
+def _t_ref_coords(d, x, k, Gb, h, Ti, Tinf, b):
+    return np.log(h * d / k), x, Ti, Tinf
+
+
+def _t_ref_inputs(log_bi, x, Ti, Tinf):
+    # particles with a heating time of about one second from the lumped and
+    # conduction time constants with the heat capacity of dry wood
+    k, Gb = 0.1, 1.0
+    bi = np.exp(log_bi)
+    cp = (0.1031 + 0.003867 * (Ti + Tinf) / 2) * 1000
+    est = (1 / (3 * bi) + 1 / 15) * np.log(np.maximum(Tinf - Ti, 2))
+    d = np.sqrt(k / (Gb * 1000 * cp * est))
+    h = bi * k / d
+    return d, x, k, Gb, h, Ti, Tinf, REFERENCE['b']
+
+
+def _t_ref(d, x, k, Gb, h, Ti, Tinf, b):
+    # only for inputs from `_t_ref_inputs`
+    from particle import Particle
+    from trans_heat_cond import hc2_batch
+    t = Particle.build_time_vector(REFERENCE['nt'], 3.0)
+    t_ref, _ = hc2_batch(d, x, k, Gb, h, Ti, Tinf, b, REFERENCE['m'], t, interp=True)
+    return t_ref
+
+
+def _t_ref_scale(d, x, k, Gb, h, Ti, Tinf, b):
+    # heating time from the Fourier number
+    return Gb * 1000 * d**2 / k
+
+
+# Models that have a surrogate
+MODELS = {
+    'ut_ganser': Model(_ganser_coords, _ganser_inputs, _ut_ganser, _ut_scale, _ganser_limit),
+    'ut_haider': Model(_haider_coords, _ut_inputs, _ut_haider, _ut_scale, None),
+    't_ref': Model(_t_ref_coords, _t_ref_inputs, _t_ref, _t_ref_scale, None)
+}
+
+
+def _axis(name, var, lo, hi, n):
+    """
+    Grid points of a reduced input of a surrogate over its declared range.
+    """
+    if var in ('ar', 'bi'):
+        return np.linspace(np.log(lo), np.log(hi), n)
+    if var == 'phi' and name == 'ut_ganser':
+        # points closer together near phi = 1 where the drag is steep
+        s_lo, s_hi = (-np.log(hi))**_GANSER_EXP, (-np.log(lo))**_GANSER_EXP
+        return s_lo + (s_hi - s_lo) * np.linspace(0, 1, n)**2
+    return np.linspace(lo, hi, n)
+
+
+class Surrogate:
+    """
+    Surrogate of a model from a cubic spline of the log of the model result
+    over a grid of reduced inputs. The reduced inputs are dimensionless
+    groups that the scaled result depends on, such as the Archimedes number
+    and sphericity for the particle Reynolds number at terminal velocity, so
+    the grid only has two or four dimensions instead of the five or eight
+    inputs of the model.
+
+    Parameters
+    ----------
+    name : str
+        Model of the surrogate, one of `MODELS`.
+    axes : list
+        Grid points of each reduced input.
+    values : array
+        Log of the scaled model result at the grid points.
+    error : float
+        Certified maximum relative error of the result at held out points.
+    p99 : float
+        99th percentile of the relative error at the held out points.
+    n_test : int
+        Number of held out points.
+    """
+
+    def __init__(self, name, axes, values, error=np.inf, p99=np.inf, n_test=0):
+        from scipy.interpolate import NdBSpline, make_interp_spline
+
+        self.name = name
+        self.axes = [np.asarray(a, dtype=float) for a in axes]
+        self.values = np.asarray(values, dtype=float)
+        self.error = error
+        self.p99 = p99
+        self.n_test = n_test
+        self._model = MODELS[name]
+
+        # the tensor product spline is found by interpolating along one axis
+        # at a time and is NaN outside the grid
+        coef = self.values
+        knots = []
+        for i, axis in enumerate(self.axes):
+            spl = make_interp_spline(axis, coef, k=3, axis=i)
+            knots.append(spl.t)
+            coef = np.moveaxis(spl.c, 0, i)
+        self._spline = NdBSpline(tuple(knots), coef, 3, extrapolate=False)
+
+    def __call__(self, *args):
+        """
+        Result of the model from the surrogate for arrays of model inputs
+        which is NaN for inputs outside the domain of the surrogate.
+        """
+        coords = self._model.coords(*args)
+        shape = np.broadcast_shapes(*(np.shape(c) for c in coords))
+        points = np.column_stack([np.broadcast_to(c, shape).ravel() for c in coords])
+        value = self._spline(points).reshape(shape)
+        if self.name == 't_ref':
+            value = np.where(np.asarray(args[-1]) == REFERENCE['b'], value, np.nan)
+
+        result = np.exp(value) * self._model.scale(*args)
+        if self._model.limit is not None:
+            result = self._model.limit(result, *args)
+        return result
+
+    def contains(self, *args):
+        """
+        True for the inputs that are in the declared domain of the surrogate.
+        """
+        return ~np.isnan(self(*args))
+
+    def to_dict(self):
+        """
+        Grid, values, and certified error of the surrogate for a JSON file.
+        """
+        return {
+            'axes': [a.tolist() for a in self.axes],
+            'values': self.values.tolist(),
+            'error': self.error,
+            'p99': self.p99,
+            'n_test': self.n_test
+        }
+
+    @classmethod
+    def from_dict(cls, name, data):
+        """
+        Create the surrogate of a model from its data in a JSON file.
+        """
+        return cls(name, data['axes'], data['values'], data['error'], data['p99'], data['n_test'])
+
+
+def fit(name, n_test=2000, seed=0):
+    """
+    Fit the surrogate of a model over its declared domain and certify its
+    error at random held out points of the domain that are not on the grid.
+
+    Returns
+    -------
+    surrogate : Surrogate
+        Fitted surrogate with its certified error.
+    """
+    model = MODELS[name]
+    axes = [_axis(name, var, lo, hi, n) for (var, (lo, hi)), n in zip(DOMAINS[name].items(), POINTS[name])]
+
+    grid = [g.ravel() for g in np.meshgrid(*axes, indexing='ij')]
+    args = model.inputs(*grid)
+    result = model.exact(*args)
+    if not np.all(np.isfinite(result)):
+        raise ValueError(f'{name} is not available at every grid point of its domain.')
+    values = np.log(result / model.scale(*args)).reshape([a.size for a in axes])
+    sur = Surrogate(name, axes, values)
+
+    rng = np.random.default_rng(seed)
+    test = [a[0] + rng.random(n_test) * (a[-1] - a[0]) for a in axes]
+    args = model.inputs(*test)
+    err = np.abs(sur(*args) / model.exact(*args) - 1)
+    sur.error = float(err.max())
+    sur.p99 = float(np.quantile(err, 0.99))
+    sur.n_test = n_test
+    return sur
+
+
+def fit_all(file, names=tuple(MODELS)):
+    """
+    Fit the surrogates of the models and save them to a JSON file.
+
+    Returns
+    -------
+    surrogates : dict
+        Fitted surrogate of each model.
+    """
+    surrogates = {}
+    for name in names:
+        t0 = time.perf_counter()
+        sur = surrogates[name] = fit(name)
+        logging.info(f'Surrogate for {name} with {sur.values.size} grid points in '
+                     f'{time.perf_counter() - t0:.2f} s, maximum error {sur.error:.2e}, '
+                     f'99th percentile {sur.p99:.2e}')
+    save(surrogates, file)
+    return surrogates
+
+
+def save(surrogates, file):
+    """
+    Save surrogates to a JSON file with their domains and reference solves.
+    """
+    data = {
+        'domains': {name: DOMAINS[name] for name in surrogates},
+        'reference': REFERENCE,
+        'surrogates': {name: sur.to_dict() for name, sur in surrogates.items()}
+    }
+    with open(file, 'w') as f:
+        json.dump(data, f)
+
+
+def load(file):
+    """
+    Surrogates saved to a JSON file by `save`.
+    """
+    with open(file) as f:
+        data = json.load(f)
+    if data['reference'] != REFERENCE:
+        raise ValueError(f'Surrogates in {file} were fitted to different heat conduction solves, fit them again.')
+    return {name: Surrogate.from_dict(name, sur) for name, sur in data['surrogates'].items()}
+
+
+def enable(file, tol):
+    """
+    Use the surrogates of a file in this process and any process started
+    from it for the models where the certified error is within the
+    tolerance.
+
+    Returns
+    -------
+    names : list
+        Models that use their surrogate.
+    """
+    surrogates = load(file)
+    names = [name for name, sur in surrogates.items() if sur.error <= tol]
+    for name, sur in surrogates.items():
+        use = 'used' if name in names else 'not used'
+        logging.info(f'Surrogate for {name} {use}, certified error {sur.error:.2e} for tolerance {tol:.2e}')
+
+    os.environ[_ENV] = json.dumps({'file': str(file), 'tol': tol})
+    return names
+
+
+def settings():
+    """
+    Surrogate file and tolerance or None when surrogates are off.
+    """
+    env = os.environ.get(_ENV)
+    return json.loads(env) if env else None
+
+
+def get(name):
+    """
+    Surrogate of a model when surrogates are on and its certified error is
+    within the tolerance, otherwise None.
+    """
+    env = os.environ.get(_ENV)
+    if not env:
+        return None
+
+    if env not in _loaded:
+        settings = json.loads(env)
+        _loaded.clear()
+        _loaded[env] = {n: s for n, s in load(settings['file']).items() if s.error <= settings['tol']}
+
+    return _loaded[env].get(name)
+
+
+def apply(name, exact, *args):
+    """
+    Result of a model from its surrogate when it's used for the model. Inputs
+    outside the domain of the surrogate are evaluated by the `exact` function
+    which is called with the model inputs.
+    """
+    sur = get(name)
+    if sur is None:
+        return exact(*args)
+
+    result = sur(*args)
+    outside = np.isnan(result)
+    if result.ndim == 0:
+        return exact(*args) if outside else float(result)
+
+    if outside.any():
+        arrays = np.broadcast_arrays(*args)
+        result[outside] = exact(*(a[outside] for a in arrays))
+    return result
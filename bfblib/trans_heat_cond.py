@@ -1,9 +1,21 @@
+import concurrent.futures
+import multiprocessing
+import os
+import pathlib
+
 import chemics as cm
 import numpy as np
 import scipy.linalg as sp
 
+from profiling import profiled
+
+# Number of threads of `hc2_threaded` shared with worker processes through
+# the environment, empty for the number of processors
+_THREADS_ENV = 'BFBLIB_THREADS'
+
 
-def hc2(d, x, k, Gb, h, Ti, Tinf, b, m, t):
+@profiled('conduction')
+def hc2(d, x, k, Gb, h, Ti, Tinf, b, m, t, snapshot=None, every=100):
     """
     1D transient heat conduction for biomass particle pyrolysis with convection
     at surface, symmetry at center, k = constant and Cp(x, T).
@@ -26,6 +38,9 @@ def hc2(d, x, k, Gb, h, Ti, Tinf, b, m, t):
         b = shape factor where 2 is sphere, 1 is cylinder, 0 is slab
         m = number of nodes from center (m=0) to surface (m)
         t = time vector, s
+        snapshot = file for the state of the solve which is saved every
+            `every` time steps, a solve with a snapshot of the same inputs
+            continues from it and the file is removed when the solve is done
     Output:
         T = temperature array, K
     """
@@ -47,9 +62,15 @@ def hc2(d, x, k, Gb, h, Ti, Tinf, b, m, t):
     T = np.zeros((len(t), m))
     T[0] = Ti
 
+    # continue from the last time step i0 of a snapshot of the same solve
+    i0 = 0
+    if snapshot is not None:
+        key = np.array([d, x, k, Gb, h, Ti, Tinf, b, m, tmax, nt], dtype=float)
+        i0 = _load_snapshot(snapshot, key, T)
+
     # vectors = cp, alpha, Fo whereas single values = rho, k, Bi
     rho = Gb * 1000
-    cp = cm.cp_wood(x, T[0]) * 1000
+    cp = cm.cp_wood(x, T[i0]) * 1000
     alpha = k / (rho * cp)
     Fo = alpha * dt / (dr**2)
     Bi = h * dr / k
@@ -83,15 +104,15 @@ def hc2(d, x, k, Gb, h, Ti, Tinf, b, m, t):
     ab[2, m - 2] = -2 * Fo[m - 1]                       # surface node from [A], i=M
 
     # create column vector [bb] as the known vector [b]
-    bb = np.zeros(m)    # initialize vector
-    bb[0] = Ti          # initial center temperature, T0
-    bb[1:m - 1] = Ti    # initial internal tempratures, T1...Tm-1
-    bb[m - 1] = Ti + 2 * Fo[m - 1] * Bi * (1 + b / (2 * m)) * Tinf  # initial surface temperature Tm
+    bb = np.zeros(m)                # initialize vector
+    bb[0] = T[i0, 0]                # initial center temperature, T0
+    bb[1:m - 1] = T[i0, 1:m - 1]    # initial internal tempratures, T1...Tm-1
+    bb[m - 1] = T[i0, m - 1] + 2 * Fo[m - 1] * Bi * (1 + b / (2 * m)) * Tinf  # initial surface temperature Tm
 
     # solve T at each time step using scipy.linalg.solve_banded
     # T[i] is temperatures at each node for time step i
     # then update properties and [bb] from new temperatures
-    for i in range(1, nt + 1):
+    for i in range(i0 + 1, nt + 1):
         T[i] = sp.solve_banded((1, 1), ab, bb)
 
         # update heat capacity, alpha, and Fourier number
@@ -114,10 +135,395 @@ def hc2(d, x, k, Gb, h, Ti, Tinf, b, m, t):
         bb = T[i].copy()
         bb[m - 1] = T[i, m - 1] + 2 * Fo[m - 1] * Bi * (1 + b / (2 * m)) * Tinf
 
+        if snapshot is not None and i % every == 0 and i < nt:
+            _save_snapshot(snapshot, key, T, i)
+
+    if snapshot is not None:
+        pathlib.Path(snapshot).unlink(missing_ok=True)
+
     # return temperature array [T] in Kelvin
     return T
 
 
+def _save_snapshot(file, key, T, i):
+    """
+    Save the temperatures up to time step i of a `hc2` solve atomically so a
+    solve that stops while saving keeps the previous snapshot.
+    """
+    file = pathlib.Path(file)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = file.with_name(f'.{file.name}.{os.getpid()}')
+    with open(tmp, 'wb') as f:
+        np.savez(f, key=key, T=T[:i + 1])
+    os.replace(tmp, file)
+
+
+def _load_snapshot(file, key, T):
+    """
+    Copy the temperatures of a snapshot of the same `hc2` inputs into T and
+    return the last time step of the snapshot, or 0 when there is none.
+    """
+    try:
+        with np.load(file) as data:
+            if data['key'].shape != key.shape or not np.array_equal(data['key'], key):
+                return 0
+            Ts = data['T']
+    except FileNotFoundError:
+        return 0
+
+    T[:len(Ts)] = Ts
+    return len(Ts) - 1
+
+
+def set_threads(n):
+    """
+    Number of threads of `hc2_threaded` in this process and any process
+    started from it.
+    """
+    os.environ[_THREADS_ENV] = str(n)
+
+
+def thread_count():
+    """
+    Number of threads of `hc2_threaded` set by `set_threads`, otherwise one
+    in the worker processes of a pool, which already use every processor,
+    and the number of processors in other processes.
+    """
+    env = os.environ.get(_THREADS_ENV)
+    if env:
+        return int(env)
+    if multiprocessing.current_process().daemon:
+        return 1
+    return os.cpu_count() or 1
+
+
+def hc2_threaded(problems, threads=None):
+    """
+    Solve independent `hc2` problems, such as the grids of a convergence
+    study or the points of a query batch, in a pool of threads of this
+    process. The banded LAPACK solves and the large NumPy operations of each
+    time step release the GIL so solves of many nodes run in parallel without
+    the start up and pickling of worker processes. Solves with few nodes are
+    dominated by Python overhead that holds the GIL and gain little.
+
+    Inputs:
+        problems = sequence of `hc2` arguments (d, x, k, Gb, h, Ti, Tinf,
+            b, m, t) for each solve
+        threads = number of threads, default from `thread_count`, solves
+            run in the calling thread for one thread
+    Output:
+        Ts = list of temperature arrays of the solves in order, K
+    """
+    problems = list(problems)
+    n = min(threads or thread_count(), len(problems))
+    if n <= 1:
+        return [hc2(*p) for p in problems]
+
+    with concurrent.futures.ThreadPoolExecutor(n) as pool:
+        return list(pool.map(lambda p: hc2(*p), problems))
+
+
+def hc2_batch(d, x, k, Gb, h, Ti, Tinf, b, m, t, stop=True, interp=False, dtype=np.float64):
+    """
+    Batched version of `hc2` which solves the transient heat conduction for
+    many independent particles at once. The tridiagonal system of every
+    particle is solved together by the Thomas algorithm with each node as a
+    vector operation over all the particles. The matrix [A] is diagonally
+    dominant so no pivoting is needed.
+
+    Inputs:
+        d, x, k, Gb, h, Ti, Tinf = scalars or arrays broadcast to the number
+            of particles, see `hc2` for descriptions and units
+        b = shape factor where 2 is sphere, 1 is cylinder, 0 is slab
+        m = number of nodes from center (m=0) to surface (m)
+        t = time vector, s
+        stop = stop solving each particle once it reaches t_ref
+        interp = interpolate t_ref between the time steps before and after
+            the center temperature reaches Tinf - 1 K so it's continuous in
+            the inputs, otherwise the time step after is used
+        dtype = floating point type of the solve such as np.float32 which
+            halves the memory and bandwidth of large batches
+    Output:
+        t_ref = time when center temperature is greater than Tinf - 1 K for
+            each particle, NaN if not reached within the time vector, s
+        T = temperatures at each node for the last time step solved for
+            each particle, K
+    """
+    d, x, k, Gb, h, Ti, Tinf = (np.asarray(a, dtype=dtype) for a in
+                                np.broadcast_arrays(*np.atleast_1d(d, x, k, Gb, h, Ti, Tinf)))
+    n = d.size
+
+    nr = m - 1
+    dr = d / 2 / nr     # radius step of each particle, m
+    nt = len(t) - 1
+    dt = dtype(t.max() / nt)
+
+    # reduced precision solves are for the temperature relative to Tinf
+    # which goes to zero as the particle heats so the last kelvin before
+    # t_ref isn't lost to round-off, the rows of [A] for the relative
+    # temperature have no surface term since a uniform Tinf is a solution
+    offset = 0 if dtype == np.float64 else Tinf
+
+    # heat capacity from `cm.cp_wood` is linear in temperature for a given
+    # moisture content so it is evaluated as cp = (a + c * T) * 1000
+    cp_a = cm.cp_wood(x, 0.0) * np.ones(n, dtype=dtype)
+    cp_c = cm.cp_wood(x, 1.0) - cp_a
+    cp_a = cp_a + cp_c * offset
+    fo_num = k * dt / (Gb * 1000 * dr**2 * 1000)
+
+    Bi = h * dr / k
+    surf = 2 * Bi * (1 + b / (2 * m)) * (Tinf - offset)
+    tk_ref = Tinf - 1 - offset
+
+    # node factors for the internal nodes i=1..M-1
+    j = np.arange(1, m - 1, dtype=dtype)[:, None]
+    up_j = 1 + b / (2 * j)
+    lo_j = 1 - b / (2 * j)
+
+    # arrays are stored as rows = node points, columns = particles that are
+    # still being solved where idx is the index of each particle
+    idx = np.arange(n)
+    T = np.empty((m, n), dtype=dtype)
+    T[:] = Ti - offset
+
+    T_out = np.empty((n, m), dtype=dtype)
+    t_ref = np.full(n, np.nan)
+    active = np.ones(n, dtype=bool)
+
+    for i in range(1, nt + 1):
+        Fo = fo_num / (cp_a + cp_c * T)
+
+        # lower, center, and upper diagonals of [A] where lower[i] and
+        # upper[i] are the coefficients of nodes i-1 and i+1 in row i
+        upper = np.empty_like(Fo)
+        upper[0] = -2 * (1 + b) * Fo[0]
+        upper[1:m - 1] = -Fo[1:m - 1] * up_j
+
+        center = 1 + 2 * Fo
+        center[0] = 1 + 2 * (1 + b) * Fo[0]
+        center[m - 1] = 1 + 2 * Fo[m - 1] * (1 + Bi + (b / (2 * m)) * Bi)
+
+        lower = np.empty_like(Fo)
+        lower[1:m - 1] = -Fo[1:m - 1] * lo_j
+        lower[m - 1] = -2 * Fo[m - 1]
+
+        # known vector [b] is the current temperature which is overwritten
+        # with the next temperature by the forward sweep and back substitution
+        if interp:
+            center_prev = T[0].copy()
+        T[m - 1] += Fo[m - 1] * surf
+
+        # forward sweep where upper is overwritten with the modified upper
+        # diagonal coefficients
+        upper[0] /= center[0]
+        T[0] /= center[0]
+        for q in range(1, m):
+            den = center[q] - lower[q] * upper[q - 1]
+            upper[q] /= den
+            T[q] = (T[q] - lower[q] * T[q - 1]) / den
+
+        # back substitution
+        for q in range(m - 2, -1, -1):
+            T[q] -= upper[q] * T[q + 1]
+
+        reached = active & (T[0] > tk_ref)
+        if interp:
+            frac = (tk_ref[reached] - center_prev[reached]) / (T[0, reached] - center_prev[reached])
+            t_ref[idx[reached]] = t[i - 1] + frac * (t[i] - t[i - 1])
+        else:
+            t_ref[idx[reached]] = t[i]
+        active &= ~reached
+
+        # remove particles that reached t_ref once they are at least half of
+        # the arrays so the remaining time steps only solve the others
+        if stop and active.sum() <= active.size // 2:
+            T_out[idx[~active]] = T[:, ~active].T
+            idx = idx[active]
+            T = T[:, active]
+            cp_a, cp_c, fo_num = cp_a[active], cp_c[active], fo_num[active]
+            Bi, surf, tk_ref = Bi[active], surf[active], tk_ref[active]
+            active = active[active]
+
+            if idx.size == 0:
+                break
+
+    T_out[idx] = T.T
+    T_out += np.asarray(offset, dtype=dtype)[..., None]
+    return t_ref, T_out
+
+
+# Maximum number of Biot numbers whose eigenvalues are kept by
+# `biot_eigenvalues`, the cache is cleared when it's full
+EIGEN_CACHE = 100_000
+
+# Largest number of series terms used by `hc_series`
+MAX_TERMS = 2000
+
+# Eigenvalues of the series solutions by shape factor and Biot number
+_eigen_cache = {}
+
+
+def _eigen_residual(b, bi, lam):
+    """
+    Eigenvalue condition of the series solution which is zero at each
+    eigenvalue and changes sign between the bracket ends of `biot_eigenvalues`.
+    """
+    from scipy.special import j0, j1
+
+    if b == 0:
+        return lam * np.sin(lam) - bi * np.cos(lam)
+    if b == 1:
+        return lam * j1(lam) - bi * j0(lam)
+    return (1 - bi) * np.sin(lam) - lam * np.cos(lam)
+
+
+def _eigen_brackets(b, terms):
+    """
+    Lower and upper ends of the interval that contains each eigenvalue.
+    """
+    n = np.arange(terms)
+    if b == 0:
+        return n * np.pi, (n + 0.5) * np.pi
+    if b == 1:
+        from scipy.special import jn_zeros
+        lo = np.concatenate(([0.0], jn_zeros(1, terms - 1))) if terms > 1 else np.zeros(1)
+        return lo, jn_zeros(0, terms)
+    return n * np.pi, (n + 1) * np.pi
+
+
+def biot_eigenvalues(b, bi, terms):
+    """
+    Eigenvalues of the series solution for transient conduction in a slab,
+    cylinder, or sphere with convection at the surface. Eigenvalues of each
+    Biot number are cached so repeated solves of the same particle don't
+    find them again.
+
+    Inputs:
+        b = shape factor where 2 is sphere, 1 is cylinder, 0 is slab
+        bi = Biot number h*R/k based on the half thickness or radius R,
+            scalar or array
+        terms = number of eigenvalues
+    Output:
+        lam = eigenvalues with the terms along the last axis
+    """
+    bi = np.asarray(bi, dtype=float)
+    flat = bi.ravel()
+    missing = [v for v in np.unique(flat) if len(_eigen_cache.get((b, v), ())) < terms]
+
+    if missing:
+        if len(_eigen_cache) + len(missing) > EIGEN_CACHE:
+            _eigen_cache.clear()
+
+        # bisection on every bracket at once where the first bracket of the
+        # cylinder and sphere starts at zero which is also a root
+        v = np.array(missing)[:, None]
+        lo, hi = _eigen_brackets(b, terms)
+        lo = np.broadcast_to(np.maximum(lo, 1e-12), (v.size, terms)).copy()
+        hi = np.broadcast_to(hi, (v.size, terms)).copy()
+        f_lo = _eigen_residual(b, v, lo)
+        for _ in range(60):
+            mid = (lo + hi) / 2
+            f_mid = _eigen_residual(b, v, mid)
+            low_side = np.sign(f_mid) == np.sign(f_lo)
+            lo = np.where(low_side, mid, lo)
+            f_lo = np.where(low_side, f_mid, f_lo)
+            hi = np.where(low_side, hi, mid)
+
+        for value, lam in zip(missing, (lo + hi) / 2):
+            _eigen_cache[(b, value)] = lam
+
+    lam = np.array([_eigen_cache[(b, v)][:terms] for v in flat])
+    return lam.reshape(bi.shape + (terms,))
+
+
+def _series_coefficients(b, lam):
+    """
+    Coefficients of the series terms for a uniform initial temperature.
+    """
+    from scipy.special import j0, j1
+
+    if b == 0:
+        return 4 * np.sin(lam) / (2 * lam + np.sin(2 * lam))
+    if b == 1:
+        return 2 * j1(lam) / (lam * (j0(lam)**2 + j1(lam)**2))
+    return 4 * (np.sin(lam) - lam * np.cos(lam)) / (2 * lam - np.sin(2 * lam))
+
+
+def _series_modes(b, lam, rs):
+    """
+    Spatial part of each series term at the dimensionless radius rs.
+    """
+    from scipy.special import j0
+
+    z = lam[..., :, None] * rs
+    if b == 0:
+        return np.cos(z)
+    if b == 1:
+        return j0(z)
+    return np.sinc(z / np.pi)
+
+
+@profiled('conduction')
+def hc_series(d, x, k, Gb, h, Ti, Tinf, b, m, t, terms=None, tk_cp=None):
+    """
+    1D transient heat conduction for biomass particle from the exact series
+    solution of a slab, cylinder, or sphere with convection at the surface,
+    symmetry at center, and constant properties. Cp(x, T) is evaluated at
+    one temperature, by default the mean of the initial and ambient
+    temperatures, so the result is close to `hc2` when the heat capacity
+    doesn't change much over the heating.
+    Particles are solved together and each solve is a product of the time
+    and space parts of the series terms without any time stepping.
+
+    Temperature at dimensionless radius rs = r/R and Fourier number
+    Fo = alpha*t/R^2 is
+        (T - Tinf) / (Ti - Tinf) = sum of C_n * exp(-lam_n^2 * Fo) * X_n(lam_n * rs)
+    where lam_n are the eigenvalues from `biot_eigenvalues` and X_n is
+    cos for a slab, J0 for a cylinder, and sin(z)/z for a sphere.
+
+    Inputs:
+        d, x, k, Gb, h, Ti, Tinf = scalars or arrays broadcast to the number
+            of particles, see `hc2` for descriptions and units
+        b = shape factor where 2 is sphere, 1 is cylinder, 0 is slab
+        m = number of nodes from center (m=0) to surface (m)
+        t = time vector, s
+        terms = number of series terms, default is enough terms for the
+            first nonzero time to be accurate to round-off, up to MAX_TERMS
+        tk_cp = temperature for the heat capacity, K, default (Ti + Tinf) / 2
+    Output:
+        T = temperature array, K, with rows = time and columns = node for
+            scalar inputs, otherwise with the particles along the first axis
+    """
+    scalar = all(np.ndim(v) == 0 for v in (d, x, k, Gb, h, Ti, Tinf))
+    d, x, k, Gb, h, Ti, Tinf = np.broadcast_arrays(*np.atleast_1d(d, x, k, Gb, h, Ti, Tinf))
+    t = np.asarray(t, dtype=float)
+
+    R = d / 2
+    cp = cm.cp_wood(x, (Ti + Tinf) / 2 if tk_cp is None else tk_cp) * 1000
+    alpha = k / (Gb * 1000 * cp)
+    Fo = alpha[:, None] * t / R[:, None]**2
+
+    # terms whose exponential is below 1e-12 at the first nonzero time
+    if terms is None:
+        fo_min = Fo[Fo > 0].min() if np.any(Fo > 0) else 1.0
+        terms = int(min(np.ceil(np.sqrt(28 / fo_min) / np.pi) + 2, MAX_TERMS))
+
+    lam = biot_eigenvalues(b, h * R / k, terms)
+    coef = _series_coefficients(b, lam)
+    modes = _series_modes(b, lam, np.linspace(0, 1, m))
+
+    # theta[p, t, r] = sum over n of coef[p, n] * exp(-lam[p, n]^2 Fo[p, t]) * modes[p, n, r]
+    decay = coef[:, None, :] * np.exp(-lam[:, None, :]**2 * Fo[:, :, None])
+    theta = np.matmul(decay, modes)
+
+    # the series converges slowly at zero time so the initial temperature
+    # is taken from the initial condition
+    theta[:, t == 0] = 1.0
+    T = Tinf[:, None, None] + (Ti - Tinf)[:, None, None] * theta
+
+    return T[0] if scalar else T
+
+
 def hc(m, dr, b, dt, h, Tinf, g, T, r, pbar, cpbar, kbar):
     """
     1D transient heat conduction within a solid sphere, cylinder, or slab shape
@@ -0,0 +1,373 @@
+import functools
+import os
+
+import chemics as cm
+import numpy as np
+import pandas as pd
+
+import surrogate
+from bfbreactor import BfbReactor
+from particle import Particle
+from trans_heat_cond import hc2_batch
+
+# Scalar results of `solve_parameters` that are available from `evaluate`
+OUTPUTS = (
+    'mw', 'mug', 'rhog',
+    'umb', 'umb_umf', 'umf_ergun', 'umf_wenyu', 'ut_bed_ganser', 'ut_bed_haider',
+    't_ref', 'tv', 'tv_min', 'tv_max', 'ut_bio_ganser', 'ut_bio_haider',
+    'ac', 'us', 'us_umf_ergun', 'us_umf_wenyu', 'tdh_chan', 'tdh_horio', 'zexp_ergun', 'zexp_wenyu'
+)
+
+# Parameters that `evaluate` takes from its inputs instead of the case
+INPUTS = (
+    'gas.p', 'gas.tk',
+    'bed.dp', 'bed.dp_min', 'bed.dp_max', 'bed.phi', 'bed.rho',
+    'biomass.dp', 'biomass.dp_min', 'biomass.dp_max', 'biomass.phi', 'biomass.rho',
+    'biomass.mc', 'biomass.k', 'biomass.h', 'biomass.tk_init',
+    'reactor.q', 'reactor.zmf', 'reactor.ep'
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _mu_table():
+    """
+    Gas viscosity coefficients from the inorganic and organic data files
+    used by `cm.mu_gas`.
+    """
+    path = os.path.join(os.path.dirname(cm.__file__), 'data')
+    df_inorganic = pd.read_csv(os.path.join(path, 'mu-gas-inorganic.csv'), index_col=0)
+    df_organic = pd.read_csv(os.path.join(path, 'mu-gas-organic.csv'), index_col=0)
+    return df_inorganic, df_organic
+
+
+@functools.lru_cache(maxsize=None)
+def mu_coeffs(formula):
+    """
+    Coefficients of the gas viscosity polynomial used by `cm.mu_gas`.
+
+    Returns
+    -------
+    tmin, tmax, a, b, c, d : float
+        Temperature range [K] and coefficients where the viscosity [µP] is
+        a + b * T + c * T² + d * T³.
+    """
+    for df in _mu_table():
+        if formula in df.index:
+            row = df.loc[formula]
+            if isinstance(row, pd.DataFrame):
+                raise ValueError(f'Multiple substances available for {formula}.')
+            return tuple(float(row[col]) for col in ('temperature, Tmin (K)', 'temperature, Tmax (K)', 'A', 'B', 'C', 'D'))
+
+    raise ValueError(f'Gas viscosity for {formula} is not available.')
+
+
+class GasArray:
+    """
+    Gas or gas mixture properties for arrays of pressure and temperature.
+    Attributes are the same as the `Gas` class so instances can be used with
+    the `Particle` and `BfbReactor` methods. Arrays are stored and evaluated
+    with `dtype` such as `np.float32` for reduced precision sweeps.
+
+    Attributes
+    ----------
+    p : array
+        Pressure [Pa]
+    sp : list
+        Species representing gas or gas mixture.
+    tk : array
+        Temperature [K]
+    x : list
+        Mole fraction of gas or gas mixture.
+    mw : float
+        Molecular weight [g/mol]
+    mu : array
+        Viscosity [µP]
+    rho : array
+        Density [kg/m³]
+    """
+
+    def __init__(self, sp, x, p, tk, eq='herning', dtype=np.float64):
+        self.sp = sp
+        self.x = x
+        self.p = np.asarray(p, dtype=dtype)
+        self.tk = np.asarray(tk, dtype=dtype)
+
+        mws = np.array([cm.mw(s) for s in sp], dtype=dtype)
+        mus = np.array([self._mu_species(s) for s in sp], dtype=dtype)
+        xs = np.asarray(x, dtype=dtype).reshape((-1,) + (1,) * self.tk.ndim)
+
+        if len(sp) == 1:
+            self.mw = mws[0]
+            self.mu = mus[0]
+        elif eq == 'graham':
+            self.mw = dtype(cm.mw_mix(mws, x))
+            self.mu = np.sum(mus * xs, axis=0)
+        elif eq == 'herning':
+            self.mw = dtype(cm.mw_mix(mws, x))
+            sq = np.sqrt(mws).reshape(xs.shape)
+            self.mu = np.sum(mus * xs * sq, axis=0) / np.sum(xs * sq)
+        else:
+            raise ValueError(f'Viscosity equation `{eq}` not available.')
+
+        self.rho = cm.rhog(self.mw, self.p, self.tk)
+
+    def _mu_species(self, formula):
+        """
+        Viscosity [µP] of a gas species at each temperature.
+        """
+        tmin, tmax, a, b, c, d = mu_coeffs(formula)
+        if np.any((self.tk < tmin) | (self.tk > tmax)):
+            raise ValueError('Temperature out of range. Applicable values are '
+                             f'{tmin} - {tmax} K for {formula} gas.')
+        tk = self.tk
+        return a + b * tk + c * tk**2 + d * tk**3
+
+
+def ut_ganser(dp, mu, phi, rhog, rhos, tol=1e-12, max_iter=50):
+    """
+    Terminal velocity [m/s] from the Ganser drag coefficient for arrays of
+    inputs. Instead of interpolating over a grid of velocities like
+    `cm.ut_ganser`, the velocity where the Ganser and sphere drag
+    coefficients are equal is found with the Illinois method. The log of
+    the drag coefficient ratio is nearly linear in the log of the velocity
+    so only a few iterations are needed.
+
+    Parameters
+    ----------
+    dp : array
+        Particle diameter [m]
+    mu : array
+        Gas viscosity [kg/ms]
+    phi : array
+        Particle sphericity [-]
+    rhog : array
+        Gas density [kg/m³]
+    rhos : array
+        Particle density [kg/m³]
+    tol : float
+        Tolerance of the log of the drag coefficient ratio.
+    max_iter : int
+        Maximum number of iterations.
+
+    Returns
+    -------
+    ut : array
+        Terminal velocity [m/s]
+    """
+    g = 9.81
+    dp, mu, phi, rhog, rhos = np.broadcast_arrays(dp, mu, phi, rhog, rhos)
+
+    # the tolerance is limited by the precision of reduced precision inputs
+    dtype = np.result_type(dp, mu, phi, rhog, rhos, np.float32)
+    tol = max(tol, 16 * float(np.finfo(dtype).eps))
+
+    k1 = (1 / 3 + 2 / 3 * (phi**-0.5))**(-1)
+    k2 = 10**(1.8148 * ((-np.log(phi))**0.5743))
+
+    def f(s):
+        ut = np.exp(s)
+        re = (dp * rhog * ut) / mu
+        cd = (24 / (re * k1)) * (1 + 0.1118 * ((re * k1 * k2)**0.6567)) + (0.4305 * k2) / (1 + (3305 / (re * k1 * k2)))
+        cdd = (4 * g * dp * (rhos - rhog)) / (3 * (ut**2) * rhog)
+        return np.log(cd / cdd)
+
+    # same velocity range as the Chemics function where velocities outside
+    # the range are limited to its ends
+    lo = np.log(np.full(dp.shape, 0.0001, dtype=dtype))
+    hi = np.log(1.74 * np.sqrt(g * dp * (rhos - rhog) / rhog))
+    f_lo = f(lo)
+    f_hi = f(hi)
+    done = (f_lo >= 0) | (f_hi <= 0)
+
+    a, fa, b, fb = lo, f_lo, hi, f_hi
+
+    for _ in range(max_iter):
+        c = np.where(done, b, b - fb * (b - a) / np.where(fb == fa, 1, fb - fa))
+        fc = f(c)
+        flip = np.sign(fc) != np.sign(fb)
+        a = np.where(flip, b, a)
+        fa = np.where(flip, fb, fa / 2)
+        b, fb = c, fc
+        if np.all(done | (np.abs(fc) < tol)):
+            break
+
+    s = np.where(f_lo >= 0, lo, np.where(f_hi <= 0, hi, b))
+    return np.exp(s)
+
+
+def ut_haider(dp, mu, phi, rhog, rhos):
+    """
+    Terminal velocity [m/s] from the Haider and Levenspiel correlation for
+    arrays of inputs. See `ut_ganser` for parameters.
+    """
+    if np.any((phi > 1.0) | (phi < 0.5)):
+        raise ValueError('Sphericity must be 0.5 <= phi <= 1.0')
+
+    d_star = dp * ((9.81 * rhog * (rhos - rhog)) / (mu**2))**(1 / 3)
+    u_star = (18 / (d_star**2) + ((2.3348 - 1.7439 * phi) / (d_star**0.5)))**-1
+    ut = u_star * ((9.81 * (rhos - rhog) * mu) / rhog**2)**(1 / 3)
+    return ut
+
+
+def devol_time_grid(dp, tk):
+    """
+    Devolatilization time [s] of biomass particles for every combination of
+    particle diameter and temperature from one broadcast evaluation of the
+    `cm.devol_time` correlation.
+
+    Parameters
+    ----------
+    dp : array or dict
+        Particle diameters [m], or the diameter [m] of each size class of a
+        particle size distribution by label such as `{'dp_min': 0.0001,
+        'dp': 0.0005, 'dp_max': 0.001}`.
+    tk : array
+        Bed temperatures [K].
+
+    Returns
+    -------
+    tv : DataFrame
+        Devolatilization time with a row for each diameter or size class
+        and a column for each temperature.
+    """
+    if isinstance(dp, dict):
+        index = pd.Index(list(dp), name='size_class')
+        dp = list(dp.values())
+    else:
+        index = pd.Index(np.ravel(dp), name='dp')
+
+    dp = np.ravel(np.asarray(dp, dtype=float))
+    tk = np.ravel(np.asarray(tk, dtype=float))
+    tv = cm.devol_time(dp[:, None] * 1000, tk[None, :])
+
+    return pd.DataFrame(tv, index=index, columns=pd.Index(tk, name='tk'))
+
+
+def param_value(params, inputs, name, dtype=None):
+    """
+    Array of values from the inputs or the parameter value for a name such
+    as `bed.dp` which refers to `params.bed['dp']`. Both are converted to
+    `dtype` when given.
+    """
+    if name in inputs:
+        return np.asarray(inputs[name], dtype=dtype or float)
+    group, key = name.split('.')
+    value = getattr(params, group)[key]
+    return value if dtype is None else dtype(value)
+
+
+def evaluate(params, inputs=None, outputs=OUTPUTS, m=None, nt=None, t_max=None, dtype=None):
+    """
+    Evaluate the gas, bed particle, biomass particle, and BFB reactor results
+    of `solve_parameters` for arrays of input parameters.
+
+    Parameters
+    ----------
+    params : module or SimpleNamespace
+        Parameters for the case.
+    inputs : dict, optional
+        Arrays of parameter values that replace the case parameters where each
+        key is a name such as `bed.dp` or `gas.tk`. Arrays are broadcast to a
+        common shape.
+    outputs : tuple
+        Names of results to return. The biomass heating time `t_ref` is the
+        most expensive output and is only calculated when requested.
+    m, nt, t_max : int, int, float, optional
+        Number of nodes, number of time steps, and time duration [s] for the
+        heat conduction solve of `t_ref` instead of the biomass parameters.
+        When surrogates are on, the terminal velocities and `t_ref` are taken
+        from their surrogates for inputs in the surrogate domains.
+    dtype : type, optional
+        Floating point type of the evaluation such as `np.float32` which
+        halves the memory of large sweeps, see `precision_error` for its
+        error, default is float64.
+
+    Returns
+    -------
+    results : dict
+        Arrays of each output with the broadcast shape of the inputs.
+    """
+    inputs = inputs or {}
+    pm = params
+    dtype = None if dtype is None else np.dtype(dtype).type
+
+    def val(name):
+        return param_value(pm, inputs, name, dtype)
+
+    gas = GasArray(pm.gas['sp'], pm.gas['x'], val('gas.p'), val('gas.tk'), dtype=dtype or np.float64)
+    bed = Particle(val('bed.dp'), val('bed.dp_min'), val('bed.dp_max'), val('bed.phi'), val('bed.rho'))
+    bio = Particle(val('biomass.dp'), val('biomass.dp_min'), val('biomass.dp_max'), val('biomass.phi'), val('biomass.rho'))
+    bfb = BfbReactor(pm.reactor['di'], val('reactor.q'), val('reactor.zmf'))
+    ep = val('reactor.ep')
+    mug = gas.mu * 1e-7
+
+    res = {}
+    res['mw'] = gas.mw
+    res['mug'] = gas.mu
+    res['rhog'] = gas.rho
+
+    res['umb'] = bed.calc_umb(gas)
+    res['umb_umf'] = bed.calc_umb_umf(gas)
+    res['umf_ergun'] = bed.calc_umf_ergun(ep, gas)
+    res['umf_wenyu'] = bed.calc_umf_wenyu(gas)
+    # the Ganser velocities are solved iteratively so they are skipped when
+    # not requested
+    if 'ut_bed_ganser' in outputs:
+        res['ut_bed_ganser'] = surrogate.apply('ut_ganser', ut_ganser, bed.dp, mug, bed.phi, gas.rho, bed.rho)
+    res['ut_bed_haider'] = surrogate.apply('ut_haider', ut_haider, bed.dp, mug, bed.phi, gas.rho, bed.rho)
+
+    res['tv'], res['tv_min'], res['tv_max'] = bio.calc_devol_time(gas.tk)
+    if 'ut_bio_ganser' in outputs:
+        res['ut_bio_ganser'] = surrogate.apply('ut_ganser', ut_ganser, bio.dp, mug, bio.phi, gas.rho, bio.rho)
+    res['ut_bio_haider'] = surrogate.apply('ut_haider', ut_haider, bio.dp, mug, bio.phi, gas.rho, bio.rho)
+
+    res['ac'] = bfb.ac
+    res['us'] = bfb.calc_us(gas)
+    res['us_umf_ergun'] = bfb.calc_us_umf(res['us'], res['umf_ergun'])
+    res['us_umf_wenyu'] = bfb.calc_us_umf(res['us'], res['umf_wenyu'])
+    res['tdh_chan'] = bfb.calc_tdh_chan(res['us'])
+    res['tdh_horio'] = bfb.calc_tdh_horio(res['us'])
+    res['zexp_ergun'] = bfb.calc_zexp_ergun(bed, gas, res['umf_ergun'], res['us'])
+    res['zexp_wenyu'] = bfb.calc_zexp_wenyu(bed, gas, res['umf_wenyu'], res['us'])
+
+    shape = np.broadcast_shapes(*(np.shape(v) for v in res.values()))
+
+    if 't_ref' in outputs:
+        m = m or pm.biomass['m']
+        t_hc = Particle.build_time_vector(nt or pm.biomass['nt'], t_max or pm.biomass['t_max'])
+        args = np.broadcast_arrays(bio.dp, val('biomass.mc'), val('biomass.k'), bio.rho / 1000,
+                                   val('biomass.h'), val('biomass.tk_init'), gas.tk, np.empty(shape))
+        b = pm.biomass['b']
+        t_ref = surrogate.apply('t_ref', lambda *a: hc2_batch(*a[:7], b, m, t_hc, dtype=dtype or np.float64)[0],
+                                *(a.ravel() for a in args[:7]), b)
+        res['t_ref'] = t_ref.reshape(args[0].shape)
+        shape = res['t_ref'].shape
+
+    if dtype is not None:
+        res = {name: np.asarray(res[name], dtype=dtype) for name in outputs}
+
+    results = {name: np.broadcast_to(res[name], shape) for name in outputs}
+    return results
+
+
+def precision_error(params, inputs=None, outputs=OUTPUTS, m=None, nt=None, t_max=None, dtype=np.float32):
+    """
+    Relative error of a reduced precision evaluation against float64 for the
+    same inputs. Outputs that are NaN or zero in float64 are skipped.
+
+    Returns
+    -------
+    error : dict
+        Maximum and 99th percentile of the relative error of each output.
+    """
+    exact = evaluate(params, inputs, outputs, m, nt, t_max)
+    reduced = evaluate(params, inputs, outputs, m, nt, t_max, dtype)
+    error = {}
+
+    for name in outputs:
+        ref = np.asarray(exact[name], dtype=float)
+        ok = np.isfinite(ref) & (ref != 0)
+        err = np.abs(reduced[name][ok] / ref[ok] - 1) if ok.any() else np.zeros(1)
+        error[name] = {'max': float(np.nanmax(err)), 'p99': float(np.nanpercentile(err, 99))}
+
+    return error
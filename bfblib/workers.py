@@ -0,0 +1,303 @@
+import contextlib
+import functools
+import importlib.util
+import logging
+import multiprocessing
+import os
+import pathlib
+import secrets
+import stat
+import time
+import types
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from profiling import profiled
+from render import FigureRenderer
+
+# Address of the worker pool daemon
+ADDRESS = ('localhost', 47_101)
+
+# File of the secret key of the worker pool daemon which only the user can
+# read, connections without the key are refused before any data is unpickled
+KEY_FILE = pathlib.Path.home() / '.bfblib' / 'daemon.key'
+
+# Parsed parameter modules as {params.py path: (mtime, params)}
+_params_cache = {}
+
+# Seconds spent importing and warming libraries in this worker process
+_warmup = {'seconds': 0.0}
+
+
+@profiled('io')
+def load_params(path):
+    """
+    Load the parameters module for a case folder.
+
+    The module is only executed when the parameters file is new or has been
+    modified since it was last loaded, otherwise the cached parameters are
+    returned.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Path to case folder which contains the `params.py` file.
+
+    Returns
+    -------
+    params : SimpleNamespace
+        Parameter dictionaries defined in the module such as `params.bed` and
+        `params.gas`.
+    """
+    file = (pathlib.Path(path) / 'params.py').resolve()
+    mtime = file.stat().st_mtime_ns
+
+    cached = _params_cache.get(file)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    spec = importlib.util.spec_from_file_location('params', file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    attrs = {k: v for k, v in vars(module).items() if not k.startswith('_')}
+    params = types.SimpleNamespace(**attrs)
+    _params_cache[file] = (mtime, params)
+    return params
+
+
+def init_worker():
+    """
+    Import and warm the heavy libraries used by the solvers so the first case
+    in a worker doesn't pay for it. Figures are rendered in other processes
+    but Chemics imports Matplotlib so the non-interactive backend is used.
+    """
+    t0 = time.perf_counter()
+
+    os.environ['MPLBACKEND'] = 'Agg'
+
+    import chemics as cm
+    import numpy as np
+    import pandas  # noqa: F401
+    import scipy.linalg
+
+    import cases  # noqa: F401
+
+    # First calls that read data files or load LAPACK routines
+    cm.mu_gas('N2', 773.15)
+    scipy.linalg.solve_banded((1, 1), np.ones((3, 3)), np.ones(3))
+
+    _warmup['seconds'] = time.perf_counter() - t0
+
+
+def run_case(case, shared=None):
+    """
+    Run all solvers for a case folder or a case of a case set and return
+    timing statistics. Arrays of the results in the figure jobs are sent
+    through shared memory blocks named with the `shared` prefix when given.
+
+    Returns
+    -------
+    stats : dict
+        Process id of the worker, worker warm-up time [s], time to load or
+        build the case parameters [s], and total time [s] for the case.
+    jobs : list
+        Figure jobs for the case.
+    record : dict
+        Scalar parameters and results of the case.
+    """
+    from casesets import resolve
+    from cases import run_solvers
+
+    t0 = time.perf_counter()
+    path, _ = resolve(case)
+    t_load = time.perf_counter() - t0
+
+    jobs, record = run_solvers(case)
+    if shared is not None:
+        from sharedmem import publish
+        jobs = publish(jobs, shared)
+    t_total = time.perf_counter() - t0
+
+    stats = {
+        'case': str(path),
+        'pid': os.getpid(),
+        'warmup': _warmup['seconds'],
+        'load': t_load,
+        'total': t_total
+    }
+    return stats, jobs, record
+
+
+class WorkerPool:
+    """
+    Pool of warm worker processes that can be reused across runs. Figures
+    are rendered by a separate `FigureRenderer` as each case finishes unless
+    `plots` is False.
+
+    Attributes
+    ----------
+    stats : list
+        Timing statistics of every case run on the pool.
+    """
+
+    def __init__(self, processes=None, plots=True):
+        self._pool = multiprocessing.Pool(processes, initializer=init_worker)
+        self._renderer = FigureRenderer(processes) if plots else None
+        self.stats = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def run(self, cases, records=None, store=None):
+        """
+        Run all solvers for each case on the pool. Cases can be a generator
+        which is consumed as the workers take on new cases. The record of
+        each finished case is written by the `RecordWriter` when given.
+        Result arrays of each case are sent through the `SharedResults`
+        store when given instead of being pickled back to this process, and
+        the blocks of a case are released once its figures are rendered.
+        """
+        stats = []
+        func = run_case if store is None else functools.partial(run_case, shared=store.prefix)
+        rendering = {}
+
+        for st, jobs, record in self._pool.imap_unordered(func, cases):
+            case = pathlib.Path(st['case']).name
+            if store is not None:
+                store.add(case, jobs)
+            logging.info(f"Case {st['case']} done in {st['total']:.2f} s "
+                         f"(params {st['load'] * 1000:.2f} ms, worker {st['pid']} "
+                         f"warm-up {st['warmup']:.2f} s)")
+            if self._renderer is not None:
+                rendering[case] = self._renderer.submit(jobs)
+            if records is not None:
+                records.write(record)
+            stats.append(st)
+
+            if store is not None:
+                for done in [c for c, futures in rendering.items() if all(f.done() for f in futures)]:
+                    del rendering[done]
+                    store.release(done)
+                if self._renderer is None:
+                    store.release(case)
+
+        if records is not None:
+            records.flush()
+        if self._renderer is not None:
+            self._renderer.wait()
+        if store is not None:
+            for case in rendering:
+                store.release(case)
+        self.stats.extend(stats)
+        return stats
+
+    def close(self):
+        """
+        Stop the worker and rendering processes.
+        """
+        self._pool.close()
+        self._pool.join()
+        if self._renderer is not None:
+            self._renderer.close()
+
+
+def daemon_key(create=False, file=KEY_FILE):
+    """
+    Secret key of the worker pool daemon. A random key is written to the
+    file, readable by the user only, when `create` is True and there is no
+    key yet. A key file that other users can read is refused.
+    """
+    file = pathlib.Path(file)
+
+    if create and not file.exists():
+        file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        try:
+            fd = os.open(file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(secrets.token_bytes(32))
+
+    try:
+        mode = file.stat().st_mode
+    except FileNotFoundError:
+        raise FileNotFoundError(f'Key file {file} of the worker pool daemon not found, start the daemon first.') from None
+    if mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise PermissionError(f'Key file {file} of the worker pool daemon must only be accessible by its owner.')
+
+    return file.read_bytes()
+
+
+def serve(processes=None, plots=True, address=ADDRESS, authkey=None):
+    """
+    Run a daemon that keeps a warm worker pool alive and runs the cases sent
+    to it by `submit` until it receives a shutdown request. Clients must
+    have the key of `daemon_key`, which is created by the first daemon.
+    """
+    from checkpoint import enabled
+    from records import RecordWriter
+
+    authkey = authkey or daemon_key(create=True)
+
+    with WorkerPool(processes, plots) as pool, Listener(address, authkey=authkey) as listener:
+        logging.info(f'Worker pool daemon listening on {address[0]}:{address[1]}')
+
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError:
+                logging.info('Refused a connection without the key of the daemon')
+                continue
+
+            with conn:
+                request = conn.recv()
+
+                if request == 'shutdown':
+                    conn.send([])
+                    break
+
+                cases, file = request
+                records = RecordWriter(file, resume=enabled()) if file else contextlib.nullcontext()
+
+                try:
+                    with records as writer:
+                        stats = pool.run([pathlib.Path(c) if isinstance(c, str) else c for c in cases], writer)
+                except Exception as e:
+                    conn.send(e)
+                else:
+                    conn.send(stats)
+
+    logging.info('Worker pool daemon stopped')
+
+
+def submit(cases, records=None, address=ADDRESS, authkey=None):
+    """
+    Run the cases on the worker pool daemon and wait for them to finish.
+    Case folders are sent as absolute paths and case set cases as is. The
+    daemon writes the case records to the `records` file when given.
+    """
+    cases = [str(c.resolve()) if isinstance(c, pathlib.Path) else c for c in cases]
+    records = str(pathlib.Path(records).resolve()) if records else None
+
+    with Client(address, authkey=authkey or daemon_key()) as conn:
+        conn.send((cases, records))
+        reply = conn.recv()
+
+    if isinstance(reply, Exception):
+        raise reply
+
+    return reply
+
+
+def shutdown(address=ADDRESS, authkey=None):
+    """
+    Stop the worker pool daemon.
+    """
+    with Client(address, authkey=authkey or daemon_key()) as conn:
+        conn.send('shutdown')
+        conn.recv()
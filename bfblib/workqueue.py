@@ -0,0 +1,378 @@
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import random
+import socket
+import threading
+import time
+
+from casesets import Case
+
+# Seconds without a heartbeat after which a claimed task is recovered
+STALE = 60.0
+
+# Seconds between checks for tasks that can be claimed
+POLL = 1.0
+
+
+def _dump_case(case):
+    """
+    JSON data for a case folder or a case set case.
+    """
+    if isinstance(case, Case):
+        return {'file': case.file, 'index': case.index, 'overrides': case.overrides,
+                'label': case.label, 'path': str(case.path)}
+    return {'path': str(pathlib.Path(case).resolve())}
+
+
+def _load_case(data):
+    """
+    Case folder or case set case from its JSON data.
+    """
+    path = pathlib.Path(data['path'])
+    if 'file' in data:
+        overrides = tuple(tuple(ovr) for ovr in data['overrides'])
+        return Case(data['file'], data['index'], overrides, data['label'], path)
+    return path
+
+
+def _owner():
+    """
+    Owner id of the locks of this worker which is its host and process id.
+    """
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _write_json(file, data):
+    """
+    Write a JSON file atomically by replacing it with a complete temporary
+    file so readers never see a partial file.
+    """
+    tmp = file.with_name(f'.{file.name}.{socket.gethostname()}.{os.getpid()}')
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp, file)
+
+
+class WorkQueue:
+    """
+    Queue of tasks in a shared folder which workers on any computer that
+    can see the folder take tasks from. A task is a case or one solver stage
+    of a case.
+
+    A worker claims a task by creating its lock file which only one worker
+    can do because the file is created exclusively. The worker updates the
+    time of the lock file while the task runs. A lock file that hasn't been
+    updated for `stale` seconds belongs to a worker that stopped and the
+    task is claimed again by another worker.
+
+    Folders of the queue are `tasks` for the task files, `locks` for the
+    claims, `done` for the results of finished tasks, and `failed` for the
+    errors of failed tasks.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Folder of the queue.
+    stale : float
+        Seconds without an update after which a lock file is stale.
+    """
+
+    def __init__(self, path, stale=STALE):
+        self.path = pathlib.Path(path)
+        self.stale = stale
+        for folder in ('tasks', 'locks', 'done', 'failed'):
+            (self.path / folder).mkdir(parents=True, exist_ok=True)
+
+    def enqueue(self, cases, stages=False, records_file=None):
+        """
+        Add a task for each case or for each solver stage of each case. The
+        workers append the case records to the `records_file` when given.
+
+        Returns
+        -------
+        n : int
+            Number of tasks added.
+        """
+        from runner import STAGES
+
+        records_file = str(pathlib.Path(records_file).resolve()) if records_file else None
+        _write_json(self.path / 'queue.json', {'records': records_file})
+
+        n = 0
+        for i, case in enumerate(cases):
+            for stage in (STAGES if stages else (None,)):
+                name = f'{i:06d}' if stage is None else f'{i:06d}-{stage}'
+                _write_json(self.path / 'tasks' / f'{name}.json', {'case': _dump_case(case), 'stage': stage})
+                n += 1
+        return n
+
+    def status(self):
+        """
+        Number of tasks that are waiting, claimed, done, and failed.
+        """
+        tasks = {f.stem for f in (self.path / 'tasks').glob('*.json')}
+        done = {f.stem for f in (self.path / 'done').glob('*.json')}
+        failed = {f.stem for f in (self.path / 'failed').glob('*.json')}
+        locks = {f.stem for f in (self.path / 'locks').glob('*.lock')}
+        claimed = (locks & tasks) - done - failed
+        return {
+            'waiting': len(tasks - done - failed - claimed),
+            'claimed': len(claimed),
+            'done': len(done),
+            'failed': len(failed)
+        }
+
+    def pending(self):
+        """
+        Names of tasks without a result.
+        """
+        finished = {f.stem for d in ('done', 'failed') for f in (self.path / d).glob('*.json')}
+        return [f.stem for f in (self.path / 'tasks').glob('*.json') if f.stem not in finished]
+
+    def claim(self, name):
+        """
+        Claim a task by creating its lock file. A stale lock file is removed
+        first so the task can be claimed again.
+
+        Returns
+        -------
+        claimed : bool
+            True when this worker now holds the task.
+        """
+        lock = self.path / 'locks' / f'{name}.lock'
+        owner = _owner()
+
+        try:
+            st = lock.stat()
+        except FileNotFoundError:
+            pass
+        else:
+            if time.time() - st.st_mtime < self.stale:
+                return False
+            if not self._break_lock(lock, owner):
+                return False
+            logging.info(f'Recovered task {name} from a stale lock')
+
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+
+        with os.fdopen(fd, 'w') as f:
+            f.write(owner)
+
+        # another worker could have finished the task since it was listed
+        if (self.path / 'done' / f'{name}.json').exists():
+            lock.unlink()
+            return False
+
+        return True
+
+    def _break_lock(self, lock, owner):
+        """
+        Move a stale lock file aside. Only one worker can move a given lock
+        file and a lock that was refreshed or replaced in the meantime is
+        put back.
+        """
+        aside = lock.with_name(f'{lock.name}.{owner.replace(":", ".")}')
+
+        try:
+            os.rename(lock, aside)
+        except FileNotFoundError:
+            return False
+
+        if time.time() - aside.stat().st_mtime < self.stale:
+            try:
+                os.link(aside, lock)
+            except FileExistsError:
+                pass
+            aside.unlink()
+            return False
+
+        aside.unlink()
+        return True
+
+    def held(self, name):
+        """
+        Whether a task has a lock file that isn't stale.
+        """
+        try:
+            st = (self.path / 'locks' / f'{name}.lock').stat()
+        except FileNotFoundError:
+            return False
+        return time.time() - st.st_mtime < self.stale
+
+    def release(self, name):
+        """
+        Remove the lock file of a task when this worker still owns it. The
+        lock is moved aside before its owner is read so a lock that was broken
+        as stale and claimed by another worker in the meantime is put back
+        instead of removed.
+        """
+        lock = self.path / 'locks' / f'{name}.lock'
+        owner = _owner()
+        aside = lock.with_name(f'{lock.name}.{owner.replace(":", ".")}')
+
+        try:
+            os.rename(lock, aside)
+        except FileNotFoundError:
+            return
+
+        if aside.read_text() != owner:
+            try:
+                os.link(aside, lock)
+            except FileExistsError:
+                pass
+        aside.unlink()
+
+    def heartbeat(self, name, stop):
+        """
+        Update the time of the lock file of a task until the stop event is
+        set.
+        """
+        lock = self.path / 'locks' / f'{name}.lock'
+        while not stop.wait(self.stale / 4):
+            try:
+                os.utime(lock)
+            except FileNotFoundError:
+                return
+
+    def run_task(self, name, plots=True, records=None):
+        """
+        Run a claimed task and write its timing statistics and the record of
+        the case to the `done` folder or its error to the `failed` folder.
+        """
+        from render import render_figure
+        from runner import run_stage
+        from workers import run_case
+
+        with open(self.path / 'tasks' / f'{name}.json') as f:
+            task = json.load(f)
+
+        case = _load_case(task['case'])
+        stop = threading.Event()
+        beat = threading.Thread(target=self.heartbeat, args=(name, stop), daemon=True)
+        beat.start()
+
+        try:
+            t0 = time.perf_counter()
+            if task['stage'] is None:
+                stats, jobs, record = run_case(case)
+            else:
+                path, jobs, record, _, _ = run_stage(case, task['stage'])
+                stats = {'case': str(path), 'pid': os.getpid()}
+            stats['host'] = socket.gethostname()
+            stats['total'] = time.perf_counter() - t0
+
+            if plots:
+                for job in jobs:
+                    render_figure(job)
+            if record is not None and records is not None:
+                records.write(record)
+
+        except Exception as e:
+            _write_json(self.path / 'failed' / f'{name}.json', {'error': repr(e), 'host': socket.gethostname()})
+            logging.info(f'Task {name} failed: {e!r}')
+
+        else:
+            _write_json(self.path / 'done' / f'{name}.json', {'stats': stats, 'record': record})
+            logging.info(f"Task {name} for {stats['case']} done in {stats['total']:.2f} s")
+
+        finally:
+            stop.set()
+            beat.join()
+            self.release(name)
+
+    def work(self, plots=True, records=None, poll=POLL):
+        """
+        Claim and run tasks until every task of the queue has a result. The
+        listing of the tasks is only read again when a claim fails or every
+        listed task was tried. Tasks held by other workers are skipped until
+        their locks are stale so the tasks of workers that stop are recovered.
+
+        Returns
+        -------
+        n : int
+            Number of tasks run by this worker.
+        """
+        from workers import init_worker
+
+        init_worker()
+        n = 0
+        names = []
+        held = set()
+
+        while True:
+            if not names:
+                names = self.pending()
+                if not names:
+                    break
+
+                # tasks of workers that stopped are tried again as soon as
+                # their locks are stale
+                held = {name for name in held.intersection(names) if self.held(name)}
+                if held.issuperset(names):
+                    # every task without a result is held by other workers
+                    # whose locks are checked again in case they stopped
+                    time.sleep(poll)
+                    held.clear()
+
+                # workers try the tasks in a different order to avoid contention
+                names = [name for name in names if name not in held]
+                random.shuffle(names)
+
+            name = names.pop()
+            if self.claim(name):
+                self.run_task(name, plots, records)
+                n += 1
+            else:
+                # another worker holds or finished the task so the listing
+                # is refreshed
+                held.add(name)
+                names = []
+
+        if records is not None:
+            records.flush()
+        return n
+
+
+def work(path, plots=True, stale=STALE):
+    """
+    Run a worker on the queue which writes the case records to the records
+    file of the queue. Each record is written as soon as its task finishes
+    so a worker that is killed doesn't lose buffered records.
+    """
+    from checkpoint import enabled
+    from records import RecordWriter
+
+    queue = WorkQueue(path, stale)
+    with open(queue.path / 'queue.json') as f:
+        records_file = json.load(f)['records']
+
+    records = RecordWriter(records_file, buffer_size=1, resume=enabled()) if records_file else None
+    n = queue.work(plots, records)
+    logging.info(f'Worker {_owner()} ran {n} tasks')
+
+
+def start_workers(path, processes=1, plots=True, stale=STALE):
+    """
+    Start worker processes on this computer and wait for the queue to
+    finish.
+
+    Returns
+    -------
+    status : dict
+        Number of tasks of the queue that are waiting, claimed, done, and
+        failed.
+    """
+    procs = [multiprocessing.Process(target=work, args=(path, plots, stale)) for _ in range(processes)]
+
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    return WorkQueue(path, stale).status()
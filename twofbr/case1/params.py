@@ -81,3 +81,40 @@ reactor = {
     'q': 14,            # Volumetric flowrate of gas into reactor [SLM]
     'zmf': 0.1016       # Bed height at minimum fluidization [m]
 }
+
+# Uncertain Parameters
+# ----------------------------------------------------------------------------
+
+# Distributions are ('normal', mean, sd), ('truncnormal', mean, sd, low, high),
+# ('uniform', low, high), or ('triangular', low, mode, high)
+
+uncertainty = {
+    'bed.phi': ('truncnormal', 0.90, 0.03, 0.80, 1.0),              # Sphericity [-]
+    'bed.dp': ('triangular', 0.000219, 0.000306, 0.000432),         # Mean particle diameter [m]
+    'biomass.dp': ('triangular', 0.000042, 0.000134, 0.000846),     # Mean particle diameter [m]
+    'biomass.h': ('uniform', 300, 400),                             # Heat transfer coefficient [W/m²K]
+    'biomass.k': ('normal', 0.12, 0.012),                           # Thermal conductivity [W/mK]
+    'reactor.ep': ('uniform', 0.42, 0.48)                           # Void fraction of bed material [-]
+}
+
+# Monte Carlo Settings
+# ----------------------------------------------------------------------------
+
+montecarlo = {
+    'n': 10_000,        # Number of samples [-]
+    'chunk': 10_000,    # Number of samples evaluated at a time [-]
+    'seed': 42,         # Seed for the random number generator [-]
+    'm': 50,            # Number of nodes for particle heat conduction [-]
+    'nt': 1000,         # Number of time steps for particle heat conduction [-]
+    't_max': 5          # Time duration for particle heat conduction [s]
+}
+
+# Sensitivity Analysis Settings
+# ----------------------------------------------------------------------------
+
+sensitivity = {
+    'trajectories': 20,     # Number of Morris trajectories [-]
+    'levels': 4,            # Number of Morris grid levels [-]
+    'n': 1024,              # Number of Sobol base samples [-]
+    'seed': 42              # Seed for the sample designs [-]
+}